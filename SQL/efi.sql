@@ -36,7 +36,8 @@ CREATE TABLE `alerts` (
   `status` enum('active','resolved') COLLATE utf8mb4_general_ci DEFAULT 'active',
   `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
   `resolved_at` timestamp NOT NULL DEFAULT '0000-00-00 00:00:00',
-  `priority` enum('low','medium','high','critical') COLLATE utf8mb4_general_ci DEFAULT 'medium'
+  `priority` enum('low','medium','high','critical') COLLATE utf8mb4_general_ci DEFAULT 'medium',
+  `source` enum('backend','agent') COLLATE utf8mb4_general_ci NOT NULL DEFAULT 'backend'
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 
 -- --------------------------------------------------------
@@ -80,9 +81,13 @@ CREATE TABLE `server_actions` (
 --
 -- Table structure for table `server_metrics`
 --
+-- Partitioned by time, the backend adds partitions ahead of ingest and drops
+-- the ones past retention (see backend/storage.js). Partitioned tables can't
+-- have foreign keys, rows are removed with their server by the backend.
+--
 
 CREATE TABLE `server_metrics` (
-  `id` varchar(255) COLLATE utf8mb4_general_ci NOT NULL,
+  `id` bigint UNSIGNED NOT NULL AUTO_INCREMENT,
   `server_id` varchar(255) COLLATE utf8mb4_general_ci NOT NULL,
   `cpu_usage` float DEFAULT NULL,
   `memory_usage` float DEFAULT NULL,
@@ -91,10 +96,126 @@ CREATE TABLE `server_metrics` (
   `disk_usage` float DEFAULT NULL,
   `disk_total` bigint DEFAULT NULL,
   `disk_used` bigint DEFAULT NULL,
+  `network_usage` float DEFAULT NULL,
+  `network_in` float DEFAULT NULL,
+  `network_out` float DEFAULT NULL,
+  `temperature` float DEFAULT NULL,
+  `timestamp` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`,`timestamp`),
+  KEY `idx_metrics_server_time` (`server_id`,`timestamp`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci
+PARTITION BY RANGE (UNIX_TIMESTAMP(`timestamp`))
+(PARTITION pfuture VALUES LESS THAN MAXVALUE);
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `server_metrics_1m`
+--
+-- Per-minute rollups of server_metrics, `server_metrics_1h` holds the same per hour
+--
+
+CREATE TABLE `server_metrics_1m` (
+  `server_id` varchar(255) COLLATE utf8mb4_general_ci NOT NULL,
+  `bucket` timestamp NOT NULL,
+  `samples` int NOT NULL,
+  `cpu_usage` float DEFAULT NULL,
+  `cpu_max` float DEFAULT NULL,
+  `memory_usage` float DEFAULT NULL,
+  `memory_max` float DEFAULT NULL,
+  `disk_usage` float DEFAULT NULL,
+  `network_usage` float DEFAULT NULL,
   `network_in` float DEFAULT NULL,
+  `network_in_max` float DEFAULT NULL,
   `network_out` float DEFAULT NULL,
+  `network_out_max` float DEFAULT NULL,
   `temperature` float DEFAULT NULL,
-  `timestamp` timestamp NULL DEFAULT CURRENT_TIMESTAMP
+  PRIMARY KEY (`server_id`,`bucket`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci
+PARTITION BY RANGE (UNIX_TIMESTAMP(`bucket`))
+(PARTITION pfuture VALUES LESS THAN MAXVALUE);
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `server_metrics_1h`
+--
+
+CREATE TABLE `server_metrics_1h` (
+  `server_id` varchar(255) COLLATE utf8mb4_general_ci NOT NULL,
+  `bucket` timestamp NOT NULL,
+  `samples` int NOT NULL,
+  `cpu_usage` float DEFAULT NULL,
+  `cpu_max` float DEFAULT NULL,
+  `memory_usage` float DEFAULT NULL,
+  `memory_max` float DEFAULT NULL,
+  `disk_usage` float DEFAULT NULL,
+  `network_usage` float DEFAULT NULL,
+  `network_in` float DEFAULT NULL,
+  `network_in_max` float DEFAULT NULL,
+  `network_out` float DEFAULT NULL,
+  `network_out_max` float DEFAULT NULL,
+  `temperature` float DEFAULT NULL,
+  PRIMARY KEY (`server_id`,`bucket`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci
+PARTITION BY RANGE (UNIX_TIMESTAMP(`bucket`))
+(PARTITION pfuture VALUES LESS THAN MAXVALUE);
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `server_metrics_rollups`
+--
+-- Per-window aggregates shipped by agents running with ROLLUP_WINDOWS
+--
+
+CREATE TABLE `server_metrics_rollups` (
+  `id` bigint UNSIGNED NOT NULL AUTO_INCREMENT,
+  `server_id` varchar(255) COLLATE utf8mb4_general_ci NOT NULL,
+  `window_seconds` int NOT NULL,
+  `metric` varchar(32) COLLATE utf8mb4_general_ci NOT NULL,
+  `min_value` double DEFAULT NULL,
+  `max_value` double DEFAULT NULL,
+  `mean_value` double DEFAULT NULL,
+  `last_value` double DEFAULT NULL,
+  `p50` double DEFAULT NULL,
+  `p95` double DEFAULT NULL,
+  `p99` double DEFAULT NULL,
+  `sample_count` int DEFAULT NULL,
+  `window_start` timestamp NULL DEFAULT NULL,
+  `window_end` timestamp NOT NULL,
+  PRIMARY KEY (`id`,`window_end`),
+  KEY `idx_rollups_lookup` (`server_id`,`window_seconds`,`metric`,`window_end`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci
+PARTITION BY RANGE (UNIX_TIMESTAMP(`window_end`))
+(PARTITION pfuture VALUES LESS THAN MAXVALUE);
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `server_metrics_ingest_state`
+--
+
+CREATE TABLE `server_metrics_ingest_state` (
+  `server_id` varchar(255) COLLATE utf8mb4_general_ci NOT NULL,
+  `spool_id` varchar(32) COLLATE utf8mb4_general_ci NOT NULL,
+  `last_seq` bigint UNSIGNED NOT NULL,
+  `updated_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`server_id`,`spool_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `server_metrics_rollup_state`
+--
+
+CREATE TABLE `server_metrics_rollup_state` (
+  `name` varchar(32) COLLATE utf8mb4_general_ci NOT NULL,
+  `last_id` bigint UNSIGNED NOT NULL DEFAULT '0',
+  `seen_id` bigint UNSIGNED NOT NULL DEFAULT '0',
+  `updated_at` timestamp NULL DEFAULT NULL,
+  PRIMARY KEY (`name`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 
 -- --------------------------------------------------------
@@ -170,13 +291,6 @@ ALTER TABLE `server_actions`
   ADD PRIMARY KEY (`id`),
   ADD KEY `server_id` (`server_id`);
 
---
--- Indexes for table `server_metrics`
---
-ALTER TABLE `server_metrics`
-  ADD PRIMARY KEY (`id`),
-  ADD KEY `server_id` (`server_id`);
-
 --
 -- Indexes for table `server_processes`
 --
@@ -230,12 +344,6 @@ ALTER TABLE `alerts`
 ALTER TABLE `server_actions`
   ADD CONSTRAINT `server_actions_ibfk_1` FOREIGN KEY (`server_id`) REFERENCES `servers` (`id`);
 
---
--- Constraints for table `server_metrics`
---
-ALTER TABLE `server_metrics`
-  ADD CONSTRAINT `server_metrics_ibfk_1` FOREIGN KEY (`server_id`) REFERENCES `servers` (`id`) ON DELETE CASCADE;
-
 --
 -- Constraints for table `server_processes`
 --
@@ -0,0 +1,82 @@
+// Times the ingest-side cost of both wire formats on bodies produced by
+// coresight-agent/scripts/bench_wire.py, and checks that compact batches decode
+// back to the same samples.
+//
+// Usage: node scripts/bench-wire.js json.jsonl compact.jsonl
+const fs = require("fs");
+const path = require("path");
+const wire = require(path.join(__dirname, "..", "wire"));
+
+const ROUNDS = 20;
+
+const readBodies = (file) =>
+  fs.readFileSync(file, "utf8").split("\n").filter(Boolean);
+
+const time = (fn) => {
+  const start = process.hrtime.bigint();
+  fn();
+  return Number(process.hrtime.bigint() - start) / 1e6;
+};
+
+const close = (a, b) => Math.abs((a ?? 0) - (b ?? 0)) < 0.01;
+
+const main = () => {
+  const [jsonFile, compactFile] = process.argv.slice(2);
+  if (!jsonFile || !compactFile) {
+    console.error("Usage: node scripts/bench-wire.js json.jsonl compact.jsonl");
+    process.exit(1);
+  }
+
+  const jsonBodies = readBodies(jsonFile);
+  const compactBodies = readBodies(compactFile);
+
+  let jsonSamples = [];
+  let compactSamples = [];
+  let jsonMs = 0;
+  let compactMs = 0;
+
+  for (let round = 0; round < ROUNDS; round++) {
+    jsonSamples = [];
+    compactSamples = [];
+    jsonMs += time(() => {
+      for (const body of jsonBodies) {
+        jsonSamples.push(...JSON.parse(body).samples);
+      }
+    });
+    compactMs += time(() => {
+      for (const body of compactBodies) {
+        const decoded = wire.decodeBatch(JSON.parse(body));
+        decoded.commit();
+        compactSamples.push(...decoded.samples);
+      }
+    });
+  }
+
+  // Round-trip check on the fields the backend stores
+  let mismatches = 0;
+  jsonSamples.forEach((sample, i) => {
+    const other = compactSamples[i];
+    const same =
+      other &&
+      close(sample.cpu.cpu_percent, other.cpu.cpu_percent) &&
+      close(sample.memory.percent, other.memory.percent) &&
+      sample.memory.used === other.memory.used &&
+      close(sample.network.bytes_recv_per_sec, other.network.bytes_recv_per_sec) &&
+      close(sample.network.bytes_sent_per_sec, other.network.bytes_sent_per_sec) &&
+      new Date(sample.timestamp).getTime() === new Date(other.timestamp).getTime() &&
+      (sample.processes?.length ?? 0) === (other.processes?.length ?? 0) &&
+      (sample.processes || []).every((p, j) => p.name === other.processes[j].name);
+    if (!same) mismatches++;
+  });
+
+  const perSample = (ms) =>
+    ((ms / ROUNDS / jsonSamples.length) * 1000).toFixed(2);
+  console.log(`node json     parse          ${perSample(jsonMs)} us/sample`);
+  console.log(`node compact  parse+decode   ${perSample(compactMs)} us/sample`);
+  console.log(
+    `round trip    ${jsonSamples.length - mismatches}/${jsonSamples.length} samples match`
+  );
+  if (mismatches > 0) process.exit(1);
+};
+
+main();
@@ -0,0 +1,275 @@
+// Moves server_metrics from the old layout (random VARCHAR id, one unbounded
+// table) to the partitioned layout in storage.js, and backfills the 1m/1h
+// rollup tiers from it. server_metrics_rollups, the agents' own per-window
+// aggregates, is partitioned in place.
+//
+// Stop the backend first: its inserts only fit one of the two layouts. Agents
+// keep their samples spooled on disk and resend them once it is back up.
+//
+// Rows are copied an hour at a time in timestamp order, so the new ingest ids
+// follow time for the migrated history too. The copy can be interrupted and
+// rerun, it restarts from the last hour it had started. The old table is kept
+// as server_metrics_legacy unless --drop-legacy is given.
+//
+// Usage: node scripts/migrate-metrics.js [--drop-legacy]
+require("dotenv").config();
+const path = require("path");
+const mysql = require("mysql2/promise");
+const storage = require(path.join(__dirname, "..", "storage"));
+
+const NEW_TABLE = "server_metrics_new";
+const LEGACY_TABLE = "server_metrics_legacy";
+const COPY_SECONDS = 3600;
+const ROLLUP_IDS = 100000;
+
+const COLUMNS = [
+  "server_id",
+  "cpu_usage",
+  "memory_usage",
+  "memory_total",
+  "memory_used",
+  "disk_usage",
+  "disk_total",
+  "disk_used",
+  "network_usage",
+  "network_in",
+  "network_out",
+  "temperature",
+  "timestamp",
+];
+
+const tier = (name) => storage.TIERS.find((t) => t.name === name);
+
+const scalar = async (db, sql, params = []) => {
+  const [[row]] = await db.query(sql, params);
+  return Object.values(row)[0];
+};
+
+const tableExists = async (db, table) =>
+  (await scalar(
+    db,
+    `SELECT COUNT(*) FROM information_schema.TABLES
+     WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = ?`,
+    [table]
+  )) > 0;
+
+// Older databases never got network_usage, copy only what exists
+const legacyColumns = async (db) => {
+  const [rows] = await db.query(
+    `SELECT COLUMN_NAME AS name FROM information_schema.COLUMNS
+     WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'server_metrics'`
+  );
+  const present = new Set(rows.map((row) => row.name));
+  return COLUMNS.filter((column) => present.has(column));
+};
+
+const ensureTimestampIndex = async (db) => {
+  const indexed = await scalar(
+    db,
+    `SELECT COUNT(*) FROM information_schema.STATISTICS
+     WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'server_metrics'
+     AND COLUMN_NAME = 'timestamp' AND SEQ_IN_INDEX = 1`
+  );
+  if (indexed === 0) {
+    console.log("Indexing server_metrics.timestamp for the copy...");
+    await db.query(
+      "ALTER TABLE server_metrics ADD INDEX idx_migrate_timestamp (timestamp)"
+    );
+  }
+};
+
+const copySamples = async (db, columns) => {
+  const oldest = await scalar(
+    db,
+    "SELECT UNIX_TIMESTAMP(MIN(timestamp)) FROM server_metrics"
+  );
+  const newest = await scalar(
+    db,
+    "SELECT UNIX_TIMESTAMP(MAX(timestamp)) FROM server_metrics"
+  );
+  if (oldest === null) {
+    console.log("server_metrics is empty, nothing to copy");
+    return;
+  }
+
+  // The backend creates the rollup tiers at startup even before migrating, with
+  // partitions starting that day. Recreate them while still empty so the
+  // backfilled history gets partitions of its own and ages out on schedule.
+  for (const t of storage.TIERS.filter((t) => t.bucket > 0)) {
+    if (
+      (await tableExists(db, t.table)) &&
+      (await scalar(db, `SELECT COUNT(*) FROM ${t.table}`)) === 0
+    ) {
+      await db.query(`DROP TABLE ${t.table}`);
+    }
+  }
+  for (const statement of storage.tableStatements(Number(oldest), NEW_TABLE)) {
+    await db.query(statement);
+  }
+
+  // Resume from the hour that was being copied when a previous run stopped
+  let start = Math.floor(Number(oldest) / COPY_SECONDS) * COPY_SECONDS;
+  const copied = await scalar(
+    db,
+    `SELECT UNIX_TIMESTAMP(MAX(timestamp)) FROM ${NEW_TABLE}`
+  );
+  if (copied !== null) {
+    start = Math.floor(Number(copied) / COPY_SECONDS) * COPY_SECONDS;
+    await db.query(
+      `DELETE FROM ${NEW_TABLE} WHERE timestamp >= FROM_UNIXTIME(?)`,
+      [start]
+    );
+    console.log(`Resuming copy at ${new Date(start * 1000).toISOString()}`);
+  }
+
+  const list = columns.join(", ");
+  let total = 0;
+  for (; start <= Number(newest); start += COPY_SECONDS) {
+    const [result] = await db.query(
+      `INSERT INTO ${NEW_TABLE} (${list})
+       SELECT ${list} FROM server_metrics
+       WHERE timestamp >= FROM_UNIXTIME(?) AND timestamp < FROM_UNIXTIME(?)
+       ORDER BY timestamp`,
+      [start, start + COPY_SECONDS]
+    );
+    total += result.affectedRows;
+    if (result.affectedRows > 0) {
+      console.log(
+        `${new Date(start * 1000).toISOString()}: ${result.affectedRows} rows (${total} total)`
+      );
+    }
+  }
+
+  const skipped = await scalar(
+    db,
+    "SELECT COUNT(*) FROM server_metrics WHERE timestamp IS NULL"
+  );
+  if (skipped > 0) {
+    console.warn(`Skipped ${skipped} rows without a timestamp`);
+  }
+};
+
+// Drops the foreign key (partitioned tables can't have one), puts window_end
+// in the primary key and partitions the table from its oldest window
+const partitionAgentRollups = async (db) => {
+  const table = storage.AGENT_ROLLUPS.table;
+  if (
+    !(await tableExists(db, table)) ||
+    (await storage.isPartitioned(db, table))
+  ) {
+    return;
+  }
+
+  const [keys] = await db.query(
+    `SELECT CONSTRAINT_NAME AS name FROM information_schema.REFERENTIAL_CONSTRAINTS
+     WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = ?`,
+    [table]
+  );
+  for (const key of keys) {
+    await db.query(`ALTER TABLE ${table} DROP FOREIGN KEY ${key.name}`);
+  }
+  await db.query(`DELETE FROM ${table} WHERE window_end IS NULL`);
+  await db.query(
+    `ALTER TABLE ${table}
+     MODIFY window_end TIMESTAMP NOT NULL,
+     DROP PRIMARY KEY,
+     ADD PRIMARY KEY (id, window_end)`
+  );
+
+  const oldest = await scalar(
+    db,
+    `SELECT UNIX_TIMESTAMP(MIN(window_end)) FROM ${table}`
+  );
+  const from = oldest === null ? Math.floor(Date.now() / 1000) : Number(oldest);
+  console.log(`Partitioning ${table}...`);
+  await db.query(
+    `ALTER TABLE ${table} ${storage.partitionBy(storage.AGENT_ROLLUPS, from)}`
+  );
+};
+
+const backfillRollups = async (db) => {
+  const maxId = Number(
+    await scalar(db, "SELECT COALESCE(MAX(id), 0) FROM server_metrics")
+  );
+  for (let fromId = 0; fromId < maxId; fromId += ROLLUP_IDS) {
+    const toId = Math.min(fromId + ROLLUP_IDS, maxId);
+    const minutes = await storage.rollupTouched(db, tier("1m"), fromId, toId);
+    const hours = await storage.rollupTouched(db, tier("1h"), fromId, toId);
+    console.log(
+      `Rolled up ids ${fromId + 1}-${toId}: ${minutes} minute rows, ${hours} hour rows`
+    );
+  }
+  await db.query(
+    `INSERT INTO server_metrics_rollup_state (name, last_id, seen_id, updated_at)
+     VALUES ('rollup', ?, ?, NOW())
+     ON DUPLICATE KEY UPDATE last_id = VALUES(last_id), seen_id = VALUES(seen_id),
+       updated_at = VALUES(updated_at)`,
+    [maxId, maxId]
+  );
+};
+
+async function migrateMetrics() {
+  const dropLegacy = process.argv.includes("--drop-legacy");
+  const db = mysql.createPool({
+    host: process.env.DB_HOST,
+    port: parseInt(process.env.DB_PORT || "3306"),
+    user: process.env.DB_USER,
+    password: process.env.DB_PASSWORD,
+    database: process.env.DB_NAME,
+    connectionLimit: 1,
+  });
+
+  try {
+    if (await storage.isPartitioned(db)) {
+      console.log("server_metrics already uses the partitioned layout");
+    } else {
+      if (await tableExists(db, LEGACY_TABLE)) {
+        throw new Error(
+          `${LEGACY_TABLE} already exists, drop or rename it before migrating again`
+        );
+      }
+      await ensureTimestampIndex(db);
+      await copySamples(db, await legacyColumns(db));
+
+      if (await tableExists(db, NEW_TABLE)) {
+        await db.query(
+          `RENAME TABLE server_metrics TO ${LEGACY_TABLE}, ${NEW_TABLE} TO server_metrics`
+        );
+        console.log(`Swapped tables, the old data is in ${LEGACY_TABLE}`);
+      } else {
+        await db.query(`RENAME TABLE server_metrics TO ${LEGACY_TABLE}`);
+      }
+    }
+
+    await partitionAgentRollups(db);
+
+    // Creates whatever is still missing (tiers, state row, an empty table)
+    await storage.createTables(db);
+    const rolledUp = await scalar(
+      db,
+      "SELECT last_id FROM server_metrics_rollup_state WHERE name = 'rollup'"
+    );
+    if (Number(rolledUp) === 0) {
+      await backfillRollups(db);
+    }
+
+    const changes = await storage.maintainPartitions(db);
+    if (changes.length > 0) {
+      console.log("Partitions updated:", changes.join("; "));
+    }
+
+    if (dropLegacy && (await tableExists(db, LEGACY_TABLE))) {
+      await db.query(`DROP TABLE ${LEGACY_TABLE}`);
+      console.log(`Dropped ${LEGACY_TABLE}`);
+    }
+
+    console.log("Metrics migration complete");
+    await db.end();
+  } catch (error) {
+    console.error("Metrics migration failed:", error);
+    await db.end();
+    process.exit(1);
+  }
+}
+
+migrateMetrics();
@@ -10,6 +10,8 @@ const { v4: uuidv4 } = require("uuid");
 const dns = require('dns');
 const { promisify } = require('util');
 const lookup = promisify(dns.lookup);
+const wire = require("./wire");
+const storage = require("./storage");
 
 const app = express();
 
@@ -39,6 +41,17 @@ app.options("*", cors(corsOptions));
 // Enable CORS for all routes
 app.use(cors(corsOptions));
 
+// Agent batches (metrics, probe results and alert events drained from their
+// spools after an outage) are gzip-compressed and inflate well past regular API
+// bodies, parse them before the default 100kb JSON parser gets a chance to
+// reject them with a 413 the agent would treat as permanent
+const AGENT_BATCH_ROUTES = [
+  "/api/metrics/batch",
+  "/api/probes/results",
+  "/api/alerts/events",
+];
+app.use(AGENT_BATCH_ROUTES, express.json({ limit: "32mb" }));
+
 // Parse JSON bodies
 app.use(express.json());
 
@@ -93,7 +106,7 @@ app.use((req, res, next) => {
 
 // Add this near the top of your file, after other middleware
 app.use((req, res, next) => {
-  if (req.method === "POST") {
+  if (req.method === "POST" && !AGENT_BATCH_ROUTES.includes(req.path)) {
     console.log("Request body:", {
       ...req.body,
       token: req.body.token ? "***" : "not set",
@@ -305,34 +318,69 @@ app.get("/api/servers/:id/metrics/history", async (req, res) => {
   try {
     const { id } = req.params;
     const hours = parseInt(req.query.hours) || 24;
+    // Seconds per point, by default enough for about 500 points over the range
+    const resolution = parseInt(req.query.resolution) || null;
 
     console.log(`Fetching ${hours}h metrics history for server ${id}`);
 
+    const history = await storage.readHistory(db, id, hours, resolution);
+
+    res.json({
+      success: true,
+      tier: history.tier,
+      resolution: history.resolution,
+      data: history.rows,
+    });
+  } catch (error) {
+    console.error("Error fetching server metrics history:", error);
+    res.status(500).json({
+      success: false,
+      error: "Failed to fetch server metrics history",
+      details: error.message,
+    });
+  }
+});
+
+// Get agent rollups (min/max/mean/percentiles per window) for a server
+app.get("/api/servers/:id/metrics/rollups", async (req, res) => {
+  try {
+    const { id } = req.params;
+    const hours = parseInt(req.query.hours) || 24;
+    const window = parseInt(req.query.window) || 60;
+    const metric = req.query.metric || "cpu_percent";
+
     const [results] = await db.query(
       `SELECT 
-        timestamp,
-        cpu_usage,
-        memory_usage,
-        disk_usage,
-        network_in,
-        network_out,
-        temperature
-       FROM server_metrics
-       WHERE server_id = ? 
-       AND timestamp >= DATE_SUB(NOW(), INTERVAL ? HOUR)
-       ORDER BY timestamp DESC`,
-      [id, hours]
+        window_start,
+        window_end,
+        min_value,
+        max_value,
+        mean_value,
+        last_value,
+        p50,
+        p95,
+        p99,
+        sample_count
+       FROM server_metrics_rollups
+       WHERE server_id = ?
+       AND window_seconds = ?
+       AND metric = ?
+       AND window_end >= DATE_SUB(NOW(), INTERVAL ? HOUR)
+       ORDER BY window_end ASC`,
+      [id, window, metric, hours]
     );
 
     res.json({
       success: true,
+      window,
+      metric,
       data: results,
     });
   } catch (error) {
-    console.error("Error fetching server metrics history:", error);
+    console.error("Error fetching server metric rollups:", error);
     res.status(500).json({
       success: false,
-      error: "Failed to fetch server metrics history",
+      error: "Failed to fetch server metric rollups",
       details: error.message,
     });
   }
@@ -581,6 +629,7 @@ const createAlertsTable = async () => {
         created_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP,
         resolved_at TIMESTAMP NULL DEFAULT NULL,
         priority ENUM('low', 'medium', 'high', 'critical') DEFAULT 'medium',
+        source ENUM('backend', 'agent') NOT NULL DEFAULT 'backend',
         PRIMARY KEY (id),
         KEY idx_alerts_created_at (created_at),
         KEY idx_alerts_server_id (server_id),
@@ -589,6 +638,19 @@ const createAlertsTable = async () => {
         CONSTRAINT fk_alerts_website FOREIGN KEY (website_id) REFERENCES monitored_websites (id) ON DELETE CASCADE
       ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci
     `);
+
+    // Alerts opened by agents (/api/alerts/events) are told apart from the
+    // ones raised here, so an agent restart only resolves its own
+    const [[sourceColumn]] = await db.query(
+      `SELECT COUNT(*) AS count FROM information_schema.COLUMNS
+       WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'alerts'
+       AND COLUMN_NAME = 'source'`
+    );
+    if (sourceColumn.count === 0) {
+      await db.query(
+        "ALTER TABLE alerts ADD COLUMN source ENUM('backend', 'agent') NOT NULL DEFAULT 'backend'"
+      );
+    }
     console.log("Alerts table created or already exists");
   } catch (error) {
     console.error("Error creating alerts table:", error);
@@ -598,149 +660,171 @@ const createAlertsTable = async () => {
 // Call this when your server starts
 createAlertsTable();
 
-// Add a function to check server status periodically
-async function checkAllServersHealth() {
-  try {
-    const [servers] = await db.query('SELECT s.*, su.status as previous_status FROM servers s LEFT JOIN server_uptime su ON s.id = su.server_id WHERE s.status = "active"');
-    
-    for (const server of servers) {
-      try {
-        const response = await fetch(
-          `http://${server.ip_address}:${server.port}/health`,
-          { timeout: 5000 }
-        );
-
-        const isOnline = response.ok;
-        const currentStatus = isOnline ? 'online' : 'offline';
-        const previousStatus = server.previous_status || 'unknown';
-
-        // Update status
-        await db.query(
-          `UPDATE server_uptime SET status = ?, last_checked = NOW() WHERE server_id = ?`,
-          [currentStatus, server.id]
-        );
+// Agent liveness is tracked in memory from ingest traffic, so the database and
+// every server's /health endpoint no longer have to be polled each minute.
+// Agents report how often they upload (X-Upload-Interval), one that uploads
+// rarely is only flagged after missing a few of its own uploads.
+const AGENT_TIMEOUT_MS = parseInt(process.env.AGENT_TIMEOUT_MS || "60000");
+const AGENT_TIMEOUT_UPLOADS = 3;
+const agentHeartbeats = new Map();
+
+const raiseServerStatusAlert = async (
+  serverId,
+  serverName,
+  currentStatus,
+  previousStatus,
+  detail
+) => {
+  const severity = currentStatus === "offline" ? "critical" : "low";
+  const message =
+    currentStatus === "offline"
+      ? `Server ${serverName} is not responding${detail ? `: ${detail}` : ""}`
+      : `Server ${serverName} is back online`;
+
+  await db.query(
+    `UPDATE server_uptime SET status = ?, last_checked = NOW() WHERE server_id = ?`,
+    [currentStatus, serverId]
+  );
+
+  await db.query(
+    `INSERT INTO alerts (
+      id, server_id, type, severity, message,
+      status, priority, created_at
+    ) VALUES (
+      UUID(), ?, 'network', ?, ?,
+      'active', ?, NOW()
+    )`,
+    [serverId, severity, message, severity]
+  );
+
+  await db.query(
+    `INSERT INTO notifications (
+      id, type, message, data, is_read, created_at
+    ) VALUES (
+      UUID(), 'server_status', ?, ?, 0, NOW()
+    )`,
+    [
+      message,
+      JSON.stringify({
+        server_id: serverId,
+        server_name: serverName,
+        status: currentStatus,
+        severity: severity,
+        previous_status: previousStatus,
+      }),
+    ]
+  );
+
+  console.log(
+    `Created alert and notification for server ${serverName}: ${currentStatus} (was: ${previousStatus})`
+  );
+};
 
-        // Create alert and notification if status changed
-        if (previousStatus !== currentStatus) {
-          const severity = currentStatus === 'offline' ? 'critical' : 'low';
-          const message = currentStatus === 'offline' 
-            ? `Server ${server.name} is not responding`
-            : `Server ${server.name} is back online`;
+const agentTimeout = (heartbeat) =>
+  Math.max(AGENT_TIMEOUT_MS, (heartbeat.uploadInterval || 0) * AGENT_TIMEOUT_UPLOADS);
 
-          // Insert alert
-          await db.query(
-            `INSERT INTO alerts (
-              id, server_id, type, severity, message,
-              status, priority, created_at
-            ) VALUES (
-              UUID(), ?, 'network', ?, ?,
-              'active', ?, NOW()
-            )`,
-            [
-              server.id,
-              severity,
-              message,
-              severity
-            ]
-          );
+// Called whenever an agent delivers anything
+const markAgentSeen = async (serverId, req) => {
+  const now = Date.now();
+  let heartbeat = agentHeartbeats.get(serverId);
+  const uploadInterval = parseFloat(req?.get("X-Upload-Interval")) * 1000;
 
-          // Insert notification
-          await db.query(
-            `INSERT INTO notifications (
-              id, type, message, data, is_read, created_at
-            ) VALUES (
-              UUID(), 'server_status', ?, ?, 0, NOW()
-            )`,
-            [
-              message,
-              JSON.stringify({
-                server_id: server.id,
-                server_name: server.name,
-                status: currentStatus,
-                severity: severity,
-                previous_status: previousStatus
-              })
-            ]
-          );
+  if (!heartbeat) {
+    const [servers] = await db.query(
+      `SELECT s.name, su.status FROM servers s
+       LEFT JOIN server_uptime su ON s.id = su.server_id
+       WHERE s.id = ?`,
+      [serverId]
+    );
+    if (!servers.length) return;
+    heartbeat = {
+      name: servers[0].name,
+      status: servers[0].status || "unknown",
+      lastSeen: now,
+      lastWritten: 0,
+    };
+    agentHeartbeats.set(serverId, heartbeat);
+  }
 
-          console.log(`Created alert and notification for server ${server.name}: ${currentStatus} (was: ${previousStatus})`);
-        }
-      } catch (error) {
-        console.error(`Error checking server ${server.id}:`, error);
-        
-        // Only create alert and notification if server wasn't already offline
-        if (server.previous_status !== 'offline') {
-          // Create alert for connection error
-          await db.query(
-            `INSERT INTO alerts (
-              id, server_id, type, severity, message,
-              status, priority, created_at
-            ) VALUES (
-              UUID(), ?, 'network', 'critical', ?,
-              'active', 'critical', NOW()
-            )`,
-            [server.id, `Server ${server.name} is not responding: ${error.message}`]
-          );
+  heartbeat.lastSeen = now;
+  if (uploadInterval > 0) {
+    heartbeat.uploadInterval = uploadInterval;
+  }
+  if (heartbeat.status !== "online") {
+    const previousStatus = heartbeat.status;
+    heartbeat.status = "online";
+    heartbeat.lastWritten = now;
+    if (previousStatus === "offline") {
+      await raiseServerStatusAlert(serverId, heartbeat.name, "online", previousStatus);
+    } else {
+      await db.query(
+        `UPDATE server_uptime SET status = 'online', last_checked = NOW() WHERE server_id = ?`,
+        [serverId]
+      );
+    }
+  } else if (now - heartbeat.lastWritten >= AGENT_TIMEOUT_MS) {
+    // Refresh last_checked at most once per timeout window
+    heartbeat.lastWritten = now;
+    await db.query(
+      `UPDATE server_uptime SET last_checked = NOW() WHERE server_id = ?`,
+      [serverId]
+    );
+  }
+};
 
-          // Create notification for error
-          await db.query(
-            `INSERT INTO notifications (
-              id, type, message, data, is_read, created_at
-            ) VALUES (
-              UUID(), 'server_error', ?, ?, 0, NOW()
-            )`,
-            [
-              `Server ${server.name} is not responding: ${error.message}`,
-              JSON.stringify({
-                server_id: server.id,
-                server_name: server.name,
-                error: error.message,
-                severity: 'critical',
-                previous_status: server.previous_status
-              })
-            ]
-          );
-        }
+// Flag agents that went quiet, purely from the in-memory heartbeats
+async function checkAgentHeartbeats() {
+  const now = Date.now();
+  for (const [serverId, heartbeat] of agentHeartbeats) {
+    if (heartbeat.status === "offline" || now - heartbeat.lastSeen <= agentTimeout(heartbeat)) {
+      continue;
+    }
+    const previousStatus = heartbeat.status;
+    heartbeat.status = "offline";
+    try {
+      await raiseServerStatusAlert(
+        serverId,
+        heartbeat.name,
+        "offline",
+        previousStatus,
+        `no data received for ${Math.round((now - heartbeat.lastSeen) / 1000)}s`
+      );
+    } catch (error) {
+      console.error(`Error marking server ${serverId} offline:`, error);
+    }
+  }
+}
 
-        // Update status to offline
-        await db.query(
-          `UPDATE server_uptime SET status = 'offline', last_checked = NOW() WHERE server_id = ?`,
-          [server.id]
-        );
-      }
+// Seed once at startup so agents that never report again are still noticed
+const seedAgentHeartbeats = async () => {
+  try {
+    const [servers] = await db.query(
+      `SELECT s.id, s.name, su.status FROM servers s
+       LEFT JOIN server_uptime su ON s.id = su.server_id
+       WHERE s.status = "active"`
+    );
+    const now = Date.now();
+    for (const server of servers) {
+      agentHeartbeats.set(server.id, {
+        name: server.name,
+        status: server.status || "unknown",
+        lastSeen: now,
+        lastWritten: now,
+      });
     }
   } catch (error) {
-    console.error('Error in checkAllServersHealth:', error);
+    console.error("Error seeding agent heartbeats:", error);
   }
-}
+};
 
-// Make sure to call this function periodically
-setInterval(checkAllServersHealth, 60000); // Check every minute
-checkAllServersHealth(); // Initial check
+seedAgentHeartbeats();
+setInterval(checkAgentHeartbeats, 5000);
 
 // Add this function near your createAlertsTable function
+let metricsStorageReady = false;
+
 const createMetricsTables = async () => {
   try {
-    // Create server_metrics table
-    await db.query(`
-      CREATE TABLE IF NOT EXISTS server_metrics (
-        id VARCHAR(255) PRIMARY KEY,
-        server_id VARCHAR(255) NOT NULL,
-        cpu_usage FLOAT,
-        memory_usage FLOAT,
-        memory_total BIGINT,
-        memory_used BIGINT,
-        disk_usage FLOAT,
-        disk_total BIGINT,
-        disk_used BIGINT,
-        network_in FLOAT,
-        network_out FLOAT,
-        temperature FLOAT,
-        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (server_id) REFERENCES servers(id) ON DELETE CASCADE
-      ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
-    `);
-
     // Create server_processes table if you need it
     await db.query(`
       CREATE TABLE IF NOT EXISTS server_processes (
@@ -755,6 +839,22 @@ const createMetricsTables = async () => {
       ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
     `);
 
+    // server_metrics, its rollup tiers and the agent rollups, see storage.js
+    const legacy = await storage.createTables(db);
+    if (legacy.length > 0) {
+      console.error(
+        `${legacy.join(", ")} still on the old unpartitioned layout, run ` +
+          "`node scripts/migrate-metrics.js` to move it over"
+      );
+    }
+    // Metric inserts leave the id to AUTO_INCREMENT, the old table has none.
+    // Agents spool their samples meanwhile and resend them once migrated.
+    if (legacy.includes("server_metrics")) {
+      console.error("Refusing to start until server_metrics is migrated");
+      process.exit(1);
+    }
+    metricsStorageReady = true;
+
     console.log("Metrics tables created or already exist");
   } catch (error) {
     console.error("Error creating metrics tables:", error);
@@ -762,7 +862,47 @@ const createMetricsTables = async () => {
 };
 
 // Call this when your server starts
-createMetricsTables();
+createMetricsTables().then(() => maintainMetricsPartitions());
+
+const METRICS_ROLLUP_INTERVAL_MS = parseInt(
+  process.env.METRICS_ROLLUP_INTERVAL_MS || "60000"
+);
+
+// Roll new samples up into the 1m/1h tiers
+async function rollupMetrics() {
+  if (!metricsStorageReady) {
+    return;
+  }
+  try {
+    const pass = await storage.runRollups(db);
+    if (pass && pass.toId > pass.fromId) {
+      console.log(
+        `Rolled up metrics ${pass.fromId + 1}-${pass.toId}: ` +
+          `${pass.minutes} minute rows, ${pass.hours} hour rows`
+      );
+    }
+  } catch (error) {
+    console.error("Error rolling up metrics:", error);
+  }
+}
+
+// Keep partitions ahead of ingest and drop the ones past retention
+async function maintainMetricsPartitions() {
+  if (!metricsStorageReady) {
+    return;
+  }
+  try {
+    const changes = await storage.maintainPartitions(db);
+    if (changes.length > 0) {
+      console.log("Metrics partitions updated:", changes.join("; "));
+    }
+  } catch (error) {
+    console.error("Error maintaining metrics partitions:", error);
+  }
+}
+
+setInterval(rollupMetrics, METRICS_ROLLUP_INTERVAL_MS);
+setInterval(maintainMetricsPartitions, 60 * 60 * 1000);
 
 // Keep your other routes...
 
@@ -786,10 +926,10 @@ async function collectAndStoreMetrics() {
         // Store metrics in database
         await db.query(
           `INSERT INTO server_metrics 
-           (id, server_id, cpu_usage, memory_usage, memory_total, memory_used,
+           (server_id, cpu_usage, memory_usage, memory_total, memory_used,
             disk_usage, disk_total, disk_used, network_in, network_out, 
             temperature, timestamp)
-           VALUES (UUID(), ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, NOW())`,
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, NOW())`,
           [
             server.id,
             cpuLoad.currentLoad,
@@ -998,9 +1138,9 @@ app.get("/api/servers/:id/metrics", async (req, res) => {
         // Store the new metrics
         await db.query(
           `INSERT INTO server_metrics (
-            id, server_id, cpu_usage, memory_usage, 
+            server_id, cpu_usage, memory_usage, 
             disk_usage, network_usage, timestamp
-          ) VALUES (UUID(), ?, ?, ?, ?, ?, NOW())`,
+          ) VALUES (?, ?, ?, ?, ?, NOW())`,
           [
             id,
             healthData.cpu.usage,
@@ -1038,17 +1178,64 @@ app.get("/api/servers/:id/metrics", async (req, res) => {
   }
 });
 
+// Last cumulative counters per server from senders that post no rates, so a
+// rate can be derived from two consecutive samples
+const legacyNetworkCounters = new Map();
+
+const legacyNetworkRates = (serverId, network = {}) => {
+  if (network.bytes_recv_per_sec != null || network.bytes_sent_per_sec != null) {
+    return {
+      networkIn: network.bytes_recv_per_sec ?? null,
+      networkOut: network.bytes_sent_per_sec ?? null,
+    };
+  }
+  if (network.bytes_recv == null || network.bytes_sent == null) {
+    return { networkIn: null, networkOut: null };
+  }
+
+  const now = Date.now();
+  const previous = legacyNetworkCounters.get(serverId);
+  legacyNetworkCounters.set(serverId, {
+    recv: network.bytes_recv,
+    sent: network.bytes_sent,
+    at: now,
+  });
+  const elapsed = previous ? (now - previous.at) / 1000 : 0;
+  // Nothing to compare against yet, or the counters were reset (reboot)
+  if (
+    elapsed <= 0 ||
+    network.bytes_recv < previous.recv ||
+    network.bytes_sent < previous.sent
+  ) {
+    return { networkIn: null, networkOut: null };
+  }
+  return {
+    networkIn: (network.bytes_recv - previous.recv) / elapsed,
+    networkOut: (network.bytes_sent - previous.sent) / elapsed,
+  };
+};
+
 // Update the metrics endpoint to store all values
 app.post("/api/metrics", async (req, res) => {
   try {
     const metrics = req.body;
     const serverId = metrics.server_id;
-    const metricId = require("crypto").randomUUID();
 
-    // Store metrics in database with generated ID
+    markAgentSeen(serverId, req).catch((error) =>
+      console.error(`Error updating heartbeat for ${serverId}:`, error)
+    );
+
+    // Newer agents send per-second rates, older ones only cumulative counters
+    // which are turned into a rate against their previous sample
+    const { networkIn, networkOut } = legacyNetworkRates(
+      serverId,
+      metrics.network
+    );
+    const toMB = (bytes) => (bytes === null ? null : bytes / (1024 * 1024));
+
+    // Store metrics in database
     await db.query(
       `INSERT INTO server_metrics (
-        id, 
         server_id, 
         cpu_usage, 
         memory_usage,
@@ -1061,9 +1248,8 @@ app.post("/api/metrics", async (req, res) => {
         network_in,
         network_out,
         timestamp
-      ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, NOW())`,
+      ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, NOW())`,
       [
-        metricId,
         serverId,
         metrics.cpu.cpu_percent,
         metrics.memory.percent,
@@ -1072,10 +1258,11 @@ app.post("/api/metrics", async (req, res) => {
         metrics.disk.percent,
         metrics.disk.total,
         metrics.disk.used,
-        (metrics.network.bytes_sent + metrics.network.bytes_recv) /
-          (1024 * 1024), // Total network in MB/s
-        metrics.network.bytes_recv / (1024 * 1024), // Network in in MB/s
-        metrics.network.bytes_sent / (1024 * 1024), // Network out in MB/s
+        networkIn === null || networkOut === null
+          ? null
+          : toMB(networkIn + networkOut), // Total network in MB/s
+        toMB(networkIn), // Network in in MB/s
+        toMB(networkOut), // Network out in MB/s
       ]
     );
 
@@ -1113,6 +1300,569 @@ app.post("/api/metrics", async (req, res) => {
   }
 });
 
+// Map one agent sample onto a server_metrics row, using the agent's own
+// sampling time and its computed rates rather than cumulative counters
+const toMetricsRow = (serverId, sample) => {
+  const network = sample.network || {};
+  const bytesIn = network.bytes_recv_per_sec || 0;
+  const bytesOut = network.bytes_sent_per_sec || 0;
+  const timestamp = sample.timestamp ? new Date(sample.timestamp) : new Date();
+
+  return [
+    serverId,
+    sample.cpu?.cpu_percent ?? null,
+    sample.memory?.percent ?? null,
+    sample.memory?.total ?? null,
+    sample.memory?.used ?? null,
+    sample.disk?.percent ?? null,
+    sample.disk?.total ?? null,
+    sample.disk?.used ?? null,
+    (bytesIn + bytesOut) / (1024 * 1024), // Total network in MB/s
+    bytesIn / (1024 * 1024), // Network in in MB/s
+    bytesOut / (1024 * 1024), // Network out in MB/s
+    isNaN(timestamp.getTime()) ? new Date() : timestamp,
+  ];
+};
+
+// The primary (finest) rollup window stands in for raw samples in
+// server_metrics so existing charts keep working off the window means
+const rollupToSample = (rollup) => {
+  const mean = (name) => rollup.metrics?.[name]?.mean ?? null;
+  return {
+    timestamp: rollup.timestamp,
+    cpu: { cpu_percent: mean("cpu_percent") },
+    memory: { ...rollup.memory, percent: mean("memory_percent") },
+    disk: { ...rollup.disk, percent: mean("disk_percent") },
+    network: {
+      bytes_recv_per_sec: mean("network_in"),
+      bytes_sent_per_sec: mean("network_out"),
+    },
+  };
+};
+
+// One server_metrics_rollups row per metric per window
+const toRollupRows = (serverId, rollup) =>
+  Object.entries(rollup.metrics || {}).map(([metric, stats]) => [
+    serverId,
+    Math.round(rollup.window),
+    metric,
+    stats.min,
+    stats.max,
+    stats.mean,
+    stats.last,
+    stats.p50,
+    stats.p95,
+    stats.p99,
+    rollup.count,
+    new Date(rollup.start),
+    new Date(rollup.timestamp),
+  ]);
+
+// Batch ingest for spooled agent samples, one multi-row INSERT per batch
+app.post("/api/metrics/batch", async (req, res) => {
+  let serverId = req.body?.server_id;
+  let samples = req.body?.samples;
+  let decoded = null;
+
+  // Agents running WIRE_FORMAT=compact send versioned, delta-encoded frames
+  if (req.body?.v !== undefined) {
+    try {
+      decoded = wire.decodeBatch(req.body);
+      serverId = decoded.serverId;
+      samples = decoded.samples;
+    } catch (error) {
+      if (error instanceof wire.ResyncError) {
+        return res.status(409).json({
+          success: false,
+          error: "resync",
+          details: error.message,
+        });
+      }
+      return res.status(400).json({
+        success: false,
+        error: "Failed to decode metrics batch",
+        details: error.message,
+      });
+    }
+  }
+
+  if (!serverId || !Array.isArray(samples) || samples.length === 0) {
+    return res.status(400).json({
+      success: false,
+      error: "server_id and a non-empty samples array are required",
+    });
+  }
+
+  markAgentSeen(serverId, req).catch((error) =>
+    console.error(`Error updating heartbeat for ${serverId}:`, error)
+  );
+
+  // Agents number their spooled samples, so a batch resent after a lost
+  // response only stores what the first attempt did not
+  const spoolId = req.get("X-Spool-Id");
+  const firstSeq = Number(req.get("X-Spool-Seq"));
+
+  let connection;
+  try {
+    connection = await db.getConnection();
+    await connection.beginTransaction();
+
+    let duplicates = 0;
+    if (spoolId && Number.isSafeInteger(firstSeq) && firstSeq > 0) {
+      duplicates = await storage.claimBatch(
+        connection,
+        serverId,
+        spoolId,
+        firstSeq,
+        samples.length
+      );
+    }
+    const fresh = duplicates > 0 ? samples.slice(duplicates) : samples;
+
+    const rollups = fresh.filter((sample) => sample.type === "rollup");
+    const rows = fresh
+      .filter((sample) => sample.type !== "rollup")
+      .concat(rollups.filter((rollup) => rollup.primary).map(rollupToSample))
+      .map((sample) => toMetricsRow(serverId, sample));
+    const rollupRows = rollups.flatMap((rollup) =>
+      toRollupRows(serverId, rollup)
+    );
+
+    // Only the newest process table in the batch matters, older ones would be
+    // replaced straight away
+    const latestProcesses = [...fresh]
+      .reverse()
+      .find((sample) => Array.isArray(sample.processes));
+
+    if (rows.length > 0) {
+      await connection.query(
+        `INSERT INTO server_metrics (
+          server_id,
+          cpu_usage,
+          memory_usage,
+          memory_total,
+          memory_used,
+          disk_usage,
+          disk_total,
+          disk_used,
+          network_usage,
+          network_in,
+          network_out,
+          timestamp
+        ) VALUES ?`,
+        [rows]
+      );
+    }
+
+    if (rollupRows.length > 0) {
+      await connection.query(
+        `INSERT INTO server_metrics_rollups (
+          server_id,
+          window_seconds,
+          metric,
+          min_value,
+          max_value,
+          mean_value,
+          last_value,
+          p50,
+          p95,
+          p99,
+          sample_count,
+          window_start,
+          window_end
+        ) VALUES ?`,
+        [rollupRows]
+      );
+    }
+
+    if (latestProcesses) {
+      await connection.query(
+        "DELETE FROM server_processes WHERE server_id = ?",
+        [serverId]
+      );
+
+      if (latestProcesses.processes.length > 0) {
+        await connection.query(
+          `INSERT INTO server_processes 
+           (id, server_id, pid, name, cpu_usage, memory_usage, disk_usage, timestamp) 
+           VALUES ?`,
+          [
+            latestProcesses.processes.map((process) => [
+              require("crypto").randomUUID(),
+              serverId,
+              process.pid,
+              process.name,
+              process.cpu_usage || process.cpu_percent,
+              process.memory_usage || process.memory_percent,
+              process.disk_usage || 0,
+              new Date(),
+            ]),
+          ]
+        );
+      }
+    }
+
+    await connection.commit();
+    if (decoded) {
+      decoded.commit();
+    }
+
+    res.json({
+      success: true,
+      inserted: rows.length,
+      rollups: rollupRows.length,
+      duplicates,
+    });
+  } catch (error) {
+    if (connection) {
+      await connection.rollback();
+    }
+    console.error("Error storing metrics batch:", error);
+    res.status(500).json({
+      success: false,
+      error: "Failed to store metrics batch",
+      details: error.message,
+    });
+  } finally {
+    if (connection) {
+      connection.release();
+    }
+  }
+});
+
+// Alert open/resolve events evaluated on the agent, pushed as they happen.
+// Agent alert ids are used as the row id so a resent event is a no-op.
+app.post("/api/alerts/events", async (req, res) => {
+  const { server_id: serverId, events } = req.body || {};
+
+  if (!serverId || !Array.isArray(events)) {
+    return res.status(400).json({
+      success: false,
+      error: "server_id and an events array are required",
+    });
+  }
+
+  markAgentSeen(serverId, req).catch((error) =>
+    console.error(`Error updating heartbeat for ${serverId}:`, error)
+  );
+
+  let connection;
+  try {
+    connection = await db.getConnection();
+    await connection.beginTransaction();
+
+    // Resent opens are skipped without a notification. mysql2 reports an
+    // unchanged duplicate as one affected row, so they are looked up first.
+    const openIds = events
+      .filter((event) => event.event === "open")
+      .map((event) => event.id);
+    const known = new Set();
+    if (openIds.length > 0) {
+      const [existing] = await connection.query(
+        "SELECT id FROM alerts WHERE id IN (?)",
+        [openIds]
+      );
+      existing.forEach((row) => known.add(row.id));
+    }
+
+    const notifications = [];
+    for (const event of events) {
+      const timestamp = event.timestamp ? new Date(event.timestamp) : new Date();
+
+      if (event.event === "open") {
+        if (known.has(event.id)) continue;
+        known.add(event.id);
+        // Only a duplicate id is tolerated, a type or enum mismatch still fails
+        await connection.query(
+          `INSERT INTO alerts (
+            id, server_id, type, severity, message,
+            status, priority, source, created_at
+          ) VALUES (?, ?, ?, ?, ?, 'active', ?, 'agent', ?)
+          ON DUPLICATE KEY UPDATE id = id`,
+          [
+            event.id,
+            serverId,
+            event.type,
+            event.severity,
+            event.message,
+            event.severity,
+            timestamp,
+          ]
+        );
+        notifications.push(event);
+      } else if (event.event === "resolve") {
+        const [result] = await connection.query(
+          `UPDATE alerts SET status = 'resolved', resolved_at = ?
+           WHERE id = ? AND server_id = ? AND status = 'active'`,
+          [timestamp, event.id, serverId]
+        );
+        if (result.affectedRows > 0) notifications.push(event);
+      } else if (event.event === "reset") {
+        // The agent restarted, alerts it opened before can never resolve now.
+        // Offline alerts raised by the backend stay until it sees the server.
+        await connection.query(
+          `UPDATE alerts SET status = 'resolved', resolved_at = ?
+           WHERE server_id = ? AND status = 'active'
+           AND source = 'agent'
+           AND created_at <= ?`,
+          [timestamp, serverId, timestamp]
+        );
+      }
+    }
+
+    if (notifications.length > 0) {
+      await connection.query(
+        `INSERT INTO notifications (
+          id, type, message, data, is_read, created_at
+        ) VALUES ?`,
+        [
+          notifications.map((event) => [
+            require("crypto").randomUUID(),
+            event.event === "open" ? "server_alert" : "server_alert_resolved",
+            event.message,
+            JSON.stringify({
+              server_id: serverId,
+              alert_id: event.id,
+              rule: event.rule,
+              metric: event.metric,
+              value: event.value,
+              threshold: event.threshold,
+              severity: event.severity,
+            }),
+            0,
+            new Date(),
+          ]),
+        ]
+      );
+    }
+
+    await connection.commit();
+
+    res.json({ success: true, applied: notifications.length });
+  } catch (error) {
+    if (connection) {
+      await connection.rollback();
+    }
+    console.error("Error storing alert events:", error);
+    res.status(500).json({
+      success: false,
+      error: "Failed to store alert events",
+      details: error.message,
+    });
+  } finally {
+    if (connection) {
+      connection.release();
+    }
+  }
+});
+
+// Website uptime checks can be handed to the agents (WEBSITE_PROBES=agent).
+// Each website goes to one of the agents that asked for targets recently,
+// picked by rendezvous hashing so an agent joining or leaving only moves its
+// own share, and the API process stops probing itself.
+const WEBSITE_PROBES = process.env.WEBSITE_PROBES || "backend";
+const PROBE_AGENT_TIMEOUT_MS = parseInt(
+  process.env.PROBE_AGENT_TIMEOUT_MS || "180000"
+);
+const probeAgents = new Map();
+
+const rendezvousScore = (agentId, websiteId) =>
+  require("crypto")
+    .createHash("md5")
+    .update(`${agentId}:${websiteId}`)
+    .digest()
+    .readUInt32BE(0);
+
+// Hashing every website against every agent blocks the event loop for a while
+// on a large fleet, so the split is cached until the live agents or the
+// website list change. The web app edits websites directly in the database,
+// hence the checksum rather than a version bumped by this process.
+let probeAssignment = { agents: null, version: null, targets: new Map() };
+
+const websiteListVersion = async () => {
+  const [[row]] = await db.query(
+    `SELECT COUNT(*) AS count,
+       BIT_XOR(CRC32(CONCAT_WS('|', id, url, check_interval))) AS checksum
+     FROM monitored_websites`
+  );
+  return `${row.count}:${row.checksum}`;
+};
+
+const assignProbeTargets = async (agents) => {
+  const key = [...agents].sort().join(",");
+  const version = await websiteListVersion();
+  if (probeAssignment.agents === key && probeAssignment.version === version) {
+    return probeAssignment.targets;
+  }
+
+  const [websites] = await db.query(
+    "SELECT id, url, check_interval FROM monitored_websites"
+  );
+  const targets = new Map(agents.map((agentId) => [agentId, []]));
+  for (const website of websites) {
+    let owner = null;
+    let best = -1;
+    for (const agentId of agents) {
+      const score = rendezvousScore(agentId, website.id);
+      if (score > best) {
+        best = score;
+        owner = agentId;
+      }
+    }
+    targets.get(owner).push({
+      id: website.id,
+      url: website.url,
+      interval: website.check_interval,
+    });
+  }
+  probeAssignment = { agents: key, version, targets };
+  return targets;
+};
+
+app.get("/api/probes/targets", async (req, res) => {
+  const serverId = req.query.server_id;
+
+  if (!serverId) {
+    return res.status(400).json({
+      success: false,
+      error: "server_id is required",
+    });
+  }
+
+  if (WEBSITE_PROBES !== "agent") {
+    return res.json({ success: true, targets: [] });
+  }
+
+  const now = Date.now();
+  probeAgents.set(serverId, now);
+  for (const [agentId, lastSeen] of probeAgents) {
+    if (now - lastSeen > PROBE_AGENT_TIMEOUT_MS) probeAgents.delete(agentId);
+  }
+
+  try {
+    const assignment = await assignProbeTargets([...probeAgents.keys()]);
+    res.json({ success: true, targets: assignment.get(serverId) || [] });
+  } catch (error) {
+    console.error("Error fetching probe targets:", error);
+    res.status(500).json({
+      success: false,
+      error: "Failed to fetch probe targets",
+      details: error.message,
+    });
+  }
+});
+
+// Probe results in batches, in the order the agent recorded them
+app.post("/api/probes/results", async (req, res) => {
+  const { server_id: serverId, results } = req.body || {};
+
+  if (!serverId || !Array.isArray(results)) {
+    return res.status(400).json({
+      success: false,
+      error: "server_id and a results array are required",
+    });
+  }
+
+  const valid = results.filter(
+    (result) =>
+      result.website_id && (result.status === "up" || result.status === "down")
+  );
+  if (valid.length === 0) {
+    return res.json({ success: true, stored: 0 });
+  }
+
+  let connection;
+  try {
+    connection = await db.getConnection();
+
+    // Websites deleted since the agent fetched its targets are dropped here
+    const [websites] = await connection.query(
+      "SELECT id, name, status FROM monitored_websites WHERE id IN (?)",
+      [[...new Set(valid.map((result) => result.website_id))]]
+    );
+    const current = new Map(websites.map((website) => [website.id, website]));
+    const rows = valid.filter((result) => current.has(result.website_id));
+
+    const alerts = [];
+    const latest = new Map();
+    for (const result of rows) {
+      const website = current.get(result.website_id);
+      const previous = latest.get(website.id)?.status ?? website.status;
+      if ((previous === "up" || previous === "down") && previous !== result.status) {
+        alerts.push([
+          require("crypto").randomUUID(),
+          website.id,
+          "website",
+          result.status === "down" ? "critical" : "low",
+          result.status === "down"
+            ? `Website ${website.name} is down: ${result.error_message}`
+            : `Website ${website.name} is back online`,
+          "active",
+          result.status === "down" ? "critical" : "low",
+          new Date(result.timestamp),
+        ]);
+      }
+      latest.set(website.id, result);
+    }
+
+    await connection.beginTransaction();
+
+    if (rows.length > 0) {
+      await connection.query(
+        `INSERT INTO website_uptime (
+          id, website_id, status, response_time, error_message, timestamp
+        ) VALUES ?`,
+        [
+          rows.map((result) => [
+            require("crypto").randomUUID(),
+            result.website_id,
+            result.status,
+            result.response_time,
+            result.error_message,
+            new Date(result.timestamp),
+          ]),
+        ]
+      );
+    }
+
+    for (const [websiteId, result] of latest) {
+      await connection.query(
+        `UPDATE monitored_websites
+         SET status = ?, last_checked = ?, response_time = ?
+         WHERE id = ?`,
+        [result.status, new Date(result.timestamp), result.response_time, websiteId]
+      );
+    }
+
+    if (alerts.length > 0) {
+      await connection.query(
+        `INSERT INTO alerts (
+          id, website_id, type, severity, message, status, priority, created_at
+        ) VALUES ?`,
+        [alerts]
+      );
+    }
+
+    await connection.commit();
+
+    res.json({ success: true, stored: rows.length });
+  } catch (error) {
+    if (connection) {
+      await connection.rollback();
+    }
+    console.error("Error storing probe results:", error);
+    res.status(500).json({
+      success: false,
+      error: "Failed to store probe results",
+      details: error.message,
+    });
+  } finally {
+    if (connection) {
+      connection.release();
+    }
+  }
+});
+
 // Add or update the server details endpoint
 app.get("/api/servers/:id", async (req, res) => {
   try {
@@ -1178,9 +1928,11 @@ app.delete("/api/servers/:id", async (req, res) => {
       // Delete related records first
       await db.query("DELETE FROM server_uptime WHERE server_id = ?", [id]);
       await db.query("DELETE FROM server_processes WHERE server_id = ?", [id]);
-      await db.query("DELETE FROM server_metrics WHERE server_id = ?", [id]);
+      await storage.deleteServerMetrics(db, id);
       await db.query("DELETE FROM alerts WHERE server_id = ?", [id]);
       await db.query("DELETE FROM server_actions WHERE server_id = ?", [id]);
+      agentHeartbeats.delete(id);
+      legacyNetworkCounters.delete(id);
 
       // Finally delete the server
       const [result] = await db.query("DELETE FROM servers WHERE id = ?", [id]);
@@ -1407,10 +2159,12 @@ async function monitorWebsites() {
   }
 }
 
-// Start website monitoring
+// Start website monitoring, unless the agents have taken it over
 const MONITOR_INTERVAL = 10000; // Check every 10 seconds
-setInterval(monitorWebsites, MONITOR_INTERVAL);
-monitorWebsites(); // Initial check
+if (WEBSITE_PROBES !== "agent") {
+  setInterval(monitorWebsites, MONITOR_INTERVAL);
+  monitorWebsites(); // Initial check
+}
 
 // Add API endpoint for website uptime history
 app.get("/api/websites/:id/uptime", async (req, res) => {
@@ -0,0 +1,516 @@
+// Time-partitioned storage for agent metrics.
+//
+// Samples land in server_metrics, keyed by an AUTO_INCREMENT id so inserts
+// always append to the end of the clustered index. A background job rolls
+// them up into server_metrics_1m and server_metrics_1h (average and peak per
+// bucket, keyed by server and bucket start). Every tier is RANGE-partitioned
+// on its time column, so retention is a DROP PARTITION rather than a DELETE
+// over millions of rows, and history reads only touch the partitions inside
+// the requested range.
+//
+// MySQL does not allow foreign keys on partitioned tables and requires the
+// partition column in every unique key: these tables have no cascade from
+// servers (deleteServerMetrics does it explicitly) and server_metrics uses
+// (id, timestamp) as its primary key.
+
+const DAY = 86400;
+
+const days = (name, fallback) => {
+  const value = parseInt(process.env[name]);
+  return Number.isNaN(value) ? fallback : value;
+};
+
+// Finest first. bucket is the tier's resolution in seconds, raw samples come
+// at whatever interval the agent runs and count as 0. A retention of 0 keeps
+// the data forever.
+const TIERS = [
+  {
+    name: "raw",
+    table: "server_metrics",
+    column: "timestamp",
+    bucket: 0,
+    spanDays: 1,
+    retentionDays: days("METRICS_RAW_RETENTION_DAYS", 14),
+  },
+  {
+    name: "1m",
+    table: "server_metrics_1m",
+    column: "bucket",
+    bucket: 60,
+    spanDays: 7,
+    retentionDays: days("METRICS_1M_RETENTION_DAYS", 90),
+  },
+  {
+    name: "1h",
+    table: "server_metrics_1h",
+    column: "bucket",
+    bucket: 3600,
+    spanDays: 30,
+    retentionDays: days("METRICS_1H_RETENTION_DAYS", 0),
+  },
+];
+
+// Per-window aggregates (min/max/mean/percentiles) shipped by agents running
+// with ROLLUP_WINDOWS. readHistory never picks it, but it is partitioned and
+// aged out like the tiers.
+const AGENT_ROLLUPS = {
+  name: "agent",
+  table: "server_metrics_rollups",
+  column: "window_end",
+  spanDays: 7,
+  retentionDays: days("METRICS_AGENT_ROLLUP_RETENTION_DAYS", 90),
+};
+
+const PARTITIONED = [...TIERS, AGENT_ROLLUPS];
+
+const PARTITION_AHEAD_DAYS = days("METRICS_PARTITION_AHEAD_DAYS", 7);
+const HISTORY_POINTS = 500;
+const ROLLUP_LOCK = "coresight_metrics_rollup";
+
+// Columns kept per bucket: [column, raw expression, rollup expression].
+// Averages keep the raw column names so every tier can answer the same query.
+const weighted = (column) =>
+  `SUM(${column} * samples) / SUM(CASE WHEN ${column} IS NOT NULL THEN samples END)`;
+
+const ROLLUP_COLUMNS = [
+  ["cpu_usage", "AVG(cpu_usage)", weighted("cpu_usage")],
+  ["cpu_max", "MAX(cpu_usage)", "MAX(cpu_max)"],
+  ["memory_usage", "AVG(memory_usage)", weighted("memory_usage")],
+  ["memory_max", "MAX(memory_usage)", "MAX(memory_max)"],
+  ["disk_usage", "AVG(disk_usage)", weighted("disk_usage")],
+  ["network_usage", "AVG(network_usage)", weighted("network_usage")],
+  ["network_in", "AVG(network_in)", weighted("network_in")],
+  ["network_in_max", "MAX(network_in)", "MAX(network_in_max)"],
+  ["network_out", "AVG(network_out)", weighted("network_out")],
+  ["network_out_max", "MAX(network_out)", "MAX(network_out_max)"],
+  ["temperature", "AVG(temperature)", weighted("temperature")],
+];
+
+const HISTORY_COLUMNS = [
+  "cpu_usage",
+  "memory_usage",
+  "disk_usage",
+  "network_in",
+  "network_out",
+  "temperature",
+];
+
+const tier = (name) => TIERS.find((t) => t.name === name);
+
+const epoch = (date = new Date()) => Math.floor(date.getTime() / 1000);
+
+const partitionName = (start) =>
+  "p" + new Date(start * 1000).toISOString().slice(0, 10).replace(/-/g, "");
+
+const partitionDefinition = (start, end) =>
+  `PARTITION ${partitionName(start)} VALUES LESS THAN (${end})`;
+
+// Span-aligned partitions covering [from, until), plus the catch-all pfuture
+const partitionClause = (t, from, until) => {
+  const span = t.spanDays * DAY;
+  const definitions = [];
+  for (let start = Math.floor(from / span) * span; start < until; start += span) {
+    definitions.push(partitionDefinition(start, start + span));
+  }
+  definitions.push("PARTITION pfuture VALUES LESS THAN MAXVALUE");
+  return `PARTITION BY RANGE (UNIX_TIMESTAMP(${t.column})) (
+        ${definitions.join(",\n        ")}
+      )`;
+};
+
+// Partitioning for an existing table, used when migrating old layouts
+const partitionBy = (t, from) =>
+  partitionClause(t, from, epoch() + PARTITION_AHEAD_DAYS * DAY);
+
+const rollupTableSql = (t, from, until) => `
+      CREATE TABLE IF NOT EXISTS ${t.table} (
+        server_id VARCHAR(255) NOT NULL,
+        bucket TIMESTAMP NOT NULL,
+        samples INT NOT NULL,
+        cpu_usage FLOAT,
+        cpu_max FLOAT,
+        memory_usage FLOAT,
+        memory_max FLOAT,
+        disk_usage FLOAT,
+        network_usage FLOAT,
+        network_in FLOAT,
+        network_in_max FLOAT,
+        network_out FLOAT,
+        network_out_max FLOAT,
+        temperature FLOAT,
+        PRIMARY KEY (server_id, bucket)
+      ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci
+      ${partitionClause(t, from, until)}`;
+
+// DDL for every tier, with partitions from `from` up to the look-ahead window.
+// The migration script passes the oldest sample it is about to copy.
+const tableStatements = (from = epoch(), table = "server_metrics") => {
+  const until = epoch() + PARTITION_AHEAD_DAYS * DAY;
+  return [
+    `
+      CREATE TABLE IF NOT EXISTS ${table} (
+        id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+        server_id VARCHAR(255) NOT NULL,
+        cpu_usage FLOAT,
+        memory_usage FLOAT,
+        memory_total BIGINT,
+        memory_used BIGINT,
+        disk_usage FLOAT,
+        disk_total BIGINT,
+        disk_used BIGINT,
+        network_usage FLOAT,
+        network_in FLOAT,
+        network_out FLOAT,
+        temperature FLOAT,
+        timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (id, timestamp),
+        KEY idx_metrics_server_time (server_id, timestamp)
+      ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci
+      ${partitionClause(tier("raw"), from, until)}`,
+    rollupTableSql(tier("1m"), from, until),
+    rollupTableSql(tier("1h"), from, until),
+    `
+      CREATE TABLE IF NOT EXISTS ${AGENT_ROLLUPS.table} (
+        id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+        server_id VARCHAR(255) NOT NULL,
+        window_seconds INT NOT NULL,
+        metric VARCHAR(32) NOT NULL,
+        min_value DOUBLE,
+        max_value DOUBLE,
+        mean_value DOUBLE,
+        last_value DOUBLE,
+        p50 DOUBLE,
+        p95 DOUBLE,
+        p99 DOUBLE,
+        sample_count INT,
+        window_start TIMESTAMP NULL DEFAULT NULL,
+        window_end TIMESTAMP NOT NULL,
+        PRIMARY KEY (id, window_end),
+        KEY idx_rollups_lookup (server_id, window_seconds, metric, window_end)
+      ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci
+      ${partitionClause(AGENT_ROLLUPS, from, until)}`,
+    `
+      CREATE TABLE IF NOT EXISTS server_metrics_rollup_state (
+        name VARCHAR(32) NOT NULL PRIMARY KEY,
+        last_id BIGINT UNSIGNED NOT NULL DEFAULT 0,
+        seen_id BIGINT UNSIGNED NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP NULL DEFAULT NULL
+      ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci`,
+    `
+      CREATE TABLE IF NOT EXISTS server_metrics_ingest_state (
+        server_id VARCHAR(255) NOT NULL,
+        spool_id VARCHAR(32) NOT NULL,
+        last_seq BIGINT UNSIGNED NOT NULL,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (server_id, spool_id)
+      ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci`,
+  ];
+};
+
+// Tables created before the partitioned layout (server_metrics with a VARCHAR
+// id, server_metrics_rollups with a foreign key) need scripts/migrate-metrics.js
+const isPartitioned = async (db, table = "server_metrics") => {
+  const [[row]] = await db.query(
+    `SELECT COUNT(*) AS partitions FROM information_schema.PARTITIONS
+     WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = ?
+     AND PARTITION_NAME IS NOT NULL`,
+    [table]
+  );
+  return row.partitions > 0;
+};
+
+// Create whatever is missing and return the tables still on the old layout
+const createTables = async (db) => {
+  for (const statement of tableStatements()) {
+    await db.query(statement);
+  }
+  await db.query(
+    "INSERT IGNORE INTO server_metrics_rollup_state (name) VALUES ('rollup')"
+  );
+  const legacy = [];
+  for (const t of PARTITIONED) {
+    if (!(await isPartitioned(db, t.table))) {
+      legacy.push(t.table);
+    }
+  }
+  return legacy;
+};
+
+const listPartitions = async (db, table) => {
+  const [rows] = await db.query(
+    `SELECT PARTITION_NAME AS name, PARTITION_DESCRIPTION AS bound
+     FROM information_schema.PARTITIONS
+     WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = ?
+     AND PARTITION_NAME IS NOT NULL
+     ORDER BY PARTITION_ORDINAL_POSITION`,
+    [table]
+  );
+  return rows
+    .filter((row) => row.bound !== "MAXVALUE")
+    .map((row) => ({ name: row.name, bound: parseInt(row.bound) }));
+};
+
+// Split pfuture so partitions exist for the look-ahead window, then drop the
+// ones that lie entirely past retention. Returns what was added and dropped.
+const maintainPartitions = async (db, now = epoch()) => {
+  const changes = [];
+  for (const t of PARTITIONED) {
+    if (!(await isPartitioned(db, t.table))) {
+      continue;
+    }
+    const partitions = await listPartitions(db, t.table);
+    const span = t.spanDays * DAY;
+    const until = now + PARTITION_AHEAD_DAYS * DAY;
+    const added = [];
+    // Schemas loaded from SQL/efi.sql start out with nothing but pfuture
+    for (
+      let start =
+        partitions.length > 0
+          ? partitions[partitions.length - 1].bound
+          : Math.floor(now / span) * span;
+      start < until;
+      start += span
+    ) {
+      added.push(partitionDefinition(start, start + span));
+    }
+    if (added.length > 0) {
+      await db.query(
+        `ALTER TABLE ${t.table} REORGANIZE PARTITION pfuture INTO (
+          ${added.join(",\n          ")},
+          PARTITION pfuture VALUES LESS THAN MAXVALUE
+        )`
+      );
+      changes.push(`${t.table}: added ${added.length}`);
+    }
+
+    if (t.retentionDays > 0) {
+      const cutoff = now - t.retentionDays * DAY;
+      const expired = partitions
+        .filter((partition) => partition.bound <= cutoff)
+        .map((partition) => partition.name);
+      if (expired.length > 0) {
+        await db.query(
+          `ALTER TABLE ${t.table} DROP PARTITION ${expired.join(", ")}`
+        );
+        changes.push(`${t.table}: dropped ${expired.join(", ")}`);
+      }
+    }
+  }
+  return changes;
+};
+
+const upsertSql = (target) => `
+  INSERT INTO ${target.table} (
+    server_id, bucket, samples, ${ROLLUP_COLUMNS.map(([column]) => column).join(", ")}
+  )`;
+
+const onDuplicateSql = `ON DUPLICATE KEY UPDATE
+    samples = VALUES(samples),
+    ${ROLLUP_COLUMNS.map(([column]) => `${column} = VALUES(${column})`).join(",\n    ")}`;
+
+// Recompute every bucket of `target` that contains a sample with an id in
+// (fromId, toId]. Whole buckets are rebuilt from the finer tier, so samples
+// that arrive late (an agent flushing its spool) land in the right bucket.
+const rollupTouched = async (db, target, fromId, toId) => {
+  const fromRaw = target.name === "1m";
+  const source = fromRaw ? tier("raw") : tier("1m");
+  // Only server_id is shared with the touched set, so the metric columns in
+  // the aggregates can stay unqualified
+  const aggregates = ROLLUP_COLUMNS.map(([, raw, rollup]) =>
+    fromRaw ? raw : rollup
+  );
+
+  const [result] = await db.query(
+    `${upsertSql(target)}
+     SELECT s.server_id, FROM_UNIXTIME(touched.bucket_start),
+       ${fromRaw ? "COUNT(*)" : "SUM(s.samples)"},
+       ${aggregates.join(",\n       ")}
+     FROM (
+       SELECT DISTINCT server_id,
+         FLOOR(UNIX_TIMESTAMP(timestamp) / ${target.bucket}) * ${target.bucket} AS bucket_start
+       FROM server_metrics
+       WHERE id > ? AND id <= ?
+     ) AS touched
+     JOIN ${source.table} s
+       ON s.server_id = touched.server_id
+       AND s.${source.column} >= FROM_UNIXTIME(touched.bucket_start)
+       AND s.${source.column} < FROM_UNIXTIME(touched.bucket_start + ${target.bucket})
+     GROUP BY s.server_id, touched.bucket_start
+     ${onDuplicateSql}`,
+    [fromId, toId]
+  );
+  return result.affectedRows;
+};
+
+// One rollup pass. Samples are picked up by id: the pass covers ids up to the
+// highest one seen by the *previous* pass, so a batch whose transaction took an
+// id but had not committed yet is never skipped. Rollups therefore trail ingest
+// by one to two intervals; readHistory fills that gap from raw samples.
+const runRollups = async (db) => {
+  const connection = await db.getConnection();
+  try {
+    const [[lock]] = await connection.query(
+      "SELECT GET_LOCK(?, 0) AS acquired",
+      [ROLLUP_LOCK]
+    );
+    if (!lock.acquired) {
+      return null;
+    }
+
+    try {
+      const [[state]] = await connection.query(
+        "SELECT last_id, seen_id FROM server_metrics_rollup_state WHERE name = 'rollup'"
+      );
+      const [[{ max_id: maxId }]] = await connection.query(
+        "SELECT COALESCE(MAX(id), 0) AS max_id FROM server_metrics"
+      );
+      const fromId = Number(state.last_id);
+      const toId = Number(state.seen_id);
+
+      let minutes = 0;
+      let hours = 0;
+      if (toId > fromId) {
+        minutes = await rollupTouched(connection, tier("1m"), fromId, toId);
+        hours = await rollupTouched(connection, tier("1h"), fromId, toId);
+      }
+
+      await connection.query(
+        `UPDATE server_metrics_rollup_state
+         SET last_id = ?, seen_id = ?, updated_at = NOW()
+         WHERE name = 'rollup'`,
+        [Math.max(fromId, toId), maxId]
+      );
+      return { fromId, toId, minutes, hours };
+    } finally {
+      await connection.query("SELECT RELEASE_LOCK(?)", [ROLLUP_LOCK]);
+    }
+  } finally {
+    connection.release();
+  }
+};
+
+// The coarsest tier whose buckets are no wider than `resolution` and whose
+// retention still covers the range. If no such tier covers it, the finest one
+// that does, and the coarsest tier when the range outlives every retention.
+const chooseTier = (rangeSeconds, resolution) => {
+  const covering = TIERS.filter(
+    (t) => t.retentionDays === 0 || t.retentionDays * DAY >= rangeSeconds
+  );
+  const fitting = covering.filter((t) => t.bucket <= resolution);
+  if (fitting.length > 0) {
+    return fitting[fitting.length - 1];
+  }
+  return covering[0] || TIERS[TIERS.length - 1];
+};
+
+const bucketedSelect = (t, step) => {
+  const columns = ROLLUP_COLUMNS.filter(([column]) =>
+    HISTORY_COLUMNS.includes(column)
+  ).map(([column, raw, rollup]) => `${t.bucket ? rollup : raw} AS ${column}`);
+  return `SELECT
+        FROM_UNIXTIME(FLOOR(UNIX_TIMESTAMP(${t.column}) / ${step}) * ${step}) AS timestamp,
+        ${columns.join(",\n        ")}
+       FROM ${t.table}
+       WHERE server_id = ?
+       AND ${t.column} >= FROM_UNIXTIME(?)
+       AND ${t.column} < FROM_UNIXTIME(?)
+       GROUP BY 1`;
+};
+
+// History for one server over the last `hours`, one row per `resolution`
+// seconds (default: about HISTORY_POINTS rows), newest first. Reads the tier
+// picked by chooseTier and takes whatever the rollups have not reached yet
+// from raw samples.
+const readHistory = async (db, serverId, hours, resolution) => {
+  const now = epoch();
+  const range = hours * 3600;
+  const wanted = Math.max(1, resolution || Math.ceil(range / HISTORY_POINTS));
+  const source = chooseTier(range, wanted);
+  const step = source.bucket
+    ? Math.ceil(wanted / source.bucket) * source.bucket
+    : wanted;
+  const start = Math.floor((now - range) / step) * step;
+
+  let tail = start;
+  if (source.bucket) {
+    const [[{ newest }]] = await db.query(
+      `SELECT UNIX_TIMESTAMP(MAX(bucket)) AS newest FROM ${source.table}
+       WHERE server_id = ? AND bucket >= FROM_UNIXTIME(?)`,
+      [serverId, start]
+    );
+    // Raw samples take over from the step holding the first bucket not rolled up
+    tail =
+      newest === null
+        ? start
+        : Math.floor((Number(newest) + source.bucket) / step) * step;
+  }
+
+  const queries = [];
+  const params = [];
+  if (tail > start) {
+    queries.push(bucketedSelect(source, step));
+    params.push(serverId, start, tail);
+  }
+  queries.push(bucketedSelect(tier("raw"), step));
+  params.push(serverId, tail, now + 1);
+
+  const [rows] = await db.query(
+    `${queries.join("\n       UNION ALL\n       ")}
+       ORDER BY timestamp DESC`,
+    params
+  );
+  return { tier: source.name, resolution: step, rows };
+};
+
+// Agents number every spooled sample, consecutively per spool, and resend a
+// batch whose response they never got. Within the batch's transaction this
+// records the batch as stored and returns how many of its leading samples
+// were stored by an earlier attempt.
+const claimBatch = async (connection, serverId, spoolId, firstSeq, count) => {
+  const [[row]] = await connection.query(
+    `SELECT last_seq FROM server_metrics_ingest_state
+     WHERE server_id = ? AND spool_id = ? FOR UPDATE`,
+    [serverId, spoolId]
+  );
+  const lastSeq = firstSeq + count - 1;
+  const stored = row
+    ? Math.min(Math.max(Number(row.last_seq) - firstSeq + 1, 0), count)
+    : 0;
+  if (stored < count) {
+    await connection.query(
+      `INSERT INTO server_metrics_ingest_state (server_id, spool_id, last_seq)
+       VALUES (?, ?, ?)
+       ON DUPLICATE KEY UPDATE last_seq = GREATEST(last_seq, VALUES(last_seq))`,
+      [serverId, spoolId, lastSeq]
+    );
+  }
+  return stored;
+};
+
+// Partitioned tables can't cascade from servers, so removing a server clears
+// every tier and the agent rollups by hand
+const deleteServerMetrics = async (db, serverId) => {
+  for (const t of PARTITIONED) {
+    await db.query(`DELETE FROM ${t.table} WHERE server_id = ?`, [serverId]);
+  }
+  await db.query(
+    "DELETE FROM server_metrics_ingest_state WHERE server_id = ?",
+    [serverId]
+  );
+};
+
+module.exports = {
+  TIERS,
+  AGENT_ROLLUPS,
+  tableStatements,
+  partitionBy,
+  isPartitioned,
+  createTables,
+  maintainPartitions,
+  rollupTouched,
+  runRollups,
+  chooseTier,
+  readHistory,
+  claimBatch,
+  deleteServerMetrics,
+};
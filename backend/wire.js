@@ -0,0 +1,156 @@
+// Decoder for the agent's compact, delta-encoded metrics format (WIRE_FORMAT=compact).
+//
+// A batch body looks like:
+//   { v, server_id, session, base, fields: {id: path}, names: {id: name},
+//     frames: [[kind, ts, [fieldId, value, ...], [removedFieldId, ...], processes]] }
+//
+// Keyframes (kind 0) carry every field and an absolute epoch-ms timestamp, deltas
+// (kind 1) only the fields that changed and a timestamp relative to the previous
+// frame. Dictionaries and the last frame live per agent session and only move
+// forward once the batch has been stored, so a failed insert can be resent as is.
+
+const WIRE_VERSION = 1;
+const KEYFRAME = 0;
+const PROCESS_COLUMNS = [
+  "pid",
+  "name",
+  "cpu_percent",
+  "memory_percent",
+  "io_bytes_per_sec",
+  "disk_usage",
+];
+const SESSION_TTL_MS = 60 * 60 * 1000;
+
+const sessions = new Map();
+
+// Thrown when the agent's base frame doesn't match ours, answered with a 409
+class ResyncError extends Error {}
+
+const freshState = () => ({
+  fields: new Map(),
+  names: new Map(),
+  values: new Map(),
+  seq: 0,
+  timestamp: null,
+  lastSeen: Date.now(),
+});
+
+const cloneState = (state) => ({
+  fields: new Map(state.fields),
+  names: new Map(state.names),
+  values: new Map(state.values),
+  seq: state.seq,
+  timestamp: state.timestamp,
+  lastSeen: state.lastSeen,
+});
+
+// Rebuild the nested sample from path => value pairs, numeric path
+// segments become array indexes
+const unflatten = (fields, values) => {
+  const root = {};
+  for (const [fieldId, value] of values) {
+    const path = fields.get(fieldId);
+    if (!path) continue;
+    let node = root;
+    for (let i = 0; i < path.length - 1; i++) {
+      const key = path[i];
+      if (node[key] === undefined) {
+        node[key] = typeof path[i + 1] === "number" ? [] : {};
+      }
+      node = node[key];
+    }
+    node[path[path.length - 1]] = value;
+  }
+  return root;
+};
+
+const decodeProcesses = (rows, names) =>
+  rows.map((row) => {
+    const process = {};
+    PROCESS_COLUMNS.forEach((column, index) => {
+      process[column] = row[index];
+    });
+    process.name = names.get(row[1]) ?? String(row[1]);
+    return process;
+  });
+
+const pruneSessions = () => {
+  const cutoff = Date.now() - SESSION_TTL_MS;
+  for (const [key, state] of sessions) {
+    if (state.lastSeen < cutoff) sessions.delete(key);
+  }
+};
+
+// Decode one compact batch into the same sample objects the plain JSON path
+// receives. Call commit() once the samples are stored.
+const decodeBatch = (body) => {
+  if (body.v !== WIRE_VERSION) {
+    throw new Error(`Unsupported wire format version: ${body.v}`);
+  }
+  if (!body.server_id || !body.session || !Array.isArray(body.frames)) {
+    throw new Error("Malformed compact batch");
+  }
+
+  const key = `${body.server_id}:${body.session}`;
+  const existing = sessions.get(key);
+  let state;
+  if (body.base === null || body.base === undefined) {
+    state = freshState();
+  } else if (!existing || existing.seq !== body.base) {
+    throw new ResyncError(
+      `Unknown base frame ${body.base} for session ${body.session}`
+    );
+  } else {
+    state = cloneState(existing);
+  }
+
+  for (const [id, path] of Object.entries(body.fields || {})) {
+    state.fields.set(Number(id), path);
+  }
+  for (const [id, name] of Object.entries(body.names || {})) {
+    state.names.set(Number(id), name);
+  }
+
+  const samples = body.frames.map(([kind, ts, changes, removed, processes]) => {
+    if (kind === KEYFRAME) {
+      state.values = new Map();
+      state.timestamp = ts;
+    } else if (state.timestamp === null) {
+      throw new ResyncError("Delta frame without a keyframe");
+    } else {
+      state.timestamp += ts;
+    }
+
+    for (let i = 0; i < changes.length; i += 2) {
+      state.values.set(changes[i], changes[i + 1]);
+    }
+    for (const fieldId of removed || []) {
+      state.values.delete(fieldId);
+    }
+    state.seq += 1;
+
+    const sample = unflatten(state.fields, state.values);
+    sample.server_id = body.server_id;
+    sample.timestamp = new Date(state.timestamp).toISOString();
+    if (Array.isArray(processes)) {
+      sample.processes = decodeProcesses(processes, state.names);
+    }
+    return sample;
+  });
+
+  return {
+    serverId: body.server_id,
+    samples,
+    commit: () => {
+      state.lastSeen = Date.now();
+      sessions.set(key, state);
+      pruneSessions();
+    },
+  };
+};
+
+module.exports = {
+  WIRE_VERSION,
+  ResyncError,
+  decodeBatch,
+};
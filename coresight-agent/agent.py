@@ -1,38 +1,58 @@
-import psutil
 import socket
 import json
-import time
 import requests
 import mysql.connector
 from datetime import datetime
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 import os
+import queue
+import atexit
 from dotenv import load_dotenv
 import sys
+from sampling import FixedRateScheduler
+from collectors import build_registry, parse_intervals
+from processes import ProcessCollector
+from spool import DiskSpool
+from uploader import BatchUploader
+from rollup import RollupAggregator
+from wire import get_encoder, JsonEncoder
+from alerts import AlertEngine, load_rules
+from probes import ProbeEngine
+from telemetry import Telemetry
+from api import start_api
 
 # Load environment variables
 load_dotenv()
 
-# Set up logging with more detailed format
-logging.basicConfig(
-    handlers=[
-        RotatingFileHandler(
-            'agent.log', 
-            maxBytes=1000000, 
-            backupCount=5,
-            mode='a'  # Append mode
-        )
-    ],
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s'
+# Set up logging with more detailed format. Records are handed to a queue and
+# written by a listener thread, so a slow disk or terminal never stalls sampling
+file_handler = RotatingFileHandler(
+    'agent.log', 
+    maxBytes=1000000, 
+    backupCount=5,
+    mode='a'  # Append mode
 )
-logger = logging.getLogger('CoreSightAgent')
+file_handler.setFormatter(logging.Formatter(
+    '%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s'
+))
 
 # Add console handler for immediate feedback
 console_handler = logging.StreamHandler(sys.stdout)
 console_handler.setLevel(logging.INFO)
-logger.addHandler(console_handler)
+console_handler.addFilter(logging.Filter('CoreSightAgent'))
+
+log_queue = queue.SimpleQueue()
+log_listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+queue_handler = QueueHandler(log_queue)
+queue_handler.setFormatter(logging.Formatter('%(message)s'))
+logging.basicConfig(
+    handlers=[queue_handler],
+    level=getattr(logging, os.getenv('LOG_LEVEL', 'INFO').upper(), logging.INFO)
+)
+log_listener.start()
+atexit.register(log_listener.stop)
+logger = logging.getLogger('CoreSightAgent')
 
 class SystemMonitor:
     def __init__(self):
@@ -55,11 +75,162 @@ class SystemMonitor:
             
             logger.info(f"Initializing agent with hostname: {self.hostname}, IP: {self.ip_address}")
             logger.info(f"Using backend URL: {self.backend_url}")
+
+            # Sampling cadence in seconds, sub-second values such as 0.25 are supported
+            self.sample_interval = float(os.getenv('SAMPLE_INTERVAL', '10'))
+            self.scheduler = FixedRateScheduler(self.sample_interval)
+            self.behind = False
+
+            # Self-telemetry: stage timings, queue depths and the agent's own footprint
+            cpu_budget = os.getenv('AGENT_CPU_BUDGET')
+            rss_budget = os.getenv('AGENT_RSS_BUDGET_MB')
+            self.telemetry = Telemetry(
+                cpu_budget=float(cpu_budget) if cpu_budget else None,
+                rss_budget_mb=float(rss_budget) if rss_budget else None
+            )
+
+            # Every collector runs on its own interval; the cheap counters each
+            # tick, mounts, containers and the process table less often
+            intervals = parse_intervals(os.getenv('COLLECTOR_INTERVALS'))
+            intervals.setdefault('processes', float(os.getenv('PROCESS_INTERVAL', '10')))
+            collector_names = [c.strip() for c in os.getenv('COLLECTORS', '').split(',') if c.strip()]
+            # Priming the process collector walks every PID, so only when enabled
+            self.process_collector = None
+            if not collector_names or 'processes' in collector_names:
+                self.process_collector = ProcessCollector(
+                    top_n=int(os.getenv('PROCESS_TOP_N', '10')),
+                    sort_key=os.getenv('PROCESS_SORT_KEY', 'cpu_percent')
+                )
+            self.collectors = build_registry(
+                self.sample_interval,
+                names=collector_names or None,
+                intervals=intervals,
+                extra=[self.process_collector] if self.process_collector is not None else [],
+                on_timing=lambda name, seconds: self.telemetry.observe(f"collect.{name}", seconds)
+            )
+
+            logger.info(f"Sampling every {self.sample_interval}s: {self.collectors.describe()}")
+
+            # With rollup windows configured (e.g. "10,60") only one aggregate per
+            # window is shipped instead of every raw sample
+            rollup_windows = [w for w in os.getenv('ROLLUP_WINDOWS', '').split(',') if w.strip()]
+
+            # Samples are spooled to disk and shipped in batches by a separate thread
+            self.batch_size = int(os.getenv('UPLOAD_BATCH_SIZE', '500'))
+            flush_interval = float(os.getenv('UPLOAD_INTERVAL', '5'))
+            # A record is ready every sample, or once per shortest rollup window
+            record_interval = min(float(w) for w in rollup_windows) if rollup_windows else self.sample_interval
+            self.spool = DiskSpool(
+                os.getenv('SPOOL_PATH', 'metrics.spool'),
+                int(float(os.getenv('SPOOL_SIZE_MB', '16')) * 1024 * 1024)
+            )
+            self.uploader = BatchUploader(
+                self.spool,
+                f"{self.backend_url}/batch",
+                self.server_id,
+                batch_size=self.batch_size,
+                flush_interval=flush_interval,
+                timeout=float(os.getenv('UPLOAD_TIMEOUT', '10')),
+                expected_interval=max(record_interval, flush_interval),
+                encoder=get_encoder(
+                    os.getenv('WIRE_FORMAT', 'json'),
+                    keyframe_interval=int(os.getenv('WIRE_KEYFRAME_INTERVAL', '60'))
+                ),
+                label='metrics',
+                telemetry=self.telemetry
+            )
+
+            # Thresholds are evaluated on every sample; alert events get their own
+            # small spool and are pushed as soon as they happen
+            self.alert_engine = AlertEngine(self.server_id, load_rules(os.getenv('ALERT_RULES')))
+            self.alert_spool = DiskSpool(os.getenv('ALERT_SPOOL_PATH', 'alerts.spool'), 1024 * 1024)
+            self.alert_uploader = BatchUploader(
+                self.alert_spool,
+                f"http://{backend_host}:{backend_port}/api/alerts/events",
+                self.server_id,
+                batch_size=100,
+                flush_interval=1.0,
+                timeout=5.0,
+                encoder=JsonEncoder('events'),
+                label='alerts',
+                telemetry=self.telemetry
+            )
+            self.send_alert_event(self.alert_engine.reset_event())
+
+            self.rollups = RollupAggregator(self.server_id, rollup_windows) if rollup_windows else None
+            if self.rollups:
+                logger.info(f"Rolling samples up into {', '.join(rollup_windows)}s windows")
+
+            # Website uptime checks run on their own asyncio loop; the backend hands
+            # this agent its share of the monitored websites
+            self.probe_engine = None
+            self.probe_uploader = None
+            if os.getenv('PROBES_ENABLED', 'false').lower() == 'true':
+                self.probe_spool = DiskSpool(
+                    os.getenv('PROBE_SPOOL_PATH', 'probes.spool'),
+                    int(float(os.getenv('PROBE_SPOOL_SIZE_MB', '4')) * 1024 * 1024)
+                )
+                self.probe_uploader = BatchUploader(
+                    self.probe_spool,
+                    f"http://{backend_host}:{backend_port}/api/probes/results",
+                    self.server_id,
+                    batch_size=1000,
+                    flush_interval=float(os.getenv('PROBE_UPLOAD_INTERVAL', '5')),
+                    timeout=10.0,
+                    encoder=JsonEncoder('results'),
+                    label='probes',
+                    telemetry=self.telemetry
+                )
+                self.probe_engine = ProbeEngine(
+                    self.send_probe_result,
+                    targets_url=f"http://{backend_host}:{backend_port}/api/probes/targets",
+                    server_id=self.server_id,
+                    concurrency=int(os.getenv('PROBE_CONCURRENCY', '256')),
+                    timeout=float(os.getenv('PROBE_TIMEOUT', '10')),
+                    refresh_interval=float(os.getenv('PROBE_REFRESH_INTERVAL', '60'))
+                )
+                logger.info("Website probing enabled")
+
+            self.register_gauges()
+            self.api_server = None
+            if os.getenv('AGENT_API_ENABLED', 'true').lower() == 'true':
+                api_port = int(os.getenv('AGENT_API_PORT', '5000'))
+                try:
+                    self.api_server = start_api(
+                        self.telemetry,
+                        host=os.getenv('AGENT_API_HOST', '127.0.0.1'),
+                        port=api_port
+                    )
+                except (OSError, SystemExit) as e:
+                    # werkzeug exits rather than raising when the port is taken;
+                    # the API is optional, monitoring carries on without it
+                    logger.warning(f"Agent API not started on port {api_port}, continuing without it: {e!r}")
             
         except Exception as e:
             logger.error(f"Error initializing SystemMonitor: {e}", exc_info=True)
             raise
 
+    def register_gauges(self):
+        gauge = self.telemetry.gauge
+        gauge('missed_ticks', lambda: self.scheduler.missed_ticks)
+        if self.process_collector is not None:
+            gauge('tracked_processes', lambda: len(self.process_collector))
+        for label, spool, uploader in (('metrics', self.spool, self.uploader),
+                                       ('alerts', self.alert_spool, self.alert_uploader),
+                                       ('probes', self.probe_spool if self.probe_engine else None, self.probe_uploader)):
+            if spool is None:
+                continue
+            gauge(f'{label}.spool_depth', spool.__len__)
+            gauge(f'{label}.dropped', lambda spool=spool: spool.dropped)
+            gauge(f'{label}.rejected', lambda uploader=uploader: uploader.rejected_samples)
+            gauge(f'{label}.sent', lambda uploader=uploader: uploader.sent_samples)
+            gauge(f'{label}.sent_bytes', lambda uploader=uploader: uploader.sent_bytes)
+            gauge(f'{label}.upload_failures', lambda uploader=uploader: uploader.failures)
+        if self.probe_engine:
+            gauge('probes.targets', lambda: len(self.probe_engine.targets))
+            gauge('probes.run', lambda: self.probe_engine.probes_run)
+            gauge('probes.skipped', lambda: self.probe_engine.probes_skipped)
+
     def get_ip_address(self):
         try:
             s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -71,169 +242,65 @@ class SystemMonitor:
             logger.error(f"Error getting IP address: {e}")
             return None
 
-    def get_cpu_metrics(self):
-        try:
-            cpu_percent = psutil.cpu_percent(interval=1)
-            if cpu_percent is None or not isinstance(cpu_percent, (int, float)):
-                cpu_percent = 0.0
-                
-            cpu_freq = psutil.cpu_freq()
-            if cpu_freq is None:
-                cpu_freq_dict = {"current": 0.0, "min": 0.0, "max": 0.0}
-            else:
-                cpu_freq_dict = cpu_freq._asdict()
-
-            return {
-                "cpu_percent": float(cpu_percent),
-                "cpu_count": psutil.cpu_count() or 1,
-                "cpu_freq": cpu_freq_dict
-            }
-        except Exception as e:
-            logger.error(f"Error getting CPU metrics: {e}")
-            return {
-                "cpu_percent": 0.0,
-                "cpu_count": 1,
-                "cpu_freq": {"current": 0.0, "min": 0.0, "max": 0.0}
-            }
-    
-    def get_memory_metrics(self):
-        try:
-            memory = psutil.virtual_memory()
-            return {
-                "total": int(memory.total),
-                "available": int(memory.available),
-                "percent": float(memory.percent),
-                "used": int(memory.used)
-            }
-        except Exception as e:
-            logger.error(f"Error getting memory metrics: {e}")
-            return {
-                "total": 0,
-                "available": 0,
-                "percent": 0.0,
-                "used": 0
-            }
-    
-    def get_disk_metrics(self):
-        try:
-            disk = psutil.disk_usage('/')
-            return {
-                "total": int(disk.total),
-                "used": int(disk.used),
-                "free": int(disk.free),
-                "percent": float(disk.percent)
-            }
-        except Exception as e:
-            logger.error(f"Error getting disk metrics: {e}")
-            return {
-                "total": 0,
-                "used": 0,
-                "free": 0,
-                "percent": 0.0
-            }
-    
-    def get_network_metrics(self):
-        try:
-            network = psutil.net_io_counters()
-            return {
-                "bytes_sent": int(network.bytes_sent),
-                "bytes_recv": int(network.bytes_recv),
-                "packets_sent": int(network.packets_sent),
-                "packets_recv": int(network.packets_recv)
-            }
-        except Exception as e:
-            logger.error(f"Error getting network metrics: {e}")
-            return {
-                "bytes_sent": 0,
-                "bytes_recv": 0,
-                "packets_sent": 0,
-                "packets_recv": 0
-            }
-    
-    def get_process_info(self):
-        try:
-            processes = []
-            for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
-                try:
-                    info = proc.info
-                    # Get process disk IO
-                    try:
-                        io_counters = proc.io_counters()
-                        disk_usage = (io_counters.read_bytes + io_counters.write_bytes) / proc.memory_info().vms * 100 if proc.memory_info().vms > 0 else 0
-                    except (psutil.NoSuchProcess, psutil.AccessDenied):
-                        disk_usage = 0
-
-                    processes.append({
-                        "pid": int(info['pid']),
-                        "name": str(info['name']),
-                        "cpu_percent": float(info['cpu_percent'] or 0.0),
-                        "memory_percent": float(info['memory_percent'] or 0.0),
-                        "disk_usage": float(disk_usage)
-                    })
-                except (psutil.NoSuchProcess, psutil.AccessDenied, ValueError):
-                    continue
-            return sorted(processes, key=lambda x: x['cpu_percent'], reverse=True)[:10]  # Return top 10 processes
-        except Exception as e:
-            logger.error(f"Error getting process info: {e}")
-            return []
-    
     def collect_metrics(self):
-        # Get all metrics
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
-        network = psutil.net_io_counters()
-        processes = self.get_process_info()
-
         metrics = {
             "server_id": self.server_id,
-            "timestamp": datetime.now().isoformat(),
-            "cpu": {
-                "cpu_percent": psutil.cpu_percent(interval=1)
-            },
-            "memory": {
-                "percent": memory.percent,
-                "total": memory.total,
-                "used": memory.used
-            },
-            "disk": {
-                "percent": disk.percent,
-                "total": disk.total,
-                "used": disk.used
-            },
-            "network": {
-                "bytes_sent": network.bytes_sent,
-                "bytes_recv": network.bytes_recv
-            },
-            "processes": processes
+            "timestamp": datetime.now().astimezone().isoformat(),
+            "interval": self.sample_interval,
+            "missed_ticks": self.scheduler.missed_ticks
         }
+        metrics.update(self.collectors.collect(behind=self.behind))
         
-        logger.info("Collected metrics: %s", json.dumps(metrics, indent=2))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Collected metrics: %s", json.dumps(metrics, indent=2))
         return metrics
     
-    def send_metrics(self, metrics):
+    def send_metrics(self, metrics, payload=None):
         try:
-            response = requests.post(
-                self.backend_url,
-                json=metrics,
-                headers={"Content-Type": "application/json"}
-            )
-            response.raise_for_status()
-            logger.info(f"Metrics sent successfully at {metrics['timestamp']}")
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error sending metrics: {e}")
-            if hasattr(e.response, 'text'):
-                logger.error(f"Server response: {e.response.text}")
+            self.spool.append(payload or json.dumps(metrics, separators=(',', ':')).encode())
+            if len(self.spool) >= self.batch_size:
+                self.uploader.notify()
+        except Exception as e:
+            logger.error(f"Error spooling metrics: {e}")
+
+    def send_alert_event(self, event):
+        try:
+            self.alert_spool.append(json.dumps(event, separators=(',', ':')).encode())
+            self.alert_uploader.notify()
+        except Exception as e:
+            logger.error(f"Error spooling alert event: {e}")
+
+    def send_probe_result(self, result):
+        # Called from the probe thread, the uploader batches on its own schedule
+        try:
+            self.probe_spool.append(json.dumps(result, separators=(',', ':')).encode())
+        except Exception as e:
+            logger.error(f"Error spooling probe result: {e}")
 
     def run(self):
+        self.uploader.start()
+        self.alert_uploader.start()
+        if self.probe_engine:
+            self.probe_uploader.start()
+            self.probe_engine.start_thread()
         while True:
+            self.behind = self.scheduler.wait() > 0
             try:
-                metrics = self.collect_metrics()
-                if metrics:
-                    self.send_metrics(metrics)
-                time.sleep(10)  # Send metrics every 10 seconds
+                with self.telemetry.timer('cycle'):
+                    metrics = self.collect_metrics()
+                    if metrics:
+                        for event in self.alert_engine.evaluate(metrics):
+                            self.send_alert_event(event)
+                        # Serialized once, for both the spool and the snapshot endpoint
+                        payload = json.dumps(metrics, separators=(',', ':')).encode()
+                        self.telemetry.publish(payload)
+                    if metrics and self.rollups:
+                        for rollup in self.rollups.add(metrics):
+                            self.send_metrics(rollup)
+                    elif metrics:
+                        self.send_metrics(metrics, payload)
             except Exception as e:
                 logger.error(f"Error in main loop: {e}", exc_info=True)
-                time.sleep(10)  # Wait before retrying
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,142 @@
+import json
+import time
+import uuid
+import logging
+from datetime import datetime
+
+logger = logging.getLogger('CoreSightAgent')
+
+# Where each metric lives in a collect_metrics() sample, and the backend alert type
+METRICS = {
+    'cpu': (('cpu', 'cpu_percent'), 'cpu'),
+    'memory': (('memory', 'percent'), 'memory'),
+    'disk': (('disk', 'percent'), 'disk'),
+    'network_in': (('network', 'bytes_recv_per_sec'), 'network'),
+    'network_out': (('network', 'bytes_sent_per_sec'), 'network'),
+}
+
+SEVERITIES = ('low', 'medium', 'high', 'critical')
+
+DEFAULT_RULES = [
+    {"name": "cpu_high", "metric": "cpu", "threshold": 90, "clear": 80, "duration": 30, "severity": "high"},
+    {"name": "memory_high", "metric": "memory", "threshold": 90, "clear": 85, "duration": 30, "severity": "high"},
+    {"name": "disk_high", "metric": "disk", "threshold": 90, "clear": 85, "duration": 0, "severity": "critical"},
+]
+
+OK, PENDING, FIRING, RESOLVING = 'ok', 'pending', 'firing', 'resolving'
+
+
+class AlertRule:
+    """One threshold with hysteresis.
+
+    The rule opens once ``metric`` has stayed above ``threshold`` for
+    ``duration`` seconds, and resolves once it has stayed below ``clear`` for
+    ``clear_duration`` seconds. Between the two it does nothing, so a value
+    hovering around the threshold produces one alert, not a stream of them.
+    """
+
+    def __init__(self, name, metric, threshold, clear=None, duration=0, clear_duration=None, severity='high'):
+        if metric not in METRICS:
+            raise ValueError(f"Unknown alert metric: {metric}")
+        if severity not in SEVERITIES:
+            raise ValueError(f"Unknown alert severity: {severity}")
+        self.name = name
+        self.metric = metric
+        self.threshold = float(threshold)
+        self.clear = float(threshold if clear is None else clear)
+        if self.clear > self.threshold:
+            raise ValueError(f"Alert rule {name}: clear level must not exceed the threshold")
+        self.duration = float(duration)
+        self.clear_duration = float(duration if clear_duration is None else clear_duration)
+        self.severity = severity
+
+        self.state = OK
+        self.since = None
+        self.alert_id = None
+        self.peak = None
+
+    def value(self, sample):
+        path, _ = METRICS[self.metric]
+        value = sample
+        for key in path:
+            value = value.get(key) if isinstance(value, dict) else None
+        return value
+
+    def evaluate(self, value, now):
+        """Advance the state machine; return 'open', 'resolve' or None."""
+        if self.state == OK:
+            if value > self.threshold:
+                self.state, self.since, self.peak = PENDING, now, value
+        elif self.state == PENDING:
+            if value <= self.threshold:
+                self.state = OK
+            else:
+                self.peak = max(self.peak, value)
+        elif self.state == FIRING:
+            self.peak = max(self.peak, value)
+            if value < self.clear:
+                self.state, self.since = RESOLVING, now
+        elif self.state == RESOLVING:
+            if value >= self.clear:
+                self.state = FIRING
+
+        if self.state == PENDING and now - self.since >= self.duration:
+            self.state = FIRING
+            self.alert_id = str(uuid.uuid4())
+            return 'open'
+        if self.state == RESOLVING and now - self.since >= self.clear_duration:
+            self.state = OK
+            return 'resolve'
+        return None
+
+
+def load_rules(config):
+    """Build rules from a JSON list (ALERT_RULES), falling back to the defaults."""
+    definitions = json.loads(config) if config else DEFAULT_RULES
+    return [AlertRule(**definition) for definition in definitions]
+
+
+class AlertEngine:
+    """Evaluates every rule against every sample, right where it is collected."""
+
+    def __init__(self, server_id, rules, clock=time.monotonic):
+        self.server_id = server_id
+        self.rules = rules
+        self.clock = clock
+
+    def _event(self, rule, event, value, sample):
+        _, alert_type = METRICS[rule.metric]
+        if event == 'open':
+            message = (f"{rule.metric} at {value:.1f} has been above {rule.threshold:g} "
+                       f"for {rule.duration:g}s ({rule.name})")
+        else:
+            message = f"{rule.metric} back below {rule.clear:g} at {value:.1f}, peaked at {rule.peak:.1f} ({rule.name})"
+        return {
+            "id": rule.alert_id,
+            "event": event,
+            "rule": rule.name,
+            "type": alert_type,
+            "metric": rule.metric,
+            "severity": rule.severity,
+            "value": value,
+            "threshold": rule.threshold,
+            "message": message,
+            "timestamp": sample.get("timestamp"),
+        }
+
+    def reset_event(self):
+        """Sent once at startup: alerts opened by a previous run can no longer resolve."""
+        return {"event": "reset", "timestamp": datetime.now().astimezone().isoformat()}
+
+    def evaluate(self, sample):
+        now = self.clock()
+        events = []
+        for rule in self.rules:
+            value = rule.value(sample)
+            if value is None:
+                continue
+            event = rule.evaluate(float(value), now)
+            if event:
+                events.append(self._event(rule, event, float(value), sample))
+                logger.warning(f"Alert {event}: {events[-1]['message']}")
+        return events
@@ -0,0 +1,29 @@
+import threading
+import logging
+
+from flask import Flask
+from werkzeug.serving import make_server
+
+from routes.version import version_bp
+from routes.telemetry import telemetry_bp
+
+logger = logging.getLogger('CoreSightAgent')
+
+
+def create_app(telemetry):
+    app = Flask(__name__)
+    app.config['TELEMETRY'] = telemetry
+    app.register_blueprint(version_bp)
+    app.register_blueprint(telemetry_bp)
+    return app
+
+
+def start_api(telemetry, host='127.0.0.1', port=5000):
+    """Serve the agent's HTTP routes from a daemon thread; return the server."""
+    # One access log line per poll would drown the agent's own log
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server(host, port, create_app(telemetry), threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name='coresight-api', daemon=True)
+    thread.start()
+    logger.info(f"Serving agent API on http://{host}:{server.server_port}")
+    return server
@@ -0,0 +1,563 @@
+import os
+import re
+import time
+import logging
+
+import psutil
+
+logger = logging.getLogger('CoreSightAgent')
+
+# /proc/diskstats always counts in 512-byte sectors, whatever the device uses
+SECTOR_SIZE = 512
+
+# Loopback and per-container veth pairs are summed into the totals but not
+# listed one by one; the containers collector covers the latter
+UNLISTED_INTERFACE_PREFIXES = ('lo', 'veth', 'cali')
+UNLISTED_BLOCK_DEVICE_PREFIXES = ('loop', 'ram', 'zram')
+SKIPPED_FILESYSTEMS = ('squashfs', 'tmpfs', 'devtmpfs', 'overlay')
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+CONTAINER_CGROUP = re.compile(r'^(?:docker|cri-containerd|crio|libpod)-([0-9a-f]{12,})\.scope$')
+
+COSTS = ('low', 'medium', 'high')
+
+
+class ProcFile:
+    """A /proc or /sys file kept open and re-read in place.
+
+    ``pread`` at offset 0 makes the kernel regenerate the contents, so every
+    read is one syscall on an existing descriptor instead of open/read/close.
+    """
+
+    def __init__(self, path, bufsize=4096):
+        self.path = path
+        self.bufsize = bufsize
+        self._fd = None
+
+    def read(self):
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDONLY)
+        try:
+            while True:
+                data = os.pread(self._fd, self.bufsize, 0)
+                if len(data) < self.bufsize:
+                    return data
+                self.bufsize *= 2
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def _rate(before, after, elapsed):
+    # Counters can wrap or reset (device re-created), never report negatives
+    return max(after - before, 0) / elapsed
+
+
+class Collector:
+    """One source of metrics, contributing the ``name`` key of each sample.
+
+    ``interval`` is the default cadence in seconds (None runs it on every
+    tick) and ``cost`` is how expensive one run is: 'low' reads a few kernel
+    counters, 'medium' a few syscalls per device or container, 'high' walks
+    every process. Sticky collectors have their last result repeated on the
+    ticks they do not run, so the sample always has the same shape.
+    """
+
+    name = None
+    interval = None
+    cost = 'low'
+    sticky = True
+
+    def collect(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class CpuCollector(Collector):
+    """Overall and per-core utilisation from /proc/stat."""
+
+    name = 'cpu'
+
+    def __init__(self, path='/proc/stat'):
+        self._file = ProcFile(path)
+        self._previous = self._read()
+
+    def _read(self):
+        times = {}
+        for line in self._file.read().split(b'\n'):
+            if not line.startswith(b'cpu'):
+                break
+            fields = line.split()
+            values = [int(v) for v in fields[1:]]
+            # user nice system idle iowait irq softirq steal; guest time is
+            # already counted in user and nice
+            total = sum(values[:8])
+            idle = values[3] + values[4]
+            times[fields[0].decode()] = (total - idle, total)
+        return times
+
+    @staticmethod
+    def _percent(before, after):
+        total_delta = after[1] - before[1]
+        if total_delta <= 0:
+            return 0.0
+        busy_delta = max(after[0] - before[0], 0)
+        return round(min(busy_delta / total_delta * 100, 100.0), 2)
+
+    def collect(self):
+        current = self._read()
+        previous, self._previous = self._previous, current
+        # Keyed by the kernel's cpuN id, offline cores leave gaps in the numbering
+        per_core = {
+            core: self._percent(previous[core], current[core])
+            for core in current
+            if core != 'cpu' and core in previous
+        }
+        return {
+            "cpu_percent": self._percent(previous['cpu'], current['cpu']),
+            "per_core": per_core,
+        }
+
+    def close(self):
+        self._file.close()
+
+
+class MemoryCollector(Collector):
+    """Memory usage from /proc/meminfo; ``used`` is everything not available."""
+
+    name = 'memory'
+
+    def __init__(self, path='/proc/meminfo'):
+        self._file = ProcFile(path)
+
+    def collect(self):
+        info = {}
+        for line in self._file.read().split(b'\n'):
+            key, _, value = line.partition(b':')
+            if key in (b'MemTotal', b'MemAvailable'):
+                info[key] = int(value.split()[0]) * 1024
+        total = info[b'MemTotal']
+        used = total - info.get(b'MemAvailable', 0)
+        return {
+            "percent": round(used / total * 100, 1) if total else 0.0,
+            "total": total,
+            "used": used,
+        }
+
+    def close(self):
+        self._file.close()
+
+
+class NetworkCollector(Collector):
+    """Totals and per-interface throughput from /proc/net/dev."""
+
+    name = 'network'
+
+    def __init__(self, path='/proc/net/dev', clock=time.monotonic):
+        self._file = ProcFile(path)
+        self.clock = clock
+        self._previous = self._read()
+        self._stamp = self.clock()
+
+    def _read(self):
+        counters = {}
+        # Two header lines, then "iface: rx_bytes rx_packets ... tx_bytes ..."
+        for line in self._file.read().split(b'\n')[2:]:
+            name, _, values = line.partition(b':')
+            if not values:
+                continue
+            fields = values.split()
+            counters[name.strip().decode()] = (int(fields[8]), int(fields[0]))
+        return counters
+
+    def collect(self):
+        current = self._read()
+        now = self.clock()
+        elapsed = max(now - self._stamp, 1e-9)
+        previous, self._previous, self._stamp = self._previous, current, now
+
+        sent = sum(c[0] for c in current.values())
+        recv = sum(c[1] for c in current.values())
+        sent_rate = recv_rate = 0.0
+        interfaces = {}
+        for name, (tx, rx) in current.items():
+            tx_before, rx_before = previous.get(name, (tx, rx))
+            tx_rate, rx_rate = _rate(tx_before, tx, elapsed), _rate(rx_before, rx, elapsed)
+            sent_rate += tx_rate
+            recv_rate += rx_rate
+            if not name.startswith(UNLISTED_INTERFACE_PREFIXES):
+                interfaces[name] = {"bytes_sent_per_sec": tx_rate, "bytes_recv_per_sec": rx_rate}
+
+        return {
+            "bytes_sent": sent,
+            "bytes_recv": recv,
+            "bytes_sent_per_sec": sent_rate,
+            "bytes_recv_per_sec": recv_rate,
+            "interfaces": interfaces,
+        }
+
+    def close(self):
+        self._file.close()
+
+
+class DiskIOCollector(Collector):
+    """Per-block-device throughput from /proc/diskstats.
+
+    Only whole devices from /sys/block are listed, and the totals only count
+    the ones backed by hardware, so device-mapper volumes and partitions are
+    not counted twice. /sys/block is scanned again whenever /proc/diskstats
+    gains a name it has not seen or loses a listed device, so hot-attached
+    volumes show up without a restart.
+    """
+
+    name = 'disk_io'
+
+    def __init__(self, path='/proc/diskstats', sys_block='/sys/block', clock=time.monotonic):
+        self._file = ProcFile(path, bufsize=16384)
+        self.sys_block = sys_block
+        self.clock = clock
+        self._devices = {}
+        # Every name in /proc/diskstats as of the last scan, partitions included
+        self._known = set()
+        self._previous = self._read()
+        self._stamp = self.clock()
+        self._scan_devices(self._previous)
+
+    def _scan_devices(self, counters):
+        self._known = set(counters)
+        try:
+            names = os.listdir(self.sys_block)
+        except OSError:
+            names = []
+        self._devices = {
+            name: os.path.exists(os.path.join(self.sys_block, name, 'device'))
+            for name in names if not name.startswith(UNLISTED_BLOCK_DEVICE_PREFIXES)
+        }
+
+    def _read(self):
+        counters = {}
+        for line in self._file.read().split(b'\n'):
+            fields = line.split()
+            if len(fields) < 10:
+                continue
+            counters[fields[2].decode()] = (int(fields[5]) * SECTOR_SIZE, int(fields[9]) * SECTOR_SIZE)
+        return counters
+
+    def collect(self):
+        current = self._read()
+        now = self.clock()
+        elapsed = max(now - self._stamp, 1e-9)
+        previous, self._previous, self._stamp = self._previous, current, now
+
+        if current.keys() - self._known or any(name not in current for name in self._devices):
+            self._scan_devices(current)
+
+        read_rate = write_rate = 0.0
+        devices = {}
+        for name, physical in self._devices.items():
+            if name not in current:
+                continue
+            read, written = current[name]
+            read_before, written_before = previous.get(name, (read, written))
+            device = {
+                "read_bytes_per_sec": _rate(read_before, read, elapsed),
+                "write_bytes_per_sec": _rate(written_before, written, elapsed),
+            }
+            devices[name] = device
+            if physical:
+                read_rate += device["read_bytes_per_sec"]
+                write_rate += device["write_bytes_per_sec"]
+
+        return {
+            "read_bytes_per_sec": read_rate,
+            "write_bytes_per_sec": write_rate,
+            "devices": devices,
+        }
+
+    def close(self):
+        self._file.close()
+
+
+class MountCollector(Collector):
+    """Usage of every mounted filesystem; the root one is also reported flat."""
+
+    name = 'disk'
+    interval = 30.0
+    cost = 'medium'
+
+    @staticmethod
+    def _usage(path):
+        usage = psutil.disk_usage(path)
+        return {"percent": usage.percent, "total": usage.total, "used": usage.used}
+
+    def collect(self):
+        mounts = {}
+        seen = set()
+        for partition in psutil.disk_partitions(all=False):
+            if partition.fstype in SKIPPED_FILESYSTEMS or partition.device in seen:
+                continue
+            seen.add(partition.device)
+            try:
+                mounts[partition.mountpoint] = dict(self._usage(partition.mountpoint), device=partition.device,
+                                                    fstype=partition.fstype)
+            except OSError as e:
+                logger.debug(f"Skipping mount {partition.mountpoint}: {e}")
+
+        disk = self._usage('/')
+        disk["mounts"] = mounts
+        return disk
+
+
+class _Container:
+    __slots__ = ('path', 'cpu', 'memory', 'memory_max', 'io', 'usage_usec', 'io_bytes', 'stamp')
+
+    def __init__(self, path):
+        self.path = path
+        self.cpu = ProcFile(os.path.join(path, 'cpu.stat'))
+        self.memory = ProcFile(os.path.join(path, 'memory.current'))
+        self.memory_max = ProcFile(os.path.join(path, 'memory.max'))
+        self.io = ProcFile(os.path.join(path, 'io.stat'))
+        self.usage_usec = None
+        self.io_bytes = None
+        self.stamp = None
+
+    def close(self):
+        for handle in (self.cpu, self.memory, self.memory_max, self.io):
+            handle.close()
+
+
+class ContainerCollector(Collector):
+    """Per-container CPU, memory and IO from cgroup v2.
+
+    Containers are found by their scope names (docker, containerd, CRI-O,
+    podman) anywhere in the unified hierarchy. ``cpu_percent`` is relative to
+    one core, like ``docker stats``, so a busy container can exceed 100.
+    """
+
+    name = 'containers'
+    interval = 10.0
+    cost = 'medium'
+
+    def __init__(self, root=CGROUP_ROOT, max_depth=6, clock=time.monotonic):
+        self.root = root
+        self.max_depth = max_depth
+        self.clock = clock
+        self._containers = {}
+
+    @staticmethod
+    def available(root=CGROUP_ROOT):
+        return os.path.exists(os.path.join(root, 'cgroup.controllers'))
+
+    def _scan(self):
+        found = {}
+        stack = [(self.root, 0)]
+        while stack:
+            path, depth = stack.pop()
+            try:
+                entries = [entry for entry in os.scandir(path) if entry.is_dir(follow_symlinks=False)]
+            except OSError:
+                continue
+            parent = os.path.basename(path)
+            for entry in entries:
+                match = CONTAINER_CGROUP.match(entry.name)
+                if match:
+                    found[match.group(1)[:12]] = entry.path
+                elif parent == 'docker' and re.fullmatch(r'[0-9a-f]{64}', entry.name):
+                    found[entry.name[:12]] = entry.path
+                elif depth < self.max_depth:
+                    stack.append((entry.path, depth + 1))
+        return found
+
+    @staticmethod
+    def _keyed(data):
+        return dict(line.split(b' ', 1) for line in data.split(b'\n') if b' ' in line)
+
+    def _read(self, container, now):
+        usage_usec = int(self._keyed(container.cpu.read())[b'usage_usec'])
+        memory = int(container.memory.read())
+        memory_max = container.memory_max.read().strip()
+        io_bytes = [0, 0]
+        for line in container.io.read().split(b'\n'):
+            for field in line.split()[1:]:
+                key, _, value = field.partition(b'=')
+                if key == b'rbytes':
+                    io_bytes[0] += int(value)
+                elif key == b'wbytes':
+                    io_bytes[1] += int(value)
+
+        stats = {
+            "cpu_percent": 0.0,
+            "memory_bytes": memory,
+            "memory_limit": None if memory_max == b'max' else int(memory_max),
+            "read_bytes_per_sec": 0.0,
+            "write_bytes_per_sec": 0.0,
+        }
+        if container.stamp is not None:
+            elapsed = max(now - container.stamp, 1e-9)
+            stats["cpu_percent"] = round(_rate(container.usage_usec, usage_usec, elapsed) / 1e4, 2)
+            stats["read_bytes_per_sec"] = _rate(container.io_bytes[0], io_bytes[0], elapsed)
+            stats["write_bytes_per_sec"] = _rate(container.io_bytes[1], io_bytes[1], elapsed)
+        container.usage_usec, container.io_bytes, container.stamp = usage_usec, io_bytes, now
+        return stats
+
+    def collect(self):
+        paths = self._scan()
+        for container_id in list(self._containers):
+            if container_id not in paths:
+                self._containers.pop(container_id).close()
+
+        now = self.clock()
+        containers = {}
+        for container_id, path in paths.items():
+            container = self._containers.get(container_id)
+            if container is None or container.path != path:
+                if container is not None:
+                    container.close()
+                container = self._containers[container_id] = _Container(path)
+            try:
+                containers[container_id] = self._read(container, now)
+            except (OSError, KeyError, ValueError):
+                # Exited between the scan and the read, or a controller is off
+                self._containers.pop(container_id).close()
+        return containers
+
+    def close(self):
+        for container in self._containers.values():
+            container.close()
+        self._containers.clear()
+
+
+class CollectorRegistry:
+    """Runs each registered collector on its own cadence from the sample tick.
+
+    A collector is due when its interval has elapsed, give or take half a
+    tick. After a tick that overran, due 'high' cost collectors are put off by
+    one tick so the agent can catch up before paying for them.
+    """
+
+    def __init__(self, tick, clock=time.monotonic, on_timing=None):
+        self.tick = float(tick)
+        self.clock = clock
+        self.on_timing = on_timing
+        self._entries = []
+        self._last = {}
+
+    def register(self, collector, interval=None):
+        if collector.cost not in COSTS:
+            raise ValueError(f"Unknown collector cost: {collector.cost}")
+        interval = interval if interval is not None else collector.interval
+        self._entries.append({
+            "collector": collector,
+            "interval": float(interval) if interval else None,
+            "next_due": None,
+            "deferred": False,
+        })
+        return collector
+
+    def __iter__(self):
+        return (entry["collector"] for entry in self._entries)
+
+    def describe(self):
+        return ', '.join(
+            f"{entry['collector'].name} every {entry['interval'] or self.tick:g}s ({entry['collector'].cost})"
+            for entry in self._entries
+        )
+
+    def _due(self, entry, now, behind):
+        if entry["interval"] is None or entry["next_due"] is None:
+            return True
+        if now < entry["next_due"] - self.tick / 2:
+            return False
+        if behind and entry["collector"].cost == 'high' and not entry["deferred"]:
+            entry["deferred"] = True
+            return False
+        return True
+
+    def collect(self, behind=False):
+        sample = {}
+        for entry in self._entries:
+            collector = entry["collector"]
+            now = self.clock()
+            if self._due(entry, now, behind):
+                entry["deferred"] = False
+                if entry["interval"] is not None:
+                    # Fixed-rate like the scheduler, without catching up on misses
+                    next_due = (entry["next_due"] or now) + entry["interval"]
+                    entry["next_due"] = next_due if next_due > now else now + entry["interval"]
+                try:
+                    result = collector.collect()
+                except Exception as e:
+                    logger.error(f"Error in {collector.name} collector: {e}")
+                    # Sticky collectors repeat their last good reading, so a
+                    # failed run does not change the shape of the sample
+                    if collector.name in self._last:
+                        sample[collector.name] = self._last[collector.name]
+                    continue
+                finally:
+                    if self.on_timing:
+                        self.on_timing(collector.name, self.clock() - now)
+                sample[collector.name] = result
+                if collector.sticky:
+                    self._last[collector.name] = result
+            elif collector.name in self._last:
+                sample[collector.name] = self._last[collector.name]
+        return sample
+
+    def close(self):
+        for collector in self:
+            collector.close()
+
+
+BUILTIN_COLLECTORS = ('cpu', 'memory', 'network', 'disk_io', 'disk', 'containers')
+
+
+def build_registry(tick, names=None, intervals=None, extra=(), on_timing=None):
+    """Registry with the named built-in collectors (all by default) plus ``extra``.
+
+    ``intervals`` maps collector names to interval overrides in seconds, and
+    ``on_timing(name, seconds)`` is called after every collector run.
+    """
+    intervals = intervals or {}
+    registry = CollectorRegistry(tick, on_timing=on_timing)
+    for name in names or BUILTIN_COLLECTORS:
+        if name == 'cpu':
+            collector = CpuCollector()
+        elif name == 'memory':
+            collector = MemoryCollector()
+        elif name == 'network':
+            collector = NetworkCollector()
+        elif name == 'disk_io':
+            collector = DiskIOCollector()
+        elif name == 'disk':
+            collector = MountCollector()
+        elif name == 'containers':
+            if not ContainerCollector.available():
+                logger.info("cgroup v2 not mounted, container metrics disabled")
+                continue
+            collector = ContainerCollector()
+        elif any(collector.name == name for collector in extra):
+            continue
+        else:
+            raise ValueError(f"Unknown collector: {name}")
+        registry.register(collector, intervals.get(name))
+    for collector in extra:
+        if names is None or collector.name in names:
+            registry.register(collector, intervals.get(collector.name))
+    return registry
+
+
+def parse_intervals(config):
+    """Parse "disk=30,containers=10" into {'disk': 30.0, 'containers': 10.0}."""
+    intervals = {}
+    for item in (config or '').split(','):
+        if item.strip():
+            name, _, value = item.partition('=')
+            intervals[name.strip()] = float(value)
+    return intervals
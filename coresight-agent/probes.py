@@ -0,0 +1,223 @@
+import asyncio
+import heapq
+import random
+import socket
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import aiohttp
+
+logger = logging.getLogger('CoreSightAgent')
+
+USER_AGENT = 'Mozilla/5.0 (compatible; CoreSight/1.0; +http://example.com)'
+
+
+class ProbeTarget:
+    """One check, derived from a monitored website's URL.
+
+    ``http(s)://`` URLs get an HTTP GET, ``tcp://host:port`` a TCP connect and
+    ``dns://host`` a name resolution, so TCP and DNS checks need no schema of
+    their own on the backend.
+    """
+
+    __slots__ = ('id', 'url', 'kind', 'host', 'port', 'interval', 'in_flight')
+
+    def __init__(self, id, url, interval):
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme in ('http', 'https'):
+            self.kind = 'http'
+        elif scheme in ('tcp', 'dns'):
+            self.kind = scheme
+        else:
+            raise ValueError(f"Unsupported probe URL: {url}")
+        if not parts.hostname:
+            raise ValueError(f"Probe URL has no host: {url}")
+        if self.kind == 'tcp' and not parts.port:
+            raise ValueError(f"TCP probe URL needs a port: {url}")
+
+        self.id = id
+        self.url = url
+        self.host = parts.hostname
+        self.port = parts.port
+        self.interval = max(float(interval or 60), 1.0)
+        self.in_flight = False
+
+    def same_as(self, other):
+        return self.url == other.url and self.interval == other.interval
+
+
+class ProbeEngine:
+    """Runs thousands of uptime checks concurrently on one asyncio loop.
+
+    Every target is probed on its own interval (first runs are spread out
+    with jitter). At most ``concurrency`` probes are in flight at once: that
+    budget bounds both the semaphore and aiohttp's connection pool. A target
+    whose previous probe is still running is skipped rather than queued.
+    getaddrinfo blocks, so DNS checks run on a resolver pool of the same size
+    instead of the loop's small default executor.
+    Results go to ``on_result``, which is expected to hand them off quickly.
+    """
+
+    def __init__(self, on_result, targets_url=None, server_id=None, concurrency=256,
+                 timeout=10.0, refresh_interval=60.0):
+        self.on_result = on_result
+        self.targets_url = targets_url
+        self.server_id = server_id
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.refresh_interval = refresh_interval
+
+        self.targets = {}
+        self.probes_run = 0
+        self.probes_skipped = 0
+        self._heap = []
+        self._counter = 0
+        self._stopping = False
+        self._resolver = None
+
+    def _schedule(self, target, due):
+        self._counter += 1
+        heapq.heappush(self._heap, (due, self._counter, target))
+
+    def set_targets(self, definitions, now=None):
+        """Replace the target list, keeping the schedule of unchanged targets."""
+        now = asyncio.get_running_loop().time() if now is None else now
+        targets = {}
+        for definition in definitions:
+            try:
+                target = ProbeTarget(definition['id'], definition['url'], definition.get('interval'))
+            except (KeyError, ValueError) as e:
+                logger.error(f"Skipping probe target {definition}: {e}")
+                continue
+            existing = self.targets.get(target.id)
+            if existing is not None and existing.same_as(target):
+                targets[target.id] = existing
+            else:
+                targets[target.id] = target
+                self._schedule(target, now + random.uniform(0, target.interval))
+        self.targets = targets
+
+    async def _probe_http(self, session, target):
+        async with session.get(target.url, allow_redirects=True) as response:
+            status = 'up' if 200 <= response.status < 400 else 'down'
+            error = None if status == 'up' else f"HTTP Error: {response.status} {response.reason}"
+            return status, response.status, error
+
+    async def _probe_tcp(self, target):
+        _, writer = await asyncio.open_connection(target.host, target.port)
+        writer.close()
+        await writer.wait_closed()
+        return 'up', None, None
+
+    async def _probe_dns(self, target):
+        addresses = await asyncio.get_running_loop().run_in_executor(
+            self._resolver, socket.getaddrinfo, target.host, None, 0, socket.SOCK_STREAM)
+        if not addresses:
+            return 'down', None, "No addresses returned"
+        return 'up', None, None
+
+    async def probe(self, session, target):
+        timeout = min(self.timeout, target.interval)
+        started = time.perf_counter()
+        try:
+            if target.kind == 'http':
+                coroutine = self._probe_http(session, target)
+            elif target.kind == 'tcp':
+                coroutine = self._probe_tcp(target)
+            else:
+                coroutine = self._probe_dns(target)
+            status, status_code, error = await asyncio.wait_for(coroutine, timeout)
+        except asyncio.TimeoutError:
+            status, status_code, error = 'down', None, f"Timed out after {timeout:g}s"
+        except (aiohttp.ClientError, OSError) as e:
+            status, status_code, error = 'down', None, str(e) or e.__class__.__name__
+
+        return {
+            "website_id": target.id,
+            "kind": target.kind,
+            "status": status,
+            "status_code": status_code,
+            "response_time": int((time.perf_counter() - started) * 1000) if status == 'up' else None,
+            "error_message": error,
+            "timestamp": datetime.now().astimezone().isoformat(),
+        }
+
+    async def _run_probe(self, semaphore, session, target):
+        try:
+            async with semaphore:
+                result = await self.probe(session, target)
+            self.probes_run += 1
+            self.on_result(result)
+        except Exception as e:
+            logger.error(f"Error probing {target.url}: {e}", exc_info=True)
+        finally:
+            target.in_flight = False
+
+    async def refresh_targets(self, session):
+        async with session.get(self.targets_url, params={"server_id": self.server_id}) as response:
+            response.raise_for_status()
+            body = await response.json(content_type=None)
+        self.set_targets(body.get("targets", []))
+        logger.info(f"Probing {len(self.targets)} target(s)")
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+        headers = {
+            'User-Agent': USER_AGENT,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+        }
+        tasks = set()
+        next_refresh = loop.time()
+        # Threads are only started as lookups need them
+        self._resolver = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='coresight-dns')
+
+        async with aiohttp.ClientSession(connector=connector, headers=headers) as session:
+            while not self._stopping:
+                now = loop.time()
+                if self.targets_url and now >= next_refresh:
+                    next_refresh = now + self.refresh_interval
+                    try:
+                        await self.refresh_targets(session)
+                    except Exception as e:
+                        logger.error(f"Error fetching probe targets: {e}")
+
+                while self._heap and self._heap[0][0] <= now:
+                    due, _, target = heapq.heappop(self._heap)
+                    if self.targets.get(target.id) is not target:
+                        continue  # removed or replaced since it was scheduled
+                    # Fixed-rate per target, but never try to catch up on missed runs
+                    next_due = due + target.interval
+                    self._schedule(target, next_due if next_due > now else now + target.interval)
+                    if target.in_flight:
+                        self.probes_skipped += 1
+                        continue
+                    target.in_flight = True
+                    task = asyncio.create_task(self._run_probe(semaphore, session, target))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+
+                wake = next_refresh if self.targets_url else now + 1.0
+                if self._heap:
+                    wake = min(wake, self._heap[0][0])
+                await asyncio.sleep(min(max(wake - loop.time(), 0.0), 1.0))
+
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._resolver.shutdown(wait=False, cancel_futures=True)
+
+    def stop(self):
+        self._stopping = True
+
+    def start_thread(self):
+        """Run the engine on its own event loop in a daemon thread."""
+        thread = threading.Thread(target=asyncio.run, args=(self.run(),), name='coresight-probes', daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,182 @@
+import heapq
+import os
+import time
+import logging
+
+import psutil
+
+from collectors import Collector
+
+logger = logging.getLogger('CoreSightAgent')
+
+SORT_KEYS = ('cpu_percent', 'memory_percent', 'io_bytes_per_sec')
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+
+def read_stat(pid):
+    """Start time (clock ticks since boot) and CPU seconds from /proc/<pid>/stat.
+
+    One read gives both: the start time tells a reused PID apart, and psutil
+    caches it per handle, so it could only be re-read through a new one.
+    """
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            data = f.read()
+    except (FileNotFoundError, ProcessLookupError):
+        raise psutil.NoSuchProcess(pid)
+    # The command name may hold spaces and parentheses, fields resume after the last ')'
+    fields = data[data.rindex(b')') + 2:].split()
+    # utime, stime and starttime are fields 14, 15 and 22 of the file
+    return int(fields[19]), (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+
+class _TrackedProcess:
+    __slots__ = ('process', 'name', 'start_time', 'cpu_time', 'cpu_stamp', 'io_bytes', 'io_stamp', 'io_denied')
+
+    def __init__(self, process, name, start_time):
+        self.process = process
+        self.name = name
+        self.start_time = start_time
+        self.cpu_time = None
+        self.cpu_stamp = None
+        self.io_bytes = None
+        self.io_stamp = None
+        self.io_denied = False
+
+
+class ProcessCollector(Collector):
+    """Incremental process-table collector.
+
+    ``Process`` handles are kept across cycles so CPU and IO figures are real
+    rates since the previous reading rather than the 0.0 a fresh handle
+    reports. PIDs that exited are evicted, and a PID whose start time differs
+    from the one cached when it was first tracked was reused by a new process,
+    so it is tracked afresh with its own name and baselines.
+
+    Each cycle the start time and CPU time (one /proc/<pid>/stat read) and the
+    IO counters are read for every process, so both rates always span exactly
+    one cycle whichever field is used for ranking. The top ``top_n`` by
+    ``sort_key`` are picked with a bounded heap and only those winners get
+    their memory read. Baselines are primed when the collector is created, so
+    the first cycle already ranks by real rates.
+    """
+
+    name = 'processes'
+    interval = 10.0
+    cost = 'high'
+    # The backend replaces its process table with every list it receives
+    sticky = False
+
+    def __init__(self, top_n=10, sort_key='cpu_percent', pids=psutil.pids, stat=read_stat,
+                 process_factory=psutil.Process, total_memory=None, clock=time.monotonic):
+        if sort_key not in SORT_KEYS:
+            raise ValueError(f"Unsupported process sort key: {sort_key}")
+        self.top_n = top_n
+        self.sort_key = sort_key
+        self.pids = pids
+        self.stat = stat
+        self.process_factory = process_factory
+        self.total_memory = total_memory or psutil.virtual_memory().total
+        self.clock = clock
+        self._tracked = {}
+        self._scan(self.clock())
+
+    def __len__(self):
+        return len(self._tracked)
+
+    def _track(self, pid, start_time):
+        try:
+            process = self.process_factory(pid)
+            return _TrackedProcess(process, process.name(), start_time)
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            return None
+
+    def _cpu_percent(self, tracked, cpu_time, now):
+        previous, stamp = tracked.cpu_time, tracked.cpu_stamp
+        tracked.cpu_time, tracked.cpu_stamp = cpu_time, now
+        if previous is None or now <= stamp:
+            return 0.0
+        return max(cpu_time - previous, 0) / (now - stamp) * 100
+
+    def _memory_percent(self, tracked):
+        return tracked.process.memory_info().rss / self.total_memory * 100
+
+    def _io_rate(self, tracked, now):
+        if tracked.io_denied:
+            return 0.0
+        try:
+            io = tracked.process.io_counters()
+        except psutil.AccessDenied:
+            tracked.io_denied = True
+            return 0.0
+        io_bytes = io.read_bytes + io.write_bytes
+        previous, stamp = tracked.io_bytes, tracked.io_stamp
+        tracked.io_bytes, tracked.io_stamp = io_bytes, now
+        if previous is None or now <= stamp:
+            return 0.0
+        return max(io_bytes - previous, 0) / (now - stamp)
+
+    def _scan(self, now):
+        """Refresh the tracked PIDs and their counters; return {pid: values}."""
+        current = set(self.pids())
+        for pid in self._tracked.keys() - current:
+            del self._tracked[pid]
+
+        rows = {}
+        for pid in current:
+            try:
+                start_time, cpu_time = self.stat(pid)
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                self._tracked.pop(pid, None)
+                continue
+            tracked = self._tracked.get(pid)
+            if tracked is None or tracked.start_time != start_time:
+                tracked = self._track(pid, start_time)
+                if tracked is None:
+                    self._tracked.pop(pid, None)
+                    continue
+                self._tracked[pid] = tracked
+            try:
+                values = {
+                    'cpu_percent': self._cpu_percent(tracked, cpu_time, now),
+                    'io_bytes_per_sec': self._io_rate(tracked, now),
+                }
+                if self.sort_key == 'memory_percent':
+                    values['memory_percent'] = self._memory_percent(tracked)
+                rows[pid] = values
+            except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                del self._tracked[pid]
+            except psutil.AccessDenied:
+                continue
+        return rows
+
+    def collect(self):
+        now = self.clock()
+        rows = self._scan(now)
+
+        # Bounded selection, O(n log top_n) instead of sorting every process
+        top = heapq.nlargest(self.top_n, ((values[self.sort_key], pid) for pid, values in rows.items()))
+
+        processes = []
+        for _, pid in top:
+            tracked = self._tracked[pid]
+            values = rows[pid]
+            try:
+                if 'memory_percent' not in values:
+                    values['memory_percent'] = self._memory_percent(tracked)
+            except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                del self._tracked[pid]
+                continue
+            except psutil.AccessDenied:
+                continue
+
+            processes.append({
+                "pid": int(pid),
+                "name": str(tracked.name),
+                "cpu_percent": round(values['cpu_percent'], 2),
+                "memory_percent": round(values['memory_percent'], 2),
+                "io_bytes_per_sec": round(values['io_bytes_per_sec'], 2),
+                "disk_usage": round(values['io_bytes_per_sec'] / (1024 * 1024), 4)  # MB/s, stored by the backend
+            })
+        return processes
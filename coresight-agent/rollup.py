@@ -0,0 +1,221 @@
+import math
+import time
+import logging
+from datetime import datetime
+
+logger = logging.getLogger('CoreSightAgent')
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+# Rolled-up series and where each lives in a collect_metrics() sample
+SERIES = {
+    "cpu_percent": ("cpu", "cpu_percent"),
+    "memory_percent": ("memory", "percent"),
+    "disk_percent": ("disk", "percent"),
+    "network_in": ("network", "bytes_recv_per_sec"),
+    "network_out": ("network", "bytes_sent_per_sec"),
+    "disk_read": ("disk_io", "read_bytes_per_sec"),
+    "disk_write": ("disk_io", "write_bytes_per_sec"),
+}
+
+
+def _extract(sample):
+    """Pull the rolled-up series out of one collect_metrics() sample.
+
+    Series whose collector is disabled or has not produced a reading yet are
+    left out, they simply get no summary for the window.
+    """
+    values = {}
+    for name, (section, key) in SERIES.items():
+        value = (sample.get(section) or {}).get(key)
+        if value is not None:
+            values[name] = value
+    return values
+
+
+class QuantileSketch:
+    """Streaming quantile sketch with bounded memory (DDSketch-style).
+
+    Values land in logarithmic buckets so every quantile is within
+    ``relative_accuracy`` of the true value. Once ``max_buckets`` is reached
+    the lowest buckets are merged, which only costs accuracy at the low end
+    where p95/p99 never look.
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_buckets=1024, min_value=1e-9):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.min_value = min_value
+        self.reset()
+
+    def reset(self):
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value):
+        self.count += 1
+        if value <= self.min_value:
+            self.zero_count += 1
+            return
+        key = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+        if len(self.buckets) > self.max_buckets:
+            lowest, second = sorted(self.buckets)[:2]
+            self.buckets[second] += self.buckets.pop(lowest)
+
+    def quantiles(self, qs=QUANTILES):
+        """Return the estimate for each quantile in ``qs`` (ascending)."""
+        if self.count == 0:
+            return [None for _ in qs]
+
+        results = []
+        ranks = [q * (self.count - 1) for q in qs]
+        cumulative = self.zero_count
+        keys = iter(sorted(self.buckets))
+        key = None
+        for rank in ranks:
+            if rank < self.zero_count:
+                results.append(0.0)
+                continue
+            while cumulative <= rank:
+                key = next(keys)
+                cumulative += self.buckets[key]
+            results.append(2 * self.gamma ** key / (self.gamma + 1))
+        return results
+
+
+class _SeriesStats:
+    __slots__ = ('count', 'min', 'max', 'total', 'last', 'sketch')
+
+    def __init__(self, sketch):
+        self.sketch = sketch
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.total = 0.0
+        self.last = None
+        self.sketch.reset()
+
+    def add(self, value):
+        value = float(value or 0.0)
+        self.count += 1
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.total += value
+        self.last = value
+        self.sketch.add(value)
+
+    def summary(self):
+        # Sketch estimates can stray past the exact extremes by the relative accuracy
+        p50, p95, p99 = (min(max(q, self.min), self.max) for q in self.sketch.quantiles(QUANTILES))
+        return {
+            "min": round(self.min, 4),
+            "max": round(self.max, 4),
+            "mean": round(self.total / self.count, 4),
+            "last": round(self.last, 4),
+            "p50": round(p50, 4),
+            "p95": round(p95, 4),
+            "p99": round(p99, 4),
+        }
+
+
+class _Window:
+    def __init__(self, seconds, relative_accuracy, max_buckets):
+        self.seconds = seconds
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.start = None
+        self.count = 0
+        self.series = {}
+        self.latest = None
+        self.processes = None
+        self.missed_ticks = 0
+
+    def add(self, sample, values):
+        for name, value in values.items():
+            stats = self.series.get(name)
+            if stats is None:
+                stats = self.series[name] = _SeriesStats(
+                    QuantileSketch(self.relative_accuracy, self.max_buckets))
+            stats.add(value)
+        self.count += 1
+        self.latest = sample
+        self.missed_ticks = sample.get("missed_ticks", self.missed_ticks)
+        if "processes" in sample:
+            self.processes = sample["processes"]
+
+    def reset(self, start):
+        self.start = start
+        self.count = 0
+        self.latest = None
+        self.processes = None
+        for stats in self.series.values():
+            stats.reset()
+
+
+class RollupAggregator:
+    """Folds high-frequency samples into one rollup per window.
+
+    Windows are aligned to the wall clock (a 60 s window always covers
+    hh:mm:00-hh:mm:60) so rollups from different agents line up. A window is
+    emitted when the first sample of the next window arrives. The finest
+    window is flagged ``primary`` and is what the backend charts from.
+    """
+
+    def __init__(self, server_id, windows, relative_accuracy=0.01, max_buckets=1024, clock=time.time):
+        if not windows:
+            raise ValueError("At least one rollup window is required")
+        self.server_id = server_id
+        self.clock = clock
+        self.windows = [_Window(seconds, relative_accuracy, max_buckets)
+                        for seconds in sorted(set(float(w) for w in windows))]
+
+    def _rollup(self, window, primary):
+        latest = window.latest
+        rollup = {
+            "type": "rollup",
+            "server_id": self.server_id,
+            "window": window.seconds,
+            "primary": primary,
+            "start": datetime.fromtimestamp(window.start).astimezone().isoformat(),
+            "timestamp": datetime.fromtimestamp(window.start + window.seconds).astimezone().isoformat(),
+            "count": window.count,
+            "missed_ticks": window.missed_ticks,
+            "metrics": {name: stats.summary() for name, stats in window.series.items() if stats.count},
+            "memory": latest.get("memory"),
+            "disk": latest.get("disk"),
+        }
+        if window.processes is not None:
+            rollup["processes"] = window.processes
+        return rollup
+
+    def add(self, sample):
+        """Add one sample; return the rollups of any windows it closed."""
+        now = self.clock()
+        values = _extract(sample)
+        rollups = []
+        for index, window in enumerate(self.windows):
+            start = math.floor(now / window.seconds) * window.seconds
+            if window.start is None:
+                window.reset(start)
+            elif start != window.start:
+                if window.count:
+                    rollups.append(self._rollup(window, primary=index == 0))
+                window.reset(start)
+            window.add(sample, values)
+        return rollups
+
+    def flush(self):
+        """Emit whatever the open windows hold, e.g. on shutdown."""
+        rollups = []
+        for index, window in enumerate(self.windows):
+            if window.count:
+                rollups.append(self._rollup(window, primary=index == 0))
+                window.reset(window.start)
+        return rollups
@@ -0,0 +1,25 @@
+from flask import Blueprint, Response, current_app, jsonify, request
+
+telemetry_bp = Blueprint('telemetry', __name__)
+
+
+def _conditional(body, etag):
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@telemetry_bp.route('/metrics/latest')
+def get_latest_metrics():
+    body, etag = current_app.config['TELEMETRY'].latest()
+    if body is None:
+        return jsonify({
+            'success': False,
+            'error': 'No metrics collected yet'
+        }), 503
+    return _conditional(body, etag)
+
+@telemetry_bp.route('/telemetry')
+def get_telemetry():
+    body, etag = current_app.config['TELEMETRY'].report()
+    return _conditional(body, etag)
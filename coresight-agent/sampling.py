@@ -0,0 +1,45 @@
+import time
+import logging
+
+logger = logging.getLogger('CoreSightAgent')
+
+
+class FixedRateScheduler:
+    """Fixed-rate ticker on the monotonic clock.
+
+    Deadlines are anchored to the first tick (start + k * interval), so the time
+    spent collecting and sending does not accumulate into drift. When a cycle
+    overruns by more than one interval the skipped deadlines are counted in
+    ``missed_ticks`` instead of being fired back to back.
+    """
+
+    def __init__(self, interval, clock=time.monotonic, sleep=time.sleep):
+        if interval <= 0:
+            raise ValueError("Sampling interval must be positive")
+        self.interval = float(interval)
+        self.clock = clock
+        self.sleep = sleep
+        self.ticks = 0
+        self.missed_ticks = 0
+        self._deadline = None
+
+    def wait(self):
+        """Block until the next deadline; return how many ticks were skipped."""
+        now = self.clock()
+        if self._deadline is None:
+            self._deadline = now
+
+        missed = 0
+        delay = self._deadline - now
+        if delay > 0:
+            self.sleep(delay)
+        elif -delay >= self.interval:
+            missed = int(-delay // self.interval)
+            self._deadline += missed * self.interval
+            self.missed_ticks += missed
+            logger.warning(f"Sampling fell behind, skipped {missed} tick(s)")
+
+        self._deadline += self.interval
+        self.ticks += 1
+        return missed
+
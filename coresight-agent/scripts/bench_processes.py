@@ -0,0 +1,194 @@
+import argparse
+import os
+import random
+import sys
+import time
+from collections import namedtuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psutil
+
+from processes import ProcessCollector
+
+MemoryInfo = namedtuple('MemoryInfo', ['rss', 'vms'])
+IOCounters = namedtuple('IOCounters', ['read_bytes', 'write_bytes'])
+
+TOTAL_MEMORY = 64 * 1024 ** 3
+
+
+class FakeProcessTable:
+    """Synthetic process table whose counters advance every cycle.
+
+    Every accessor counts the /proc files psutil would read for it on Linux,
+    so the two collectors can be compared on kernel reads as well as time.
+    """
+
+    def __init__(self, size, seed=42):
+        rng = random.Random(seed)
+        self.reads = 0
+        self.rows = {}
+        for pid in range(1, size + 1):
+            self.rows[pid] = {
+                "name": f"proc-{pid}",
+                "create_time": float(pid),
+                "user": 0.0,
+                "system": 0.0,
+                "cpu_rate": rng.random() * rng.choice([0.01, 0.1, 1.0]),
+                "rss": rng.randint(1, 512) * 1024 ** 2,
+                "io": 0,
+                "io_rate": rng.randint(0, 4096),
+            }
+
+    def advance(self, seconds):
+        for row in self.rows.values():
+            row["user"] += row["cpu_rate"] * seconds
+            row["io"] += int(row["io_rate"] * seconds)
+
+    def pids(self):
+        return list(self.rows)
+
+    def stat(self, pid):
+        self.reads += 1  # /proc/<pid>/stat
+        row = self.rows[pid]
+        return row["create_time"], row["user"] + row["system"]
+
+    def process(self, pid):
+        return FakeProcess(self, pid)
+
+
+class FakeProcess:
+    def __init__(self, table, pid):
+        self.table = table
+        self.pid = pid
+        self.row = table.rows[pid]
+
+    def name(self):
+        self.table.reads += 1  # /proc/<pid>/stat
+        return self.row["name"]
+
+    def cpu_percent(self):
+        self.table.reads += 1  # /proc/<pid>/stat
+        # A fresh handle has no previous reading, the same 0.0 psutil returns
+        return 0.0
+
+    def memory_percent(self):
+        self.table.reads += 2  # /proc/<pid>/statm and /proc/meminfo
+        return self.row["rss"] / TOTAL_MEMORY * 100
+
+    def memory_info(self):
+        self.table.reads += 1  # /proc/<pid>/statm
+        return MemoryInfo(self.row["rss"], self.row["rss"] * 2)
+
+    def io_counters(self):
+        self.table.reads += 1  # /proc/<pid>/io
+        return IOCounters(self.row["io"], 0)
+
+
+def legacy_collect(table):
+    """The pre-collector get_process_info() loop, run against the fake table."""
+    processes = []
+    for pid in table.pids():
+        proc = table.process(pid)
+        io_counters = proc.io_counters()
+        disk_usage = (io_counters.read_bytes + io_counters.write_bytes) / proc.memory_info().vms * 100 if proc.memory_info().vms > 0 else 0
+        processes.append({
+            "pid": int(pid),
+            "name": str(proc.name()),
+            "cpu_percent": float(proc.cpu_percent() or 0.0),
+            "memory_percent": float(proc.memory_percent() or 0.0),
+            "disk_usage": float(disk_usage)
+        })
+    return sorted(processes, key=lambda x: x['cpu_percent'], reverse=True)[:10]
+
+
+def legacy_collect_live():
+    """The pre-collector get_process_info() loop, verbatim, on the real host."""
+    processes = []
+    for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
+        try:
+            info = proc.info
+            try:
+                io_counters = proc.io_counters()
+                disk_usage = (io_counters.read_bytes + io_counters.write_bytes) / proc.memory_info().vms * 100 if proc.memory_info().vms > 0 else 0
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                disk_usage = 0
+            processes.append({
+                "pid": int(info['pid']),
+                "name": str(info['name']),
+                "cpu_percent": float(info['cpu_percent'] or 0.0),
+                "memory_percent": float(info['memory_percent'] or 0.0),
+                "disk_usage": float(disk_usage)
+            })
+        except (psutil.NoSuchProcess, psutil.AccessDenied, ValueError):
+            continue
+    return sorted(processes, key=lambda x: x['cpu_percent'], reverse=True)[:10]
+
+
+def run(label, collect, cycles, advance=None, table=None):
+    timings = []
+    reads = 0
+    result = None
+    for _ in range(cycles):
+        if advance:
+            advance()
+        before = table.reads if table else 0
+        start = time.perf_counter()
+        result = collect()
+        timings.append(time.perf_counter() - start)
+        reads += (table.reads - before) if table else 0
+    timings.sort()
+    mean = sum(timings) / len(timings)
+    line = (f"{label:<12} mean {mean * 1000:8.2f} ms   p50 {timings[len(timings) // 2] * 1000:8.2f} ms   "
+            f"max {timings[-1] * 1000:8.2f} ms   top cpu {result[0]['cpu_percent'] if result else 0:6.2f}%")
+    if table:
+        line += f"   reads/cycle {reads // cycles}"
+    print(line)
+    return mean
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the process-table collector")
+    parser.add_argument('--processes', type=int, default=10000)
+    parser.add_argument('--cycles', type=int, default=20)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--live', action='store_true',
+                        help="also compare both collectors against this host's real process table")
+    args = parser.parse_args()
+
+    step = 10.0
+    clock_time = [0.0]
+
+    def clock():
+        return clock_time[0]
+
+    table = FakeProcessTable(args.processes)
+    collector = ProcessCollector(
+        top_n=args.top,
+        pids=table.pids,
+        stat=table.stat,
+        process_factory=table.process,
+        total_memory=TOTAL_MEMORY,
+        clock=clock
+    )
+
+    def advance():
+        clock_time[0] += step
+        table.advance(step)
+
+    print(f"Synthetic table: {args.processes} processes, {args.cycles} cycles")
+    legacy = run("legacy", lambda: legacy_collect(table), args.cycles, advance, table)
+    current = run("incremental", collector.collect, args.cycles, advance, table)
+    print(f"speedup      {legacy / current:.2f}x")
+
+    if args.live:
+        live = ProcessCollector(top_n=args.top)
+        live.collect()
+        print(f"Live table: {len(live)} processes, {args.cycles} cycles")
+        legacy = run("legacy", legacy_collect_live, args.cycles)
+        current = run("incremental", live.collect, args.cycles)
+        print(f"speedup      {legacy / current:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import gzip
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AGENT_DIR)
+
+from wire import JsonEncoder, CompactEncoder
+
+NODE_BENCH = os.path.join(os.path.dirname(AGENT_DIR), 'backend', 'scripts', 'bench-wire.js')
+
+
+def synthetic_samples(count, interval=1.0, process_every=10, seed=7):
+    """Samples shaped like SystemMonitor.collect_metrics() output."""
+    rng = random.Random(seed)
+    names = [f"worker-{i}" for i in range(30)] + ['systemd', 'sshd', 'nginx', 'mysqld', 'python3', 'node']
+    start = datetime(2024, 11, 13, 23, 0, 0).astimezone()
+    cpu = 20.0
+    bytes_sent, bytes_recv = 6012765575, 5067289543
+    used = 430313472
+
+    samples = []
+    for i in range(count):
+        cpu = min(max(cpu + rng.uniform(-5, 5), 0.0), 100.0)
+        sent_rate, recv_rate = rng.uniform(1e3, 1e6), rng.uniform(1e3, 1e6)
+        bytes_sent += int(sent_rate * interval)
+        bytes_recv += int(recv_rate * interval)
+        used += rng.randint(-1 << 20, 1 << 20)
+        sample = {
+            "server_id": "6f1c2a9e-2b5d-4c1e-9a7f-3d2e1b0c4a5f",
+            "timestamp": (start + timedelta(seconds=i * interval)).isoformat(),
+            "interval": interval,
+            "missed_ticks": 0,
+            "cpu": {"cpu_percent": round(cpu, 2)},
+            "memory": {"percent": round(used / 8327163904 * 100, 1), "total": 8327163904, "used": used},
+            "disk": {"percent": 9.5, "total": 165409308672, "used": 15724838912},
+            "disk_io": {"read_bytes_per_sec": 0.0 if rng.random() < 0.7 else rng.uniform(0, 5e6),
+                        "write_bytes_per_sec": rng.uniform(0, 2e5)},
+            "network": {"bytes_sent": bytes_sent, "bytes_recv": bytes_recv,
+                        "bytes_sent_per_sec": sent_rate, "bytes_recv_per_sec": recv_rate},
+        }
+        if i % process_every == 0:
+            sample["processes"] = [{
+                "pid": 1000 + names.index(name),
+                "name": name,
+                "cpu_percent": round(rng.uniform(0, 50), 2),
+                "memory_percent": round(rng.uniform(0, 5), 2),
+                "io_bytes_per_sec": round(rng.uniform(0, 1e5), 2),
+                "disk_usage": round(rng.uniform(0, 0.1), 4),
+            } for name in rng.sample(names, 10)]
+        samples.append(sample)
+    return samples
+
+
+def encode_all(encoder, batches, server_id):
+    bodies = []
+    raw = compressed = 0
+    start = time.process_time()
+    for records in batches:
+        body = encoder.encode(server_id, records)
+        compressed += len(gzip.compress(body, compresslevel=6))
+        raw += len(body)
+        encoder.ack()
+        bodies.append(body)
+    return bodies, raw, compressed, time.process_time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the JSON and compact metric wire formats")
+    parser.add_argument('--samples', type=int, default=3600)
+    parser.add_argument('--batch', type=int, default=60)
+    parser.add_argument('--keyframe-interval', type=int, default=60)
+    parser.add_argument('--node', action='store_true', help="also time decoding in Node (backend/wire.js)")
+    args = parser.parse_args()
+
+    samples = synthetic_samples(args.samples)
+    server_id = samples[0]["server_id"]
+    records = [(i, json.dumps(s, separators=(',', ':')).encode()) for i, s in enumerate(samples)]
+    batches = [records[i:i + args.batch] for i in range(0, len(records), args.batch)]
+
+    results = {}
+    print(f"{args.samples} samples in {len(batches)} batches of {args.batch}")
+    for label, encoder in (("json", JsonEncoder()), ("compact", CompactEncoder(args.keyframe_interval))):
+        bodies, raw, compressed, cpu = encode_all(encoder, batches, server_id)
+        results[label] = bodies
+        print(f"{label:<8} raw {raw / len(samples):8.1f} B/sample   gzip {compressed / len(samples):7.1f} B/sample   "
+              f"encode+gzip-size {cpu / len(samples) * 1e6:7.1f} us/sample")
+
+    if args.node:
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = []
+            for label in ("json", "compact"):
+                path = os.path.join(tmp, f"{label}.jsonl")
+                with open(path, 'wb') as f:
+                    f.write(b'\n'.join(results[label]))
+                paths.append(path)
+            subprocess.run(['node', NODE_BENCH] + paths, check=True)
+
+
+if __name__ == "__main__":
+    main()
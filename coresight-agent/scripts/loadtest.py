@@ -0,0 +1,523 @@
+import argparse
+import contextlib
+import glob
+import gzip
+import json
+import multiprocessing
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AGENT_DIR)
+
+from alerts import AlertEngine, load_rules
+from collectors import Collector, CollectorRegistry, parse_intervals
+from rollup import RollupAggregator
+from sampling import FixedRateScheduler
+from spool import DiskSpool
+from uploader import BatchUploader
+from version import VERSION
+from wire import get_encoder
+
+# Results are specific to the machine they ran on, the file is kept out of git
+RESULTS_FILE = os.path.join(AGENT_DIR, 'benchmarks', 'loadtest.jsonl')
+
+# Numbers compared against the previous run with the same configuration, and
+# whether higher is better for each. A record is what gets spooled and sent:
+# one raw sample, or with --rollups one window summary covering many of them.
+TRACKED = (
+    ('records_per_sec', True),
+    ('ingest_p50_ms', False),
+    ('ingest_p99_ms', False),
+    ('agent_cpu_us_per_sample', False),
+    ('wire_bytes_per_record', False),
+)
+REGRESSION_THRESHOLD = 0.10
+
+
+# --- Replay source -----------------------------------------------------------
+
+def _parse_timestamp(value):
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def load_recorded(paths):
+    """Samples logged by agents as "Collected metrics: {...}", oldest first.
+
+    Older agents logged a different shape (cumulative network counters,
+    psutil's full memory/disk dicts); each payload is reshaped into what
+    collect_metrics() produces today, with rates taken between neighbours.
+    """
+    decoder = json.JSONDecoder()
+    payloads = []
+    for path in paths:
+        with open(path, errors='replace') as f:
+            text = f.read()
+        for match in re.finditer(r'Collected metrics: ', text):
+            try:
+                payload, _ = decoder.raw_decode(text, match.end())
+            except ValueError:
+                continue
+            if isinstance(payload, dict) and 'cpu' in payload:
+                payloads.append(payload)
+
+    frames = []
+    for previous, payload in zip([None] + payloads, payloads):
+        cpu_percent = payload['cpu'].get('cpu_percent', 0.0)
+        network = payload.get('network', {})
+        sent_rate = network.get('bytes_sent_per_sec')
+        recv_rate = network.get('bytes_recv_per_sec')
+        if sent_rate is None:
+            sent_rate = recv_rate = 0.0
+            if previous is not None:
+                elapsed = ((_parse_timestamp(payload.get('timestamp')) or 0)
+                           - (_parse_timestamp(previous.get('timestamp')) or 0))
+                before = previous.get('network', {})
+                if 0 < elapsed < 300:
+                    sent_rate = max(network.get('bytes_sent', 0) - before.get('bytes_sent', 0), 0) / elapsed
+                    recv_rate = max(network.get('bytes_recv', 0) - before.get('bytes_recv', 0), 0) / elapsed
+        disk = payload.get('disk', {})
+        disk = {"percent": disk.get('percent', 0.0), "total": disk.get('total', 0), "used": disk.get('used', 0)}
+        memory = payload.get('memory', {})
+
+        frames.append({
+            "cpu": {
+                "cpu_percent": cpu_percent,
+                "per_core": payload['cpu'].get('per_core') or {
+                    f"cpu{core}": cpu_percent for core in range(payload['cpu'].get('cpu_count', 1))},
+            },
+            "memory": {"percent": memory.get('percent', 0.0), "total": memory.get('total', 0),
+                       "used": memory.get('used', 0)},
+            "network": {
+                "bytes_sent": network.get('bytes_sent', 0),
+                "bytes_recv": network.get('bytes_recv', 0),
+                "bytes_sent_per_sec": sent_rate,
+                "bytes_recv_per_sec": recv_rate,
+                "interfaces": network.get('interfaces') or {
+                    "eth0": {"bytes_sent_per_sec": sent_rate, "bytes_recv_per_sec": recv_rate}},
+            },
+            "disk_io": payload.get('disk_io') or {
+                "read_bytes_per_sec": 0.0, "write_bytes_per_sec": 0.0,
+                "devices": {"vda": {"read_bytes_per_sec": 0.0, "write_bytes_per_sec": 0.0}}},
+            "disk": dict(disk, mounts={"/": dict(disk, device="/dev/vda1", fstype="ext4")}),
+            "processes": [dict({"io_bytes_per_sec": 0.0, "disk_usage": 0.0}, **process)
+                          for process in payload.get('processes', [])[:10]],
+        })
+    return frames
+
+
+def synthetic_frames(count, seed):
+    from bench_wire import synthetic_samples
+    frames = []
+    for sample in synthetic_samples(count, seed=seed, process_every=1):
+        frames.append({key: sample[key] for key in ('cpu', 'memory', 'network', 'disk_io', 'disk', 'processes')})
+    return frames
+
+
+class ReplayCollector(Collector):
+    """Serves one key of the current replayed frame, in place of a real collector."""
+
+    def __init__(self, frames, position, name, interval=None, cost='low', sticky=True):
+        self.frames = frames
+        self.position = position
+        self.name = name
+        self.interval = interval
+        self.cost = cost
+        self.sticky = sticky
+
+    def collect(self):
+        return self.frames[self.position[0]][self.name]
+
+
+def replay_collectors(frames, position):
+    # Same names, default intervals and costs as the real collectors
+    return [
+        ReplayCollector(frames, position, 'cpu'),
+        ReplayCollector(frames, position, 'memory'),
+        ReplayCollector(frames, position, 'network'),
+        ReplayCollector(frames, position, 'disk_io'),
+        ReplayCollector(frames, position, 'disk', interval=30.0, cost='medium'),
+        ReplayCollector(frames, position, 'processes', interval=10.0, cost='high', sticky=False),
+    ]
+
+
+# --- Simulated agents --------------------------------------------------------
+
+class LatencyRecorder:
+    """Stands in for Telemetry in the uploaders, keeping every timing."""
+
+    def __init__(self):
+        self.records = []
+
+    @contextlib.contextmanager
+    def timer(self, stage):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            end = time.monotonic()
+            self.records.append((stage, end, end - start))
+
+
+class SimulatedAgent:
+    """The SystemMonitor pipeline (collectors, alerts, rollups, spool, uploader)
+    fed from a replayed trace instead of the host."""
+
+    def __init__(self, server_id, frames, offset, options, spool_dir, recorder):
+        self.server_id = server_id
+        self.interval = options['interval']
+        self.batch_size = options['batch_size']
+        self.position = [offset % len(frames)]
+        self.frames = frames
+        self.missed_ticks = 0
+
+        intervals = parse_intervals(options['collector_intervals'])
+        self.collectors = CollectorRegistry(self.interval)
+        for collector in replay_collectors(frames, self.position):
+            self.collectors.register(collector, intervals.get(collector.name))
+        self.alert_engine = AlertEngine(server_id, load_rules(None))
+        windows = [w for w in options['rollups'].split(',') if w.strip()]
+        self.rollups = RollupAggregator(server_id, windows) if windows else None
+
+        self.spool = DiskSpool(os.path.join(spool_dir, f"{server_id}.spool"),
+                               int(options['spool_mb'] * 1024 * 1024))
+        self.uploader = BatchUploader(
+            self.spool,
+            f"{options['url']}/api/metrics/batch",
+            server_id,
+            batch_size=self.batch_size,
+            flush_interval=options['upload_interval'],
+            encoder=get_encoder(options['wire']),
+            label='metrics',
+            telemetry=recorder
+        )
+        self.collected = 0
+        self.spooled = 0
+
+    def tick(self, missed):
+        self.position[0] = (self.position[0] + 1) % len(self.frames)
+        self.missed_ticks += missed
+        metrics = {
+            "server_id": self.server_id,
+            "timestamp": datetime.now().astimezone().isoformat(),
+            "interval": self.interval,
+            "missed_ticks": self.missed_ticks,
+        }
+        metrics.update(self.collectors.collect(behind=missed > 0))
+        # Alert events are not shipped, the benchmark only loads metric ingest
+        self.alert_engine.evaluate(metrics)
+        records = self.rollups.add(metrics) if self.rollups else [metrics]
+        for record in records:
+            self.spool.append(json.dumps(record, separators=(',', ':')).encode())
+        self.spooled += len(records)
+        if len(self.spool) >= self.batch_size:
+            self.uploader.notify()
+        self.collected += 1
+
+
+def _totals(agents):
+    return {
+        "cpu": time.process_time(),
+        "collected": sum(agent.collected for agent in agents),
+        "spooled": sum(agent.spooled for agent in agents),
+        "sent": sum(agent.uploader.sent_samples for agent in agents),
+        "bytes": sum(agent.uploader.sent_bytes for agent in agents),
+        "backlog": sum(len(agent.spool) for agent in agents),
+        "dropped": sum(agent.spool.dropped for agent in agents),
+    }
+
+
+def run_worker(job):
+    """Run a share of the fleet for warmup + duration seconds; return raw counts."""
+    server_ids, frames, options = job
+    recorder = LatencyRecorder()
+    rng = random.Random(options['seed'] + len(server_ids))
+
+    with tempfile.TemporaryDirectory(prefix='coresight-loadtest-') as spool_dir:
+        agents = [SimulatedAgent(server_id, frames, rng.randrange(len(frames)), options, spool_dir, recorder)
+                  for server_id in server_ids]
+        for agent in agents:
+            agent.uploader.start()
+
+        # One loop serves every agent in this worker, staggered evenly over the interval
+        scheduler = FixedRateScheduler(options['interval'] / len(agents))
+        start = time.monotonic()
+        warm, end = start + options['warmup'], start + options['warmup'] + options['duration']
+        before = None
+        turn = 0
+        while True:
+            missed = scheduler.wait()
+            now = time.monotonic()
+            if now >= end:
+                break
+            if before is None and now >= warm:
+                before = _totals(agents)
+            turn += missed
+            agents[turn % len(agents)].tick(missed)
+            turn += 1
+        after = _totals(agents)
+
+        for agent in agents:
+            agent.uploader.stop(0)
+        for agent in agents:
+            agent.uploader.join(5)
+            agent.spool.close()
+
+    latencies = [seconds for stage, finished, seconds in recorder.records
+                 if stage == 'upload.metrics' and warm <= finished <= end]
+    return {
+        "delta": {key: after[key] - before[key] for key in after},
+        "backlog": after["backlog"],
+        "missed_ticks": scheduler.missed_ticks,
+        "latencies": latencies,
+    }
+
+
+# --- Stand-in ingest endpoint ------------------------------------------------
+
+class _IngestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        json.loads(body)
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        response = b'{"success":true}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+
+class _StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 resets connections when a whole fleet flushes at once
+    request_queue_size = 1024
+
+
+def _serve_stand_in(port, delay, ready):
+    server = _StandInServer(('127.0.0.1', port), _IngestHandler)
+    server.delay = delay
+    ready.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_stand_in(delay_ms):
+    """Accepts batches like /api/metrics/batch (inflate + parse), without a database."""
+    ready = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve_stand_in, args=(0, delay_ms / 1000, ready), daemon=True)
+    process.start()
+    return process, f"http://127.0.0.1:{ready.get(timeout=10)}"
+
+
+# --- Reporting ---------------------------------------------------------------
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def summarize(results, options):
+    delta = {key: sum(r["delta"][key] for r in results) for key in results[0]["delta"]}
+    latencies = [seconds for r in results for seconds in r["latencies"]]
+    duration = options['duration']
+    p50, p99 = _percentile(latencies, 0.5), _percentile(latencies, 0.99)
+    return {
+        "records_per_sec": round(delta["sent"] / duration, 1),
+        "spooled_per_sec": round(delta["spooled"] / duration, 1),
+        "collected_per_sec": round(delta["collected"] / duration, 1),
+        "backlog_growth_per_sec": round(delta["backlog"] / duration, 1),
+        "dropped": delta["dropped"],
+        "missed_ticks": sum(r["missed_ticks"] for r in results),
+        "ingest_requests": len(latencies),
+        "ingest_p50_ms": round(p50 * 1000, 2) if p50 is not None else None,
+        "ingest_p99_ms": round(p99 * 1000, 2) if p99 is not None else None,
+        "agent_cpu_us_per_sample": round(delta["cpu"] / max(delta["collected"], 1) * 1e6, 1),
+        "wire_bytes_per_record": round(delta["bytes"] / max(delta["sent"], 1), 1),
+    }
+
+
+def config_key(options):
+    return {key: options[key] for key in ('agents', 'processes', 'interval', 'batch_size', 'upload_interval',
+                                          'wire', 'rollups', 'collector_intervals', 'target', 'source')}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=AGENT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_result(path, key, host):
+    """The latest stored run with the same configuration on the same host."""
+    if not os.path.exists(path):
+        return None
+    previous = None
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                if record.get("config") == key and record.get("host") == host:
+                    previous = record
+    return previous
+
+
+def compare(result, previous):
+    """Print the change against ``previous``; return the names of regressed numbers."""
+    regressions = []
+    print(f"\nagainst {previous.get('version')} ({previous.get('commit')}, {previous.get('recorded_at')}):")
+    for name, higher_is_better in TRACKED:
+        old, new = previous["results"].get(name), result.get(name)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = change < -REGRESSION_THRESHOLD if higher_is_better else change > REGRESSION_THRESHOLD
+        if worse:
+            regressions.append(name)
+        print(f"  {name:<26} {old:>10} -> {new:<10} {change:+7.1%}{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate a fleet of agents against the ingest pipeline")
+    parser.add_argument('--agents', type=int, default=100)
+    parser.add_argument('--processes', type=int, default=1, help="worker processes the fleet is split across")
+    parser.add_argument('--interval', type=float, default=1.0, help="SAMPLE_INTERVAL of every simulated agent")
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--upload-interval', type=float, default=5.0)
+    parser.add_argument('--wire', choices=('json', 'compact'), default='json')
+    parser.add_argument('--rollups', default='', help="ROLLUP_WINDOWS, e.g. 10,60")
+    parser.add_argument('--collector-intervals', default='disk=30,processes=10')
+    parser.add_argument('--duration', type=float, default=30.0, help="measured seconds")
+    parser.add_argument('--warmup', type=float, default=10.0)
+    parser.add_argument('--spool-mb', type=float, default=1.0)
+    parser.add_argument('--url', help="backend base URL, e.g. http://localhost:3000; "
+                                      "without it a stand-in ingest endpoint is started")
+    parser.add_argument('--stand-in-delay-ms', type=float, default=0.0,
+                        help="time the stand-in spends per batch, to mimic database writes")
+    parser.add_argument('--server-ids', help="file with one registered server id per line (needed with --url)")
+    parser.add_argument('--logs', nargs='*', help="agent.log files to replay (default: the agent's own logs)")
+    parser.add_argument('--synthetic', action='store_true', help="replay synthetic samples instead of logs")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--results', default=RESULTS_FILE)
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        frames, source = synthetic_frames(3600, args.seed), 'synthetic'
+    else:
+        logs = args.logs or sorted(glob.glob(os.path.join(AGENT_DIR, 'agent.log*')),
+                                   key=lambda p: -int(p.rsplit('.', 1)[1]) if p[-1].isdigit() else 0)
+        frames, source = load_recorded(logs), 'agent.log'
+        if not frames:
+            sys.exit("No recorded payloads found, pass --logs or --synthetic")
+
+    if args.server_ids:
+        with open(args.server_ids) as f:
+            registered = [line.strip() for line in f if line.strip()]
+        server_ids = [registered[i % len(registered)] for i in range(args.agents)]
+    else:
+        server_ids = [str(uuid.uuid5(uuid.NAMESPACE_URL, f"coresight-loadtest-{i}")) for i in range(args.agents)]
+
+    stand_in = None
+    url = args.url
+    if not url:
+        stand_in, url = start_stand_in(args.stand_in_delay_ms)
+
+    options = {
+        'agents': args.agents,
+        'processes': args.processes,
+        'interval': args.interval,
+        'batch_size': args.batch_size,
+        'upload_interval': args.upload_interval,
+        'wire': args.wire,
+        'rollups': args.rollups,
+        'collector_intervals': args.collector_intervals,
+        'target': 'backend' if args.url else f"stand-in+{args.stand_in_delay_ms:g}ms",
+        'source': source,
+        'url': url.rstrip('/'),
+        'duration': args.duration,
+        'warmup': args.warmup,
+        'spool_mb': args.spool_mb,
+        'seed': args.seed,
+    }
+
+    print(f"{args.agents} agents every {args.interval:g}s across {args.processes} process(es), "
+          f"{len(frames)} {source} frames, {options['wire']} wire format -> {options['target']}")
+    jobs = [(server_ids[i::args.processes], frames, options) for i in range(args.processes)]
+    jobs = [job for job in jobs if job[0]]
+    try:
+        if len(jobs) == 1:
+            results = [run_worker(jobs[0])]
+        else:
+            with multiprocessing.Pool(len(jobs)) as pool:
+                results = pool.map(run_worker, jobs)
+    finally:
+        if stand_in is not None:
+            stand_in.terminate()
+
+    result = summarize(results, options)
+    print(f"sustained    {result['records_per_sec']:>10} records/s acknowledged "
+          f"({result['spooled_per_sec']} spooled/s, backlog {result['backlog_growth_per_sec']:+}/s, "
+          f"{result['dropped']} dropped)")
+    print(f"collected    {result['collected_per_sec']:>10} samples/s ({result['missed_ticks']} missed ticks)")
+    print(f"ingest       p50 {result['ingest_p50_ms']} ms   p99 {result['ingest_p99_ms']} ms   "
+          f"({result['ingest_requests']} requests)")
+    print(f"agent cpu    {result['agent_cpu_us_per_sample']:>10} us/sample")
+    print(f"payload      {result['wire_bytes_per_record']:>10} B/record on the wire")
+    # Records spooled within the last UPLOAD_INTERVAL are only waiting for
+    # their flush, so the backlog may grow by that much without ingest lagging
+    growth = result['backlog_growth_per_sec'] * args.duration
+    flush_window = result['spooled_per_sec'] * args.upload_interval
+    if growth > max(flush_window, 0.05 * result['spooled_per_sec'] * args.duration):
+        print("ingest is falling behind: the backlog grew by more than one flush window during the run")
+    elif args.duration < 3 * args.upload_interval:
+        print(f"run shorter than 3 upload intervals ({3 * args.upload_interval:g}s), "
+              "too short to tell whether ingest keeps up")
+
+    key = config_key(options)
+    host = os.uname().nodename
+    previous = previous_result(args.results, key, host)
+    regressions = compare(result, previous) if previous else []
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(args.results), exist_ok=True)
+        with open(args.results, 'a') as f:
+            f.write(json.dumps({
+                "recorded_at": datetime.now().astimezone().isoformat(timespec='seconds'),
+                "version": VERSION,
+                "commit": git_commit(),
+                "host": host,
+                "config": key,
+                "results": result,
+            }) + '\n')
+        print(f"\nresult appended to {args.results}")
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import mmap
+import os
+import struct
+import threading
+import logging
+
+logger = logging.getLogger('CoreSightAgent')
+
+MAGIC = b'CSPL'
+VERSION = 1
+# magic, version, capacity, head, tail, count, next_seq, dropped, spool_id.
+# spool_id took over padding, files written before it read 0 there.
+HEADER = struct.Struct('<4sIQQQQQQQ')
+HEADER_SIZE = 64
+# payload length, sequence number
+RECORD = struct.Struct('<IQ')
+WRAP = 0xFFFFFFFF
+
+
+class DiskSpool:
+    """Bounded FIFO of byte records in a memory-mapped ring file.
+
+    Records survive agent restarts because they live in the mapped file, not
+    in process memory. When the ring is full the oldest records are dropped
+    (and counted) so collection never blocks on a slow or absent backend.
+
+    Readers ``peek()`` a batch and ``commit()`` it by sequence number once it
+    has been delivered, which gives at-least-once delivery across restarts.
+    Sequence numbers are consecutive, and together with ``id``, random per
+    spool file, they let the receiver drop a batch it has already stored.
+    """
+
+    def __init__(self, path, capacity):
+        if capacity < RECORD.size * 2:
+            raise ValueError("Spool capacity is too small")
+        self.path = path
+        self.lock = threading.Lock()
+
+        size = HEADER_SIZE + capacity
+        exists = os.path.exists(path) and os.path.getsize(path) == size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if not exists:
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        self.capacity = capacity
+        self._load(exists)
+
+    def _load(self, exists):
+        if exists:
+            magic, version, capacity, head, tail, count, next_seq, dropped, spool_id = \
+                HEADER.unpack_from(self._map, 0)
+            if magic == MAGIC and version == VERSION and capacity == self.capacity:
+                self.head, self.tail, self.count = head, tail, count
+                self.next_seq, self.dropped = next_seq, dropped
+                self._spool_id = spool_id or self._new_id()
+                self._save()
+                if count:
+                    logger.info(f"Recovered {count} spooled sample(s) from {self.path}")
+                return
+            logger.warning(f"Spool file {self.path} has an incompatible layout, starting empty")
+
+        self.head = self.tail = self.count = 0
+        self.next_seq = 1
+        self.dropped = 0
+        # Sequence numbers start over, so the receiver must see a new spool
+        self._spool_id = self._new_id()
+        self._save()
+
+    @staticmethod
+    def _new_id():
+        return int.from_bytes(os.urandom(8), 'little') or 1
+
+    @property
+    def id(self):
+        return f"{self._spool_id:016x}"
+
+    def _save(self):
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, self.capacity, self.head, self.tail,
+                         self.count, self.next_seq, self.dropped, self._spool_id)
+
+    def _record_at(self, offset):
+        """Return (offset, length, seq) of the record at or wrapped from ``offset``."""
+        if self.capacity - offset < RECORD.size:
+            offset = 0
+        length, seq = RECORD.unpack_from(self._map, HEADER_SIZE + offset)
+        if length == WRAP:
+            offset = 0
+            length, seq = RECORD.unpack_from(self._map, HEADER_SIZE + offset)
+        return offset, length, seq
+
+    def _pop(self):
+        offset, length, _ = self._record_at(self.head)
+        self.head = offset + RECORD.size + length
+        self.count -= 1
+        if self.count == 0:
+            self.head = self.tail = 0
+
+    def _reserve(self, need):
+        """Find room for ``need`` bytes, dropping the oldest records if required."""
+        while True:
+            if self.count == 0:
+                self.head = self.tail = 0
+                return 0
+            if self.tail > self.head:
+                if self.capacity - self.tail >= need:
+                    return self.tail
+                if self.head >= need:
+                    if self.capacity - self.tail >= RECORD.size:
+                        RECORD.pack_into(self._map, HEADER_SIZE + self.tail, WRAP, 0)
+                    return 0
+            elif self.head - self.tail >= need:
+                return self.tail
+            self._pop()
+            self.dropped += 1
+
+    def append(self, payload):
+        need = RECORD.size + len(payload)
+        if need > self.capacity:
+            logger.error(f"Dropping {len(payload)} byte sample, larger than the spool")
+            with self.lock:
+                self.dropped += 1
+                self._save()
+            return False
+
+        with self.lock:
+            offset = self._reserve(need)
+            RECORD.pack_into(self._map, HEADER_SIZE + offset, len(payload), self.next_seq)
+            start = HEADER_SIZE + offset + RECORD.size
+            self._map[start:start + len(payload)] = payload
+            self.tail = offset + need
+            self.count += 1
+            self.next_seq += 1
+            self._save()
+        return True
+
+    def peek(self, max_records, max_bytes=None):
+        """Return up to ``max_records`` of the oldest records as (seq, payload) pairs."""
+        records = []
+        total = 0
+        with self.lock:
+            offset = self.head
+            for _ in range(min(max_records, self.count)):
+                offset, length, seq = self._record_at(offset)
+                if max_bytes is not None and records and total + length > max_bytes:
+                    break
+                start = HEADER_SIZE + offset + RECORD.size
+                records.append((seq, bytes(self._map[start:start + length])))
+                total += length
+                offset += RECORD.size + length
+        return records
+
+    def commit(self, seq):
+        """Release every record up to and including sequence number ``seq``."""
+        with self.lock:
+            while self.count:
+                _, _, head_seq = self._record_at(self.head)
+                if head_seq > seq:
+                    break
+                self._pop()
+            self._save()
+
+    def __len__(self):
+        return self.count
+
+    def flush(self):
+        with self.lock:
+            self._map.flush()
+
+    def close(self):
+        with self.lock:
+            self._map.flush()
+            self._map.close()
@@ -0,0 +1,185 @@
+import json
+import os
+import time
+import uuid
+import threading
+import logging
+from contextlib import contextmanager
+
+import psutil
+
+from rollup import QuantileSketch, QUANTILES
+
+logger = logging.getLogger('CoreSightAgent')
+
+
+class _StageStats:
+    __slots__ = ('count', 'total', 'max', 'sketch')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.sketch = QuantileSketch()
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.sketch.add(seconds)
+
+    def summary(self):
+        p50, p95, p99 = (min(q, self.max) for q in self.sketch.quantiles(QUANTILES))
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+            "p50_ms": round(p50 * 1000, 3),
+            "p95_ms": round(p95 * 1000, 3),
+            "p99_ms": round(p99 * 1000, 3),
+        }
+
+
+class Telemetry:
+    """The agent's measurements of itself.
+
+    Stage timings (each collector, encoding, uploads) go into quantile
+    sketches; gauges are callables read when the report is built, so counters
+    such as spool depth or dropped samples are never copied around. The agent's
+    own RSS and CPU are sampled every ``resource_interval`` seconds and checked
+    against the optional budgets.
+
+    ``publish()`` is called once per sampling tick with the serialized sample.
+    Both the snapshot and the report are cached per tick and carry an ETag
+    derived from the tick, so readers polling the endpoint cost a dictionary
+    lookup and never trigger collection.
+    """
+
+    def __init__(self, cpu_budget=None, rss_budget_mb=None, resource_interval=10.0,
+                 process=None, clock=time.monotonic):
+        self.cpu_budget = cpu_budget
+        self.rss_budget = int(rss_budget_mb * 1024 * 1024) if rss_budget_mb else None
+        self.resource_interval = resource_interval
+        self.process = process or psutil.Process(os.getpid())
+        self.clock = clock
+
+        self.started = clock()
+        self.boot_id = uuid.uuid4().hex[:8]
+        self.generation = 0
+        self.budget_violations = 0
+        self.resources = {}
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._gauges = {}
+        self._latest = None
+        self._report = None
+        self._report_generation = None
+        self._cpu_time = None
+        self._cpu_stamp = None
+        self._next_resources = clock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = self._stages[stage] = _StageStats()
+            stats.add(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def gauge(self, name, read):
+        self._gauges[name] = read
+
+    def etag(self):
+        return f"{self.boot_id}-{self.generation}"
+
+    def _sample_resources(self, now):
+        cpu = self.process.cpu_times()
+        cpu_time = cpu.user + cpu.system
+        rss = self.process.memory_info().rss
+        cpu_percent = None
+        if self._cpu_time is not None and now > self._cpu_stamp:
+            cpu_percent = round((cpu_time - self._cpu_time) / (now - self._cpu_stamp) * 100, 2)
+        self._cpu_time, self._cpu_stamp = cpu_time, now
+
+        previous = self.resources
+        self.resources = {
+            "rss_bytes": rss,
+            "peak_rss_bytes": max(rss, previous.get("peak_rss_bytes", 0)),
+            "cpu_percent": cpu_percent,
+            "max_cpu_percent": max(cpu_percent or 0.0, previous.get("max_cpu_percent", 0.0)),
+            "threads": self.process.num_threads(),
+        }
+
+        over = []
+        if self.cpu_budget is not None and cpu_percent is not None and cpu_percent > self.cpu_budget:
+            over.append(f"CPU {cpu_percent:.1f}% > {self.cpu_budget:g}%")
+        if self.rss_budget is not None and rss > self.rss_budget:
+            over.append(f"RSS {rss / 1048576:.1f} MB > {self.rss_budget / 1048576:g} MB")
+        if over:
+            self.budget_violations += 1
+            logger.warning(f"Agent over its resource budget: {', '.join(over)}")
+
+    def publish(self, payload):
+        """Cache the serialized latest sample and advance the tick."""
+        now = self.clock()
+        if now >= self._next_resources:
+            self._next_resources = now + self.resource_interval
+            try:
+                self._sample_resources(now)
+            except psutil.Error as e:
+                logger.error(f"Error reading agent resource usage: {e}")
+        with self._lock:
+            self._latest = payload
+            self.generation += 1
+
+    def latest(self):
+        """Return (body, etag) for the latest sample, body None before the first tick."""
+        with self._lock:
+            if self._latest is None:
+                return None, self.etag()
+            return b'{"success":true,"metrics":' + self._latest + b'}', self.etag()
+
+    def _read_gauges(self):
+        gauges = {}
+        for name, read in self._gauges.items():
+            try:
+                gauges[name] = read()
+            except Exception as e:
+                gauges[name] = None
+                logger.debug(f"Error reading gauge {name}: {e}")
+        return gauges
+
+    def report(self):
+        """Return (body, etag) for the telemetry report, rebuilt at most once per tick."""
+        with self._lock:
+            if self._report_generation == self.generation:
+                return self._report, self.etag()
+            stages = {name: stats.summary() for name, stats in sorted(self._stages.items())}
+            generation = self.generation
+
+        within_budget = ((self.cpu_budget is None or (self.resources.get("max_cpu_percent") or 0.0) <= self.cpu_budget)
+                         and (self.rss_budget is None or self.resources.get("peak_rss_bytes", 0) <= self.rss_budget))
+        body = json.dumps({
+            "success": True,
+            "uptime": round(self.clock() - self.started, 1),
+            "ticks": generation,
+            "resources": dict(self.resources,
+                              cpu_budget=self.cpu_budget,
+                              rss_budget_bytes=self.rss_budget,
+                              within_budget=within_budget,
+                              budget_violations=self.budget_violations),
+            "stages": stages,
+            "gauges": self._read_gauges(),
+        }, separators=(',', ':')).encode()
+
+        with self._lock:
+            if generation == self.generation:
+                self._report, self._report_generation = body, generation
+        return body, f"{self.boot_id}-{generation}"
@@ -0,0 +1,81 @@
+import json
+import os
+import socket
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AGENT_DIR)
+
+
+class SystemMonitorTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # agent.py opens agent.log in the working directory when imported
+        cls.cwd = os.getcwd()
+        cls.tmp = tempfile.TemporaryDirectory()
+        os.chdir(cls.tmp.name)
+        import agent
+        cls.agent = agent
+
+    @classmethod
+    def tearDownClass(cls):
+        os.chdir(cls.cwd)
+        cls.tmp.cleanup()
+
+    def _environ(self, **extra):
+        environ = {
+            'SERVER_ID': 'test-server',
+            'COLLECTORS': 'cpu,memory',
+            'PROBES_ENABLED': 'false',
+            'SPOOL_PATH': os.path.join(self.tmp.name, 'metrics.spool'),
+            'ALERT_SPOOL_PATH': os.path.join(self.tmp.name, 'alerts.spool'),
+        }
+        environ.update(extra)
+        return mock.patch.dict(os.environ, environ)
+
+    def _close(self, monitor):
+        if monitor.api_server:
+            monitor.api_server.shutdown()
+        monitor.collectors.close()
+        monitor.spool.close()
+        monitor.alert_spool.close()
+
+    def test_constructs_when_api_port_is_taken(self):
+        with socket.socket() as taken:
+            taken.bind(('127.0.0.1', 0))
+            taken.listen(1)
+            port = taken.getsockname()[1]
+            with self._environ(AGENT_API_PORT=str(port)), self.assertLogs('CoreSightAgent', 'WARNING') as logs:
+                monitor = self.agent.SystemMonitor()
+        try:
+            self.assertIsNone(monitor.api_server)
+            self.assertIn(f"port {port}", '\n'.join(logs.output))
+            self.assertIn('cpu', monitor.collect_metrics())
+            # COLLECTORS leaves the process table out, so it is never scanned
+            self.assertIsNone(monitor.process_collector)
+        finally:
+            self._close(monitor)
+
+    def test_serves_api_on_a_free_port(self):
+        with self._environ(AGENT_API_PORT='0'):
+            monitor = self.agent.SystemMonitor()
+        try:
+            self.assertIsNotNone(monitor.api_server)
+        finally:
+            self._close(monitor)
+
+    def test_process_collector_when_enabled(self):
+        with self._environ(COLLECTORS='cpu,processes', AGENT_API_ENABLED='false'):
+            monitor = self.agent.SystemMonitor()
+        try:
+            self.assertIn('processes', monitor.collect_metrics())
+            self.assertIn('tracked_processes', json.loads(monitor.telemetry.report()[0])['gauges'])
+        finally:
+            self._close(monitor)
+
+
+if __name__ == '__main__':
+    unittest.main()
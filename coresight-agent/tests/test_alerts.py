@@ -0,0 +1,108 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alerts import AlertEngine, AlertRule, load_rules
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _sample(cpu):
+    return {"timestamp": "2026-01-01T00:00:00+00:00", "cpu": {"cpu_percent": cpu}}
+
+
+class AlertEngineTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.rule = AlertRule('cpu_high', 'cpu', threshold=90, clear=80, duration=30, clear_duration=20)
+        self.engine = AlertEngine('server', [self.rule], clock=self.clock)
+
+    def _feed(self, cpu, at):
+        self.clock.now = at
+        return [event['event'] for event in self.engine.evaluate(_sample(cpu))]
+
+    def test_fires_only_once_the_duration_is_met(self):
+        self.assertEqual(self._feed(95, 0), [])
+        self.assertEqual(self._feed(95, 29), [])
+        self.assertEqual(self._feed(95, 30), ['open'])
+
+    def test_dip_below_threshold_restarts_the_duration(self):
+        self._feed(95, 0)
+        self._feed(85, 20)
+        self.assertEqual(self._feed(95, 30), [])
+        self.assertEqual(self._feed(95, 59), [])
+        self.assertEqual(self._feed(95, 60), ['open'])
+
+    def test_does_not_refire_while_firing(self):
+        self._feed(95, 0)
+        self._feed(95, 30)
+        events = [self._feed(value, at) for at, value in ((40, 99), (50, 85), (60, 92), (70, 95))]
+        self.assertEqual(events, [[], [], [], []])
+
+    def test_clears_only_below_the_clear_level(self):
+        self._feed(95, 0)
+        self._feed(95, 30)
+        # Between clear and threshold the alert stays open however long it lasts
+        self.assertEqual(self._feed(85, 40), [])
+        self.assertEqual(self._feed(85, 100), [])
+        self.assertEqual(self._feed(75, 110), [])
+        self.assertEqual(self._feed(75, 129), [])
+        self.assertEqual(self._feed(75, 130), ['resolve'])
+
+    def test_rise_above_clear_cancels_resolving(self):
+        self._feed(95, 0)
+        self._feed(95, 30)
+        self._feed(75, 40)
+        self.assertEqual(self._feed(82, 50), [])
+        self.assertEqual(self._feed(75, 60), [])
+        self.assertEqual(self._feed(75, 79), [])
+        self.assertEqual(self._feed(75, 80), ['resolve'])
+
+    def test_open_and_resolve_share_the_alert_id(self):
+        self.clock.now = 0
+        self.engine.evaluate(_sample(95))
+        self.clock.now = 30
+        opened, = self.engine.evaluate(_sample(97))
+        self.clock.now = 40
+        self.engine.evaluate(_sample(70))
+        self.clock.now = 60
+        resolved, = self.engine.evaluate(_sample(70))
+        self.assertEqual(opened['id'], resolved['id'])
+        self.assertEqual((opened['type'], opened['severity'], opened['value']), ('cpu', 'high', 97.0))
+        self.assertIn('peaked at 97.0', resolved['message'])
+
+    def test_missing_metric_is_skipped(self):
+        self.clock.now = 0
+        self.assertEqual(self.engine.evaluate({"timestamp": None}), [])
+        self.assertEqual(self.rule.state, 'ok')
+
+    def test_reset_event_at_startup(self):
+        event = self.engine.reset_event()
+        self.assertEqual(event['event'], 'reset')
+        self.assertTrue(event['timestamp'])
+        self.assertNotIn('id', event)
+
+
+class AlertRuleTest(unittest.TestCase):
+    def test_rejects_clear_above_threshold(self):
+        with self.assertRaises(ValueError):
+            AlertRule('bad', 'cpu', threshold=80, clear=90)
+
+    def test_rejects_unknown_metric(self):
+        with self.assertRaises(ValueError):
+            AlertRule('bad', 'load', threshold=1)
+
+    def test_default_rules(self):
+        self.assertEqual([rule.name for rule in load_rules(None)], ['cpu_high', 'memory_high', 'disk_high'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from collectors import DiskIOCollector
+
+
+def _diskstats_line(name, sectors_read, sectors_written):
+    return f"   8       0 {name} 1 0 {sectors_read} 0 1 0 {sectors_written} 0 0 0 0\n"
+
+
+class DiskIOCollectorTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.diskstats = os.path.join(self.tmp.name, 'diskstats')
+        self.sys_block = os.path.join(self.tmp.name, 'block')
+        os.mkdir(self.sys_block)
+        self.now = 0.0
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _device(self, name, physical=True):
+        os.makedirs(os.path.join(self.sys_block, name, 'device' if physical else 'holders'))
+
+    def _write(self, counters):
+        with open(self.diskstats, 'w') as f:
+            f.writelines(_diskstats_line(name, *sectors) for name, sectors in counters.items())
+
+    def _collector(self):
+        collector = DiskIOCollector(self.diskstats, self.sys_block, clock=lambda: self.now)
+        self.addCleanup(collector.close)
+        return collector
+
+    def test_hot_attached_device_is_picked_up(self):
+        self._device('sda')
+        self._write({'sda': (0, 0), 'sda1': (0, 0)})
+        collector = self._collector()
+
+        self._device('sdb')
+        self._write({'sda': (2, 0), 'sda1': (2, 0), 'sdb': (0, 0)})
+        self.now += 1
+        self.assertEqual(set(collector.collect()['devices']), {'sda', 'sdb'})
+
+        self._write({'sda': (2, 0), 'sda1': (2, 0), 'sdb': (4, 2)})
+        self.now += 1
+        sample = collector.collect()
+        self.assertEqual(sample['devices']['sdb'], {"read_bytes_per_sec": 2048.0, "write_bytes_per_sec": 1024.0})
+        self.assertEqual(sample['read_bytes_per_sec'], 2048.0)
+
+    def test_partitions_do_not_trigger_a_rescan_every_tick(self):
+        self._device('sda')
+        self._device('dm-0', physical=False)
+        self._write({'sda': (0, 0), 'sda1': (0, 0), 'dm-0': (0, 0)})
+        collector = self._collector()
+        scans = []
+        original = collector._scan_devices
+        collector._scan_devices = lambda counters: scans.append(1) or original(counters)
+
+        for tick in range(1, 4):
+            self._write({'sda': (tick, 0), 'sda1': (tick, 0), 'dm-0': (tick, 0)})
+            self.now += 1
+            sample = collector.collect()
+        self.assertEqual(scans, [])
+        # dm volumes are listed but only hardware devices count in the totals
+        self.assertEqual(set(sample['devices']), {'sda', 'dm-0'})
+        self.assertEqual(sample['read_bytes_per_sec'], 512.0)
+
+    def test_removed_device_is_dropped(self):
+        self._device('sda')
+        self._device('sdb')
+        self._write({'sda': (0, 0), 'sdb': (0, 0)})
+        collector = self._collector()
+
+        os.rmdir(os.path.join(self.sys_block, 'sdb', 'device'))
+        os.rmdir(os.path.join(self.sys_block, 'sdb'))
+        self._write({'sda': (0, 0)})
+        self.now += 1
+        self.assertEqual(set(collector.collect()['devices']), {'sda'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiohttp
+
+from probes import ProbeEngine, ProbeTarget
+
+SLOW_SECONDS = 1.5
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/slow':
+            time.sleep(SLOW_SECONDS)
+        status = 500 if self.path == '/fail' else 200
+        try:
+            self.send_response(status)
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write(b'ok')
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the probe timed out and hung up
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _closed_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class ProbeEngineTest(unittest.IsolatedAsyncioTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.http = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        cls.http.daemon_threads = True
+        threading.Thread(target=cls.http.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.http.server_port}"
+
+        cls.listener = socket.socket()
+        cls.listener.bind(('127.0.0.1', 0))
+        cls.listener.listen(16)
+        cls.tcp_port = cls.listener.getsockname()[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.http.shutdown()
+        cls.http.server_close()
+        cls.listener.close()
+
+    async def _probe(self, url, timeout=5.0):
+        engine = ProbeEngine(lambda result: None, timeout=timeout)
+        async with aiohttp.ClientSession() as session:
+            return await engine.probe(session, ProbeTarget('site', url, 60))
+
+    async def test_http_up_and_down(self):
+        up = await self._probe(f"{self.base}/ok")
+        self.assertEqual((up['status'], up['status_code']), ('up', 200))
+        self.assertIsNotNone(up['response_time'])
+
+        down = await self._probe(f"{self.base}/fail")
+        self.assertEqual((down['status'], down['status_code']), ('down', 500))
+        self.assertIsNone(down['response_time'])
+
+    async def test_http_timeout(self):
+        result = await self._probe(f"{self.base}/slow", timeout=0.3)
+        self.assertEqual(result['status'], 'down')
+        self.assertIn('Timed out', result['error_message'])
+
+    async def test_tcp_up_and_down(self):
+        up = await self._probe(f"tcp://127.0.0.1:{self.tcp_port}")
+        self.assertEqual(up['status'], 'up')
+
+        down = await self._probe(f"tcp://127.0.0.1:{_closed_port()}")
+        self.assertEqual(down['status'], 'down')
+        self.assertTrue(down['error_message'])
+
+    async def test_dns_up_and_down(self):
+        up = await self._probe("dns://localhost")
+        self.assertEqual(up['status'], 'up')
+
+        down = await self._probe("dns://coresight-probe-test.invalid", timeout=3.0)
+        self.assertEqual(down['status'], 'down')
+
+    async def test_in_flight_probe_is_skipped(self):
+        results = []
+        # One probe at a time and every probe times out at its 1s interval, so
+        # each target comes due again while it is still running or queued
+        engine = ProbeEngine(results.append, concurrency=1, timeout=10.0)
+        engine.set_targets([
+            {"id": "a", "url": f"{self.base}/slow", "interval": 1},
+            {"id": "b", "url": f"{self.base}/slow", "interval": 1},
+        ])
+        runner = asyncio.create_task(engine.run())
+        await asyncio.sleep(3.5)
+        engine.stop()
+        await runner
+
+        self.assertGreaterEqual(engine.probes_skipped, 2)
+        # Skipped runs are dropped, not queued behind the one in flight
+        self.assertLessEqual(len(results), 4)
+        self.assertTrue(all(r['status'] == 'down' for r in results))
+        self.assertTrue(all('Timed out after 1s' in r['error_message'] for r in results))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import sys
+import unittest
+from collections import namedtuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psutil
+
+from processes import ProcessCollector, read_stat
+
+MemoryInfo = namedtuple('MemoryInfo', ['rss', 'vms'])
+IOCounters = namedtuple('IOCounters', ['read_bytes', 'write_bytes'])
+
+TOTAL_MEMORY = 1000
+
+
+class FakeTable:
+    def __init__(self):
+        self.rows = {}
+
+    def spawn(self, pid, name, start, cpu=0.0, rss=100):
+        self.rows[pid] = {"name": name, "start": start, "cpu": cpu, "rss": rss, "io": 0}
+
+    def pids(self):
+        return list(self.rows)
+
+    def stat(self, pid):
+        if pid not in self.rows:
+            raise psutil.NoSuchProcess(pid)
+        return self.rows[pid]["start"], self.rows[pid]["cpu"]
+
+    def process(self, pid):
+        return FakeProcess(self.rows[pid])
+
+
+class FakeProcess:
+    def __init__(self, row):
+        self.row = row
+
+    def name(self):
+        return self.row["name"]
+
+    def memory_info(self):
+        return MemoryInfo(self.row["rss"], self.row["rss"])
+
+    def io_counters(self):
+        return IOCounters(self.row["io"], 0)
+
+
+class ProcessCollectorTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.table = FakeTable()
+
+    def _collector(self, **options):
+        return ProcessCollector(pids=self.table.pids, stat=self.table.stat, process_factory=self.table.process,
+                                total_memory=TOTAL_MEMORY, clock=lambda: self.now, **options)
+
+    def _advance(self, seconds, **cpu):
+        self.now += seconds
+        for pid, used in cpu.items():
+            self.table.rows[int(pid[1:])]["cpu"] += used
+
+    def test_rates_span_one_cycle_from_the_first_collect(self):
+        self.table.spawn(1, 'busy', start=10)
+        self.table.spawn(2, 'idle', start=11)
+        collector = self._collector(top_n=1)
+        self._advance(10, p1=5.0, p2=0.1)
+        top, = collector.collect()
+        self.assertEqual((top['name'], top['cpu_percent'], top['memory_percent']), ('busy', 50.0, 10.0))
+
+    def test_reused_pid_is_tracked_afresh(self):
+        self.table.spawn(1, 'make', start=10, cpu=100.0)
+        collector = self._collector()
+        self._advance(10, p1=2.0)
+        self.assertEqual(collector.collect()[0]['name'], 'make')
+
+        # The PID comes back as a new process that already has more CPU time
+        self.table.spawn(1, 'cc1', start=25, cpu=400.0)
+        self._advance(10)
+        top, = collector.collect()
+        self.assertEqual((top['name'], top['cpu_percent']), ('cc1', 0.0))
+
+        self._advance(10, p1=1.0)
+        self.assertEqual(collector.collect()[0]['cpu_percent'], 10.0)
+
+    def test_exited_processes_are_evicted(self):
+        self.table.spawn(1, 'a', start=1)
+        self.table.spawn(2, 'b', start=2)
+        collector = self._collector()
+        del self.table.rows[2]
+        self._advance(10)
+        self.assertEqual([p['pid'] for p in collector.collect()], [1])
+        self.assertEqual(len(collector), 1)
+
+    def test_read_stat_of_this_process(self):
+        start, cpu = read_stat(os.getpid())
+        self.assertEqual(start, read_stat(os.getpid())[0])
+        self.assertGreater(cpu, 0)
+        with self.assertRaises(psutil.NoSuchProcess):
+            read_stat(2 ** 22 + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
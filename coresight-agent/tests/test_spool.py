@@ -0,0 +1,146 @@
+import os
+import random
+import struct
+import sys
+import tempfile
+import unittest
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spool import DiskSpool, HEADER, RECORD
+
+
+def _payload(seq, size):
+    return (f"{seq}:".encode() + b'x' * size)[:max(size, len(str(seq)) + 1)]
+
+
+class DiskSpoolTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'test.spool')
+
+    def _open(self, capacity=256):
+        spool = DiskSpool(self.path, capacity)
+        self.addCleanup(lambda: spool._map.closed or spool.close())
+        return spool
+
+    def test_fifo_with_consecutive_sequence_numbers(self):
+        spool = self._open()
+        for value in (b'a', b'b', b'c'):
+            spool.append(value)
+        self.assertEqual(spool.peek(10), [(1, b'a'), (2, b'b'), (3, b'c')])
+        spool.commit(2)
+        self.assertEqual(spool.peek(10), [(3, b'c')])
+        self.assertEqual(len(spool), 1)
+
+    def test_peek_respects_the_byte_limit(self):
+        spool = self._open()
+        for value in (b'12345', b'12345', b'12345'):
+            spool.append(value)
+        self.assertEqual([seq for seq, _ in spool.peek(10, max_bytes=10)], [1, 2])
+        # A single record larger than the limit is still returned on its own
+        self.assertEqual([seq for seq, _ in spool.peek(10, max_bytes=1)], [1])
+
+    def test_wraps_around_the_end_of_the_ring(self):
+        spool = self._open(capacity=100)
+        record = RECORD.size + 20
+        # Fill the ring up to its last few bytes, release the front, then append
+        for seq in range(1, 4):
+            spool.append(_payload(seq, 20))
+        spool.commit(2)
+        spool.append(_payload(4, 20))
+        spool.append(_payload(5, 20))
+        # Record 4 went to the start, record 5 exactly fills the gap up to head
+        self.assertEqual((spool.tail, spool.head), (2 * record, 2 * record))
+        self.assertEqual(spool.peek(10), [(seq, _payload(seq, 20)) for seq in (3, 4, 5)])
+        self.assertEqual(spool.dropped, 0)
+
+    def test_drops_the_oldest_when_full(self):
+        spool = self._open(capacity=100)
+        for seq in range(1, 8):
+            self.assertTrue(spool.append(_payload(seq, 20)))
+        records = spool.peek(10)
+        self.assertEqual([seq for seq, _ in records], list(range(8 - len(records), 8)))
+        self.assertEqual(spool.dropped, 7 - len(records))
+        self.assertGreater(spool.dropped, 0)
+
+    def test_oversized_record_is_dropped_without_a_sequence(self):
+        spool = self._open(capacity=64)
+        spool.append(b'a')
+        self.assertFalse(spool.append(b'x' * 64))
+        spool.append(b'b')
+        self.assertEqual(spool.peek(10), [(1, b'a'), (2, b'b')])
+        self.assertEqual(spool.dropped, 1)
+
+    def test_recovers_after_reopening(self):
+        spool = self._open(capacity=100)
+        for seq in range(1, 6):
+            spool.append(_payload(seq, 20))
+        spool.commit(3)
+        before = (spool.peek(10), spool.dropped, spool.id)
+        spool.close()
+
+        reopened = self._open(capacity=100)
+        self.assertEqual((reopened.peek(10), reopened.dropped, reopened.id), before)
+        reopened.append(b'next')
+        self.assertEqual(reopened.peek(10)[-1], (before[0][-1][0] + 1, b'next'))
+
+    def test_starts_empty_with_a_new_id_on_a_different_capacity(self):
+        spool = self._open(capacity=100)
+        spool.append(b'a')
+        spool_id = spool.id
+        spool.close()
+
+        resized = self._open(capacity=200)
+        self.assertEqual(len(resized), 0)
+        self.assertNotEqual(resized.id, spool_id)
+        resized.append(b'b')
+        self.assertEqual(resized.peek(1), [(1, b'b')])
+
+    def test_spool_without_an_id_gets_one_that_persists(self):
+        spool = self._open(capacity=100)
+        spool.append(b'a')
+        spool.close()
+        # Spool files written before the id existed have zeros in its place
+        with open(self.path, 'r+b') as f:
+            f.seek(HEADER.size - 8)
+            f.write(bytes(8))
+
+        upgraded = self._open(capacity=100)
+        self.assertEqual(upgraded.peek(1), [(1, b'a')])
+        self.assertNotEqual(upgraded.id, '0' * 16)
+        spool_id = upgraded.id
+        upgraded.close()
+        self.assertEqual(self._open(capacity=100).id, spool_id)
+
+    def test_matches_a_reference_queue(self):
+        rng = random.Random(3)
+        capacity = 512
+        spool = self._open(capacity=capacity)
+        expected = deque()
+        next_seq = 1
+        for step in range(3000):
+            action = rng.random()
+            if action < 0.6:
+                payload = _payload(next_seq, rng.randint(0, 60))
+                spool.append(payload)
+                expected.append((next_seq, payload))
+                next_seq += 1
+                # Whatever the spool dropped to make room was the oldest
+                while len(expected) > len(spool):
+                    expected.popleft()
+            elif action < 0.9 and expected:
+                upto = expected[rng.randrange(len(expected))][0]
+                spool.commit(upto)
+                while expected and expected[0][0] <= upto:
+                    expected.popleft()
+            else:
+                spool.close()
+                spool = self._open(capacity=capacity)
+            self.assertEqual(spool.peek(len(expected) + 1), list(expected), f"step {step}")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import gzip
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spool import DiskSpool
+from uploader import BatchUploader
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(gzip.decompress(self.rfile.read(int(self.headers['Content-Length']))))
+        self.server.batches.append((self.headers['X-Spool-Id'], int(self.headers['X-Spool-Seq']), body))
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        self.send_response(status)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class BatchUploaderTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.http = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.http.batches = []
+        self.http.statuses = []
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+        self.addCleanup(self.http.server_close)
+        self.addCleanup(self.http.shutdown)
+
+        self.spool = DiskSpool(os.path.join(self.tmp.name, 'metrics.spool'), 64 * 1024)
+        self.addCleanup(self.spool.close)
+        self.uploader = BatchUploader(self.spool, f"http://127.0.0.1:{self.http.server_port}/batch", 'server',
+                                      batch_size=3)
+
+    def _append(self, *values):
+        for value in values:
+            self.spool.append(json.dumps({"value": value}).encode())
+
+    def test_batches_carry_the_spool_position(self):
+        self._append(1, 2, 3, 4)
+        self.assertEqual(self.uploader.send_batch(), 3)
+        self.assertEqual(self.uploader.send_batch(), 1)
+        self.assertEqual([(spool_id, seq, [s['value'] for s in body['samples']])
+                          for spool_id, seq, body in self.http.batches],
+                         [(self.spool.id, 1, [1, 2, 3]), (self.spool.id, 4, [4])])
+
+    def test_failed_batch_is_resent_from_the_same_sequence(self):
+        self.http.statuses = [503]
+        self._append(1, 2)
+        with self.assertRaises(Exception):
+            self.uploader.send_batch()
+        # More samples arrive before the retry, the batch still starts where it did
+        self._append(3)
+        self.assertEqual(self.uploader.send_batch(), 3)
+        self.assertEqual([seq for _, seq, _ in self.http.batches], [1, 1])
+        self.assertEqual(len(self.spool), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
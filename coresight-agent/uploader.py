@@ -0,0 +1,132 @@
+import gzip
+import random
+import threading
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from wire import JsonEncoder
+
+logger = logging.getLogger('CoreSightAgent')
+
+
+class BatchUploader(threading.Thread):
+    """Drains a DiskSpool to the backend's batch ingest route.
+
+    Runs on its own thread so a slow or restarting backend never stalls
+    sampling. Batches are encoded by ``encoder`` (plain JSON or the compact
+    wire format), gzip-compressed and posted over one persistent
+    ``requests.Session``; failures back off exponentially with jitter and the
+    batch stays in the spool until the backend acknowledges it.
+
+    ``expected_interval`` is how often this uploader should have something to
+    send. It is reported with every batch so the backend can tell an agent that
+    uploads rarely from one that went quiet.
+    """
+
+    def __init__(self, spool, url, server_id, batch_size=500, max_batch_bytes=4 * 1024 * 1024,
+                 flush_interval=5.0, timeout=10.0, backoff_base=1.0, backoff_max=60.0, encoder=None,
+                 label='metrics', telemetry=None, expected_interval=None):
+        super().__init__(name=f'coresight-uploader-{label}', daemon=True)
+        self.spool = spool
+        self.url = url
+        self.server_id = server_id
+        self.batch_size = batch_size
+        self.max_batch_bytes = max_batch_bytes
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.encoder = encoder or JsonEncoder()
+        self.label = label
+        self.telemetry = telemetry
+
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self.session.headers.update({
+            "Content-Type": "application/json",
+            "Content-Encoding": "gzip",
+        })
+        if expected_interval:
+            self.session.headers["X-Upload-Interval"] = f"{expected_interval:g}"
+
+        self.failures = 0
+        self.sent_samples = 0
+        self.sent_bytes = 0
+        self.rejected_samples = 0
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+
+    def notify(self):
+        """Wake the sender early, e.g. when a full batch is waiting."""
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wake.set()
+        self.join(timeout)
+
+    def _encode(self, records):
+        return gzip.compress(self.encoder.encode(self.server_id, records), compresslevel=6)
+
+    def _backoff(self):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** min(self.failures, 16)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def send_batch(self):
+        """Send one batch; return the number of samples delivered."""
+        records = self.spool.peek(self.batch_size, self.max_batch_bytes)
+        if not records:
+            return 0
+
+        # Spool sequence numbers are consecutive, the first one places the whole
+        # batch, so a resend after a lost response is not stored twice
+        headers = {"X-Spool-Id": self.spool.id, "X-Spool-Seq": str(records[0][0])}
+        if self.telemetry:
+            with self.telemetry.timer(f"encode.{self.label}"):
+                body = self._encode(records)
+            with self.telemetry.timer(f"upload.{self.label}"):
+                response = self.session.post(self.url, data=body, headers=headers, timeout=self.timeout)
+        else:
+            body = self._encode(records)
+            response = self.session.post(self.url, data=body, headers=headers, timeout=self.timeout)
+        if response.status_code == 409:
+            # The backend lost our wire session (e.g. it restarted), resend from a keyframe
+            logger.warning("Backend asked for a wire format resync")
+            self.encoder.reset()
+            return 0
+        if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+            # The backend will never accept this batch, retrying would block the spool forever
+            logger.error(f"Backend rejected {len(records)} sample(s) with {response.status_code}: {response.text}")
+            self.spool.commit(records[-1][0])
+            self.rejected_samples += len(records)
+            return 0
+        response.raise_for_status()
+        self.encoder.ack()
+        self.spool.commit(records[-1][0])
+        self.sent_bytes += len(body)
+        return len(records)
+
+    def run(self):
+        while not self._stopping.is_set():
+            try:
+                sent = self.send_batch()
+                self.failures = 0
+                self.sent_samples += sent
+                if sent:
+                    logger.debug(f"Uploaded {sent} sample(s), {len(self.spool)} still spooled")
+                if sent < self.batch_size:
+                    self._wake.wait(self.flush_interval)
+                    self._wake.clear()
+            except requests.exceptions.RequestException as e:
+                self.failures += 1
+                delay = self._backoff()
+                logger.error(f"Error uploading {self.label} ({len(self.spool)} spooled), retrying in {delay:.1f}s: {e}")
+                if getattr(e, 'response', None) is not None:
+                    logger.error(f"Server response: {e.response.text}")
+                self._stopping.wait(delay)
+            except Exception as e:
+                logger.error(f"Error in upload loop: {e}", exc_info=True)
+                self._stopping.wait(self.flush_interval)
@@ -0,0 +1,180 @@
+import json
+import uuid
+from datetime import datetime
+
+WIRE_VERSION = 1
+
+# Process rows are positional in the compact format
+PROCESS_COLUMNS = ('pid', 'name', 'cpu_percent', 'memory_percent', 'io_bytes_per_sec', 'disk_usage')
+
+# Carried in the batch envelope or frame header rather than the field table
+ENVELOPE_KEYS = ('server_id', 'timestamp', 'processes')
+
+# Cumulative counters the backend can't use, the agent already sends the rates
+DROPPED_PATHS = {('network', 'bytes_sent'), ('network', 'bytes_recv')}
+
+KEYFRAME = 0
+DELTA = 1
+
+
+class JsonEncoder:
+    """The plain JSON batch body: every record shipped as collected."""
+
+    def __init__(self, key='samples'):
+        self.key = key
+
+    def encode(self, server_id, records):
+        # Records are already JSON documents, splice them instead of re-parsing
+        body = b'{"server_id":' + json.dumps(server_id).encode() + b',"' + self.key.encode() + b'":['
+        return body + b','.join(payload for _, payload in records) + b']}'
+
+    def ack(self):
+        pass
+
+    def reset(self):
+        pass
+
+
+def _flatten(value, path, out):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(item, path + (key,), out)
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            _flatten(item, path + (index,), out)
+    elif path not in DROPPED_PATHS:
+        # Two decimals is below anything a chart shows, and it lets more fields
+        # compare equal between frames
+        out[path] = round(value, 2) if isinstance(value, float) else value
+
+
+def _epoch_ms(timestamp):
+    try:
+        return int(datetime.fromisoformat(timestamp).timestamp() * 1000)
+    except (TypeError, ValueError):
+        return int(datetime.now().timestamp() * 1000)
+
+
+class _WireState:
+    def __init__(self):
+        self.fields = {}
+        self.names = {}
+        self.values = {}
+        self.seq = 0
+        self.timestamp = None
+        self.since_keyframe = 0
+
+    def copy(self):
+        state = _WireState()
+        state.fields = dict(self.fields)
+        state.names = dict(self.names)
+        state.values = dict(self.values)
+        state.seq = self.seq
+        state.timestamp = self.timestamp
+        state.since_keyframe = self.since_keyframe
+        return state
+
+
+class CompactEncoder:
+    """Versioned, delta-encoded batch body (WIRE_VERSION).
+
+    Field paths and process names are interned in dictionaries that live for
+    the agent's session; each batch only carries the entries the backend has
+    not acknowledged yet. A frame lists only the fields that changed since the
+    previous frame, with a full keyframe every ``keyframe_interval`` frames.
+
+    Encoding always starts from the last acknowledged state. If a batch is
+    lost it is simply re-encoded, and if the backend answers that it lost the
+    session, ``reset()`` starts over with a keyframe.
+    """
+
+    def __init__(self, keyframe_interval=60):
+        self.keyframe_interval = keyframe_interval
+        self.session = uuid.uuid4().hex
+        self._acked = _WireState()
+        self._pending = None
+
+    def ack(self):
+        if self._pending is not None:
+            self._acked = self._pending
+            self._pending = None
+
+    def reset(self):
+        self._acked = _WireState()
+        self._pending = None
+
+    def _intern(self, table, new_entries, key, value=None):
+        index = table.get(key)
+        if index is None:
+            index = table[key] = len(table)
+            new_entries[index] = key if value is None else value
+        return index
+
+    def _encode_processes(self, state, processes, new_names):
+        rows = []
+        for process in processes:
+            row = [process.get(column) for column in PROCESS_COLUMNS]
+            row[1] = self._intern(state.names, new_names, str(row[1]))
+            rows.append(row)
+        return rows
+
+    def _encode_frame(self, state, record, new_fields, new_names):
+        flat = {}
+        _flatten({k: v for k, v in record.items() if k not in ENVELOPE_KEYS}, (), flat)
+        current = {self._intern(state.fields, new_fields, path, list(path)): value
+                   for path, value in flat.items()}
+        timestamp = _epoch_ms(record.get('timestamp'))
+
+        if state.timestamp is None or state.since_keyframe >= self.keyframe_interval:
+            kind, ts = KEYFRAME, timestamp
+            changes = current
+            removed = []
+            state.since_keyframe = 0
+        else:
+            kind, ts = DELTA, timestamp - state.timestamp
+            previous = state.values
+            changes = {fid: value for fid, value in current.items()
+                       if fid not in previous or previous[fid] != value}
+            removed = [fid for fid in previous if fid not in current]
+
+        state.values = current
+        state.timestamp = timestamp
+        state.since_keyframe += 1
+        state.seq += 1
+
+        processes = record.get('processes')
+        if processes is not None:
+            processes = self._encode_processes(state, processes, new_names)
+
+        pairs = []
+        for fid, value in changes.items():
+            pairs.append(fid)
+            pairs.append(value)
+        return [kind, ts, pairs, removed, processes]
+
+    def encode(self, server_id, records):
+        state = self._acked.copy()
+        base = state.seq if state.timestamp is not None else None
+        new_fields, new_names = {}, {}
+
+        frames = [self._encode_frame(state, json.loads(payload), new_fields, new_names)
+                  for _, payload in records]
+        self._pending = state
+
+        return json.dumps({
+            "v": WIRE_VERSION,
+            "server_id": server_id,
+            "session": self.session,
+            "base": base,
+            "fields": new_fields,
+            "names": new_names,
+            "frames": frames,
+        }, separators=(',', ':')).encode()
+
+
+def get_encoder(name, keyframe_interval=60):
+    if name == 'compact':
+        return CompactEncoder(keyframe_interval)
+    if name in ('', 'json'):
+        return JsonEncoder()
+    raise ValueError(f"Unknown wire format: {name}")
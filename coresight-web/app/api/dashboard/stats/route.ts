@@ -32,17 +32,18 @@ export async function GET() {
       WHERE timestamp >= DATE_SUB(NOW(), INTERVAL 2 HOUR)
     `);
 
-    // Get average storage usage and change
+    // Get average storage usage and change, two weeks of raw samples is too
+    // much to scan per request so this reads the hourly rollups
     const [storageStats] = await pool.query(`
       SELECT 
         AVG(disk_usage) as avg_storage,
-        AVG(CASE WHEN timestamp >= DATE_SUB(NOW(), INTERVAL 1 WEEK) 
+        AVG(CASE WHEN bucket >= DATE_SUB(NOW(), INTERVAL 1 WEEK) 
             THEN disk_usage ELSE NULL END) - 
-        AVG(CASE WHEN timestamp >= DATE_SUB(NOW(), INTERVAL 2 WEEK) 
-            AND timestamp < DATE_SUB(NOW(), INTERVAL 1 WEEK)
+        AVG(CASE WHEN bucket >= DATE_SUB(NOW(), INTERVAL 2 WEEK) 
+            AND bucket < DATE_SUB(NOW(), INTERVAL 1 WEEK)
             THEN disk_usage ELSE NULL END) as storage_change
-      FROM server_metrics
-      WHERE timestamp >= DATE_SUB(NOW(), INTERVAL 2 WEEK)
+      FROM server_metrics_1h
+      WHERE bucket >= DATE_SUB(NOW(), INTERVAL 2 WEEK)
     `);
 
     // Get active alerts and change
@@ -25,19 +25,20 @@ export async function GET(
 
     const { id } = params;
 
-    // Get daily averages for the last 7 days
+    // Get daily averages for the last 7 days from the hourly rollups,
+    // weighted by how many samples each hour holds
     const [historicalMetricsRows] = await pool.query<MetricsRow[]>(
       `SELECT 
-        DATE(timestamp) as date,
-        AVG(cpu_usage) as avg_cpu,
-        AVG(memory_usage) as avg_memory,
-        AVG(disk_usage) as avg_disk,
-        AVG(network_in) as avg_network_in,
-        AVG(network_out) as avg_network_out
-       FROM server_metrics 
+        DATE(bucket) as date,
+        SUM(cpu_usage * samples) / SUM(CASE WHEN cpu_usage IS NOT NULL THEN samples END) as avg_cpu,
+        SUM(memory_usage * samples) / SUM(CASE WHEN memory_usage IS NOT NULL THEN samples END) as avg_memory,
+        SUM(disk_usage * samples) / SUM(CASE WHEN disk_usage IS NOT NULL THEN samples END) as avg_disk,
+        SUM(network_in * samples) / SUM(CASE WHEN network_in IS NOT NULL THEN samples END) as avg_network_in,
+        SUM(network_out * samples) / SUM(CASE WHEN network_out IS NOT NULL THEN samples END) as avg_network_out
+       FROM server_metrics_1h 
        WHERE server_id = ? 
-       AND timestamp >= DATE_SUB(CURDATE(), INTERVAL 7 DAY)
-       GROUP BY DATE(timestamp)
+       AND bucket >= DATE_SUB(CURDATE(), INTERVAL 7 DAY)
+       GROUP BY DATE(bucket)
        ORDER BY date ASC`,
       [id]
     );
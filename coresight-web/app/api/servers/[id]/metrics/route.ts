@@ -75,8 +75,8 @@ export async function POST(
     // Store metrics in database
     await pool.query(
       `INSERT INTO server_metrics 
-       (id, server_id, cpu_usage, memory_usage, disk_usage, network_in, network_out, timestamp)
-       VALUES (UUID(), ?, ?, ?, ?, ?, ?, NOW())`,
+       (server_id, cpu_usage, memory_usage, disk_usage, network_in, network_out, timestamp)
+       VALUES (?, ?, ?, ?, ?, ?, NOW())`,
       [
         id,
         metrics.cpu?.usage || 0,
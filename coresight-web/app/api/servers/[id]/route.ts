@@ -188,10 +188,18 @@ export async function DELETE(
         "DELETE FROM server_processes WHERE server_id = ?",
         [id]
       );
-      await connection.execute(
-        "DELETE FROM server_metrics WHERE server_id = ?",
-        [id]
-      );
+      // The metrics tables are partitioned and can't cascade from servers
+      for (const table of [
+        "server_metrics",
+        "server_metrics_1m",
+        "server_metrics_1h",
+        "server_metrics_rollups",
+        "server_metrics_ingest_state",
+      ]) {
+        await connection.execute(`DELETE FROM ${table} WHERE server_id = ?`, [
+          id,
+        ]);
+      }
       await connection.execute("DELETE FROM alerts WHERE server_id = ?", [id]);
       await connection.execute(
         "DELETE FROM server_actions WHERE server_id = ?",